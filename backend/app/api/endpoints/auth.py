@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from app.core.metrics import InstrumentedAPIRoute
 from app.services.supabase.auth import SupabaseAuthService, get_auth_service
 from app.models.auth import UserProfile, TokenResponse
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedAPIRoute)
 security = HTTPBearer()
 
 
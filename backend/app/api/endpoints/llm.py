@@ -1,17 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import AsyncIterator, Optional
+import json
 import logging
 
-from app.services.llm.llm_service import LLMService, get_llm_service
-from app.services.llm.embedding_service import EmbeddingService, get_embedding_service
+from app.core.admission import AdmissionError, admit_user
+from app.core.metrics import InstrumentedAPIRoute
+from app.core.vector_encoding import MsgpackResponse, encode_vectors, wants_msgpack
+from app.services.llm.llm_service import LLMStreamEvent, PolicyLLMService, get_llm_service
+from app.services.llm.embedding_service import default_embedding_model, get_embedding_service
 from app.models.llm import TextGenerationRequest, TextGenerationResponse, EmbeddingRequest, EmbeddingResponse
 from app.services.supabase.auth import SupabaseAuthService, get_auth_service
 from app.core.config import settings
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedAPIRoute)
 security = HTTPBearer()  # Make authentication required
 logger = logging.getLogger(__name__)
 
+# Values of the X-LLM-Cache request header: "use" caches a non-deterministic request, "bypass" skips the cache
+_CACHE_HEADER_VALUES = {"use": True, "bypass": False}
+
 
 @router.post("/generate", response_model=TextGenerationResponse)
 async def generate_text(
@@ -19,13 +28,18 @@ async def generate_text(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     auth_service: SupabaseAuthService = Depends(get_auth_service),
     # We will override this service based on the request provider
-    llm_service: LLMService = Depends(lambda: get_llm_service("openai")),
+    llm_service: PolicyLLMService = Depends(lambda: get_llm_service("openai")),
+    x_llm_cache: Optional[str] = Header(default=None),
 ):
-    """Generate text using the specified LLM model."""
-    try:
-        # Log request details for debugging
-        logger.info(f"Sameer Received text generation request with model: {request}, provider: {credentials}")
+    """
+    Generate text using the specified LLM model.
 
+    Responses to deterministic requests (temperature 0) are cached. Send ``X-LLM-Cache: use``
+    to cache other requests too, or ``X-LLM-Cache: bypass`` to skip the cache.
+    Requests over the user's rate limit get 429, and requests shed while waiting for the
+    provider get 503, both with a Retry-After header.
+    """
+    try:
         # Validate user authentication
         try:
             user = await auth_service.get_user(credentials.credentials)
@@ -38,6 +52,8 @@ async def generate_text(
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        admit_user(user.id)
+
         # Get the right LLM service based on provider
         try:
             if request.provider:
@@ -58,30 +74,106 @@ async def generate_text(
                 raise ValueError("Anthropic API key not configured. Please set the ANTHROPIC_API_KEY environment variable.")
 
             response = await llm_service.generate_text(
-                prompt=request.prompt, model=request.model, max_tokens=request.max_tokens, temperature=request.temperature
+                prompt=request.prompt,
+                model=request.model,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                deadline=request.deadline_seconds,
+                cache=_CACHE_HEADER_VALUES.get((x_llm_cache or "").lower()),
             )
             logger.info(f"Text generation successful, response length: {len(response.text)}")
-            return TextGenerationResponse(text=response.text, model=response.model, usage=response.usage)
+            return TextGenerationResponse(text=response.text, model=response.model, usage=response.usage, route=response.route)
+        except AdmissionError:
+            raise
         except Exception as generation_error:
             logger.error(f"Text generation error: {str(generation_error)}", exc_info=True)
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Text generation failed: {str(generation_error)}")
 
-    except HTTPException:
-        # Re-raise HTTP exceptions so they maintain their status codes
+    except (HTTPException, AdmissionError):
+        # Re-raise HTTP and admission errors so they maintain their status codes
         raise
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error: {str(e)}")
 
 
+@router.post("/generate/stream")
+async def generate_text_stream(
+    request: TextGenerationRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+):
+    """
+    Stream generated text as server-sent events.
+
+    Emits ``delta`` events with text chunks as they arrive, then a final ``usage`` event
+    (or an ``error`` event if generation fails). The upstream request is cancelled when
+    the client disconnects. Requests over the user's rate limit get 429; a request shed
+    while waiting for the provider gets an ``error`` event.
+    """
+    # Validate user authentication
+    try:
+        user = await auth_service.get_user(credentials.credentials)
+    except Exception as auth_error:
+        logger.error(f"Authentication error: {str(auth_error)}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Authentication failed: {str(auth_error)}",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    admit_user(user.id)
+
+    try:
+        llm_service = get_llm_service(request.provider)
+    except ValueError as provider_error:
+        logger.error(f"Provider error: {str(provider_error)}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(provider_error))
+
+    stream = llm_service.generate_stream(
+        prompt=request.prompt, model=request.model, max_tokens=request.max_tokens, temperature=request.temperature, deadline=request.deadline_seconds
+    )
+
+    return StreamingResponse(
+        _server_sent_events(stream),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream, which would defeat time to first token
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _server_sent_events(stream: AsyncIterator[LLMStreamEvent]) -> AsyncIterator[str]:
+    """Format a generation stream as server-sent events."""
+    try:
+        async for event in stream:
+            if event.usage is not None:
+                yield f"event: usage\ndata: {json.dumps({'model': event.model, 'usage': event.usage.model_dump()})}\n\n"
+            else:
+                yield f"event: delta\ndata: {json.dumps({'text': event.text})}\n\n"
+    except Exception as generation_error:
+        # The response status has already been sent, so report the failure in-band
+        logger.error(f"Text generation stream error: {str(generation_error)}", exc_info=True)
+        yield f"event: error\ndata: {json.dumps({'detail': f'Text generation failed: {str(generation_error)}'})}\n\n"
+    finally:
+        # Runs on client disconnect too, closing the upstream connection
+        await stream.aclose()
+
+
 @router.post("/embedding", response_model=EmbeddingResponse)
 async def create_embedding(
     request: EmbeddingRequest,
+    response: Response,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     auth_service: SupabaseAuthService = Depends(get_auth_service),
-    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    accept: Optional[str] = Header(default=None),
 ):
-    """Create an embedding vector for the provided text."""
+    """
+    Create an embedding vector for the provided text.
+
+    The vector is encoded as requested by ``encoding``. The response is msgpack instead
+    of JSON when the Accept header prefers ``application/msgpack``; binary-encoded
+    vectors are then raw bytes rather than base64 text.
+    """
     try:
         # Validate user authentication
         try:
@@ -95,10 +187,23 @@ async def create_embedding(
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        admit_user(user.id)
+
+        # Get the right embedding service based on provider
+        embedding_service = get_embedding_service(request.provider)
+
         # Generate embedding with the embedding service
-        embedding = await embedding_service.create_embedding(text=request.text, model=request.model)
+        embedding = await embedding_service.create_embedding(text=request.text, model=request.model or default_embedding_model(request.provider))
+
+        binary = wants_msgpack(accept)
+        (vector,) = encode_vectors(embedding.embedding.reshape(1, -1), request.encoding, binary=binary)
 
-        return EmbeddingResponse(embedding=embedding.embedding, model=embedding.model, usage=embedding.usage)
+        if binary:
+            return MsgpackResponse({"embedding": vector, "model": embedding.model, "usage": embedding.usage.model_dump()}, headers={"Vary": "Accept"})
+        response.headers["Vary"] = "Accept"
+        return EmbeddingResponse(embedding=vector, model=embedding.model, usage=embedding.usage)
+    except (HTTPException, AdmissionError):
+        raise
     except Exception as e:
         logger.error(f"Embedding creation failed: {str(e)}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Embedding creation failed: {str(e)}")
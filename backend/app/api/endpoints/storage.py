@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import List, Optional
+
+from app.core.admission import admit_user
+from app.core.metrics import InstrumentedAPIRoute
+from app.services.supabase.auth import SupabaseAuthService, get_auth_service
+from app.services.supabase.storage import SupabaseStorageService, get_storage_service
+from app.models.storage import UploadedFile, UploadResponse
+
+router = APIRouter(route_class=InstrumentedAPIRoute)
+security = HTTPBearer()
+
+
+def _user_path(user_id: str, folder: Optional[str]) -> str:
+    """Return the directory a user's upload is stored in: the user's own directory, or a folder within it."""
+    folder = (folder or "").strip("/")
+    if not folder:
+        return user_id
+    if any(part in ("", ".", "..") for part in folder.split("/")):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid folder: {folder}")
+    return f"{user_id}/{folder}"
+
+
+@router.post("/upload", response_model=UploadedFile)
+async def upload_file(
+    file: UploadFile = File(...),
+    folder: Optional[str] = Form(default=None),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+    storage: SupabaseStorageService = Depends(get_storage_service),
+):
+    """
+    Upload a file to the user's directory in storage.
+
+    The file is streamed to Supabase Storage in chunks, with a resumable upload for large
+    files, so memory use does not depend on the file size.
+    """
+    try:
+        user = await auth_service.get_user(credentials.credentials)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Authentication failed: {str(e)}", headers={"WWW-Authenticate": "Bearer"})
+
+    admit_user(user.id)
+    path = _user_path(user.id, folder)
+
+    try:
+        return await storage.store_upload(file, path)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Upload failed: {str(e)}")
+
+
+@router.post("/upload/batch", response_model=UploadResponse)
+async def upload_files(
+    files: List[UploadFile] = File(...),
+    folder: Optional[str] = Form(default=None),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+    storage: SupabaseStorageService = Depends(get_storage_service),
+):
+    """Upload several files to the user's directory in storage, a few at a time."""
+    try:
+        user = await auth_service.get_user(credentials.credentials)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Authentication failed: {str(e)}", headers={"WWW-Authenticate": "Bearer"})
+
+    admit_user(user.id)
+    path = _user_path(user.id, folder)
+
+    try:
+        return UploadResponse(files=await storage.upload_files(files, path))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Upload failed: {str(e)}")
@@ -1,13 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import json
+import uuid
 
+from app.core.admission import AdmissionError, admit_user
+from app.core.metrics import InstrumentedAPIRoute
+from app.core.vector_encoding import MsgpackResponse, VectorEncoding, encode_vectors, wants_msgpack
 from app.services.vectordb import QdrantService, get_vector_db_service
+from app.services.vectordb.chunking import TokenChunker
+from app.services.vectordb.fusion import max_score_fusion, reciprocal_rank_fusion
+from app.services.vectordb.ingestion import ingest_documents, read_ndjson_documents
 from app.services.llm.embedding_service import EmbeddingService, get_embedding_service
 from app.services.supabase.auth import SupabaseAuthService, get_auth_service
-from app.models.vectordb import DocumentInput, SearchQuery, SearchResult, DocumentUploadResponse, DeleteDocumentsRequest
+from app.models.vectordb import (
+    BatchSearchQuery,
+    BatchSearchResult,
+    DocumentInput,
+    SearchQuery,
+    SearchResult,
+    DocumentUploadResponse,
+    DeleteDocumentsRequest,
+    IngestionProgress,
+)
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedAPIRoute)
 security = HTTPBearer()
 
 
@@ -22,13 +41,15 @@ async def add_documents(
     """Add documents to the vector database."""
     try:
         # Validate user authentication
-        await auth_service.get_user(credentials.credentials)
+        user = await auth_service.get_user(credentials.credentials)
+        admit_user(user.id)
+
+        if request.chunking:
+            return await _add_chunked_documents(request, embedding_service, vector_db)
 
-        # Generate embeddings for each document
-        all_embeddings = []
-        for document in request.documents:
-            embedding_response = await embedding_service.create_embedding(text=document.text, model=request.embedding_model)
-            all_embeddings.append(embedding_response.embedding)
+        # Generate embeddings for all documents in batched requests
+        embedding_response = await embedding_service.create_embeddings(texts=[doc.text for doc in request.documents], model=request.embedding_model)
+        all_embeddings = embedding_response.embeddings
 
         # Prepare documents and metadata for storage
         docs = [{"text": doc.text, "title": doc.title} for doc in request.documents]
@@ -38,34 +59,228 @@ async def add_documents(
         doc_ids = await vector_db.add_documents(documents=docs, embeddings=all_embeddings, metadata=metadata)
 
         return DocumentUploadResponse(document_ids=doc_ids)
+    except AdmissionError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Failed to add documents: {str(e)}")
 
 
+async def _add_chunked_documents(request: DocumentInput, embedding_service: EmbeddingService, vector_db: QdrantService) -> DocumentUploadResponse:
+    """Split documents into token windows and store each chunk, linked to its parent document."""
+    chunker = TokenChunker(chunk_size=request.chunking.chunk_size, chunk_overlap=request.chunking.chunk_overlap)
+    # Chunking is CPU-bound, so keep it off the event loop for large uploads
+    document_chunks = await asyncio.to_thread(lambda: [chunker.chunk(doc.text) for doc in request.documents])
+
+    parent_ids = [str(uuid.uuid4()) for _ in request.documents]
+    docs = []
+    metadata = []
+    for parent_id, document, chunks in zip(parent_ids, request.documents, document_chunks):
+        for chunk in chunks:
+            docs.append({"text": chunk.text, "title": document.title})
+            metadata.append(
+                {**(document.metadata or {}), "parent_id": parent_id, "chunk_index": chunk.index, "chunk_start": chunk.start, "chunk_end": chunk.end}
+            )
+
+    chunk_ids: List[List[str]] = [[] for _ in request.documents]
+    if docs:
+        embedding_response = await embedding_service.create_embeddings(texts=[doc["text"] for doc in docs], model=request.embedding_model)
+        point_ids = iter(await vector_db.add_documents(documents=docs, embeddings=embedding_response.embeddings, metadata=metadata))
+        chunk_ids = [[next(point_ids) for _ in chunks] for chunks in document_chunks]
+
+    return DocumentUploadResponse(document_ids=parent_ids, chunk_ids=chunk_ids)
+
+
+@router.post("/documents/stream")
+async def add_documents_stream(
+    request: Request,
+    embedding_model: str = "text-embedding-ada-002",
+    batch_size: int = Query(default=100, gt=0, le=2048),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    vector_db: QdrantService = Depends(get_vector_db_service),
+):
+    """
+    Add documents sent as newline-delimited JSON, one document per line.
+
+    Documents are embedded and stored in batches while the body is still being read, so
+    memory use does not depend on the size of the upload. The response is NDJSON with one
+    progress line per stored batch (including the assigned IDs), or an ``error`` line if
+    ingestion fails part way.
+    """
+    try:
+        # Validate user authentication
+        user = await auth_service.get_user(credentials.credentials)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Authentication failed: {str(e)}", headers={"WWW-Authenticate": "Bearer"})
+
+    admit_user(user.id)
+
+    progress = ingest_documents(
+        documents=read_ndjson_documents(request.stream()),
+        embedding_service=embedding_service,
+        vector_db=vector_db,
+        embedding_model=embedding_model,
+        batch_size=batch_size,
+    )
+
+    return _DuplexStreamingResponse(_ndjson_progress(progress), media_type="application/x-ndjson")
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    Streaming response whose content is produced while the request body is still being read.
+
+    StreamingResponse normally listens for client disconnects by consuming ``receive``,
+    which would swallow request body chunks the content iterator has not read yet.
+    Disconnects are instead detected when reading the request body fails.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+        if self.background is not None:
+            await self.background()
+
+
+async def _ndjson_progress(progress: AsyncIterator[IngestionProgress]) -> AsyncIterator[str]:
+    """Format ingestion progress as NDJSON, reporting failures in-band."""
+    try:
+        async for update in progress:
+            yield update.model_dump_json() + "\n"
+    except Exception as e:
+        # The response status has already been sent, so earlier batches stay stored
+        yield json.dumps({"error": f"Failed to add documents: {str(e)}"}) + "\n"
+    finally:
+        await progress.aclose()
+
+
 @router.post("/search", response_model=List[SearchResult])
 async def search_documents(
     query: SearchQuery,
+    response: Response,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     auth_service: SupabaseAuthService = Depends(get_auth_service),
     embedding_service: EmbeddingService = Depends(get_embedding_service),
     vector_db: QdrantService = Depends(get_vector_db_service),
+    accept: Optional[str] = Header(default=None),
 ):
-    """Search for documents similar to the query."""
+    """
+    Search for documents similar to the query.
+
+    Results are returned as msgpack instead of JSON when the Accept header prefers
+    ``application/msgpack``; binary-encoded vectors are then raw bytes.
+    """
     try:
         # Validate user authentication
-        await auth_service.get_user(credentials.credentials)
+        user = await auth_service.get_user(credentials.credentials)
+        admit_user(user.id)
 
         # Generate embedding for the query
         embedding_response = await embedding_service.create_embedding(text=query.query_text, model=query.embedding_model)
 
         # Search vector database
-        results = await vector_db.search(query_embedding=embedding_response.embedding, limit=query.limit, filter_params=query.filter_metadata)
+        results = await vector_db.search(
+            query_embedding=embedding_response.embedding,
+            limit=query.limit,
+            filter_params=query.filter_metadata,
+            collapse_chunks=query.collapse_chunks,
+            query_text=query.query_text if query.hybrid else None,
+            with_vectors=query.with_vectors,
+        )
+
+        binary = wants_msgpack(accept)
+        _encode_result_vectors(results, query.vector_encoding, binary)
 
+        if binary:
+            return MsgpackResponse(results, headers={"Vary": "Accept"})
+        response.headers["Vary"] = "Accept"
         return results
+    except AdmissionError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Search failed: {str(e)}")
 
 
+@router.post("/search/batch", response_model=BatchSearchResult)
+async def search_documents_batch(
+    batch: BatchSearchQuery,
+    response: Response,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    auth_service: SupabaseAuthService = Depends(get_auth_service),
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    vector_db: QdrantService = Depends(get_vector_db_service),
+    accept: Optional[str] = Header(default=None),
+):
+    """
+    Search for documents similar to each of several queries.
+
+    All query texts are embedded in one batched request per embedding model, and all
+    searches are sent to the vector database in one batch request. Like ``/search``,
+    responds with msgpack when the Accept header prefers it.
+    """
+    try:
+        # Validate user authentication
+        user = await auth_service.get_user(credentials.credentials)
+        admit_user(user.id)
+
+        # Generate embeddings for the queries, one batched request per embedding model
+        queries_by_model: Dict[str, List[int]] = {}
+        for i, query in enumerate(batch.queries):
+            queries_by_model.setdefault(query.embedding_model, []).append(i)
+
+        embedding_responses = await asyncio.gather(
+            *(embedding_service.create_embeddings(texts=[batch.queries[i].query_text for i in indices], model=model) for model, indices in queries_by_model.items())
+        )
+        embeddings: List[Any] = [None for _ in batch.queries]
+        for indices, embedding_response in zip(queries_by_model.values(), embedding_responses):
+            for i, embedding in zip(indices, embedding_response.embeddings):
+                embeddings[i] = embedding
+
+        # Search vector database
+        results = await vector_db.search_batch(
+            [
+                {
+                    "query_embedding": embedding,
+                    "limit": query.limit,
+                    "filter_params": query.filter_metadata,
+                    "collapse_chunks": query.collapse_chunks,
+                    "query_text": query.query_text if query.hybrid else None,
+                    "with_vectors": query.with_vectors,
+                }
+                for query, embedding in zip(batch.queries, embeddings)
+            ]
+        )
+
+        binary = wants_msgpack(accept)
+        for query, query_results in zip(batch.queries, results):
+            _encode_result_vectors(query_results, query.vector_encoding, binary)
+
+        fused = None
+        if batch.fusion:
+            fusion_limit = batch.fusion_limit or max(query.limit for query in batch.queries)
+            fused = reciprocal_rank_fusion(results, fusion_limit) if batch.fusion == "rrf" else max_score_fusion(results, fusion_limit)
+
+        if binary:
+            return MsgpackResponse({"results": results, "fused": fused}, headers={"Vary": "Accept"})
+        response.headers["Vary"] = "Accept"
+        return BatchSearchResult(results=results, fused=fused)
+    except AdmissionError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Batch search failed: {str(e)}")
+
+
+def _encode_result_vectors(results: List[Dict[str, Any]], encoding: VectorEncoding, binary: bool):
+    """Encode the vectors of search results in place, all in one array conversion."""
+    with_vectors = [result for result in results if result.get("vector") is not None]
+    if not with_vectors:
+        return
+
+    for result, vector in zip(with_vectors, encode_vectors([result["vector"] for result in with_vectors], encoding, binary=binary)):
+        result["vector"] = vector
+
+
 @router.delete("/documents", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_documents(
     request: DeleteDocumentsRequest,
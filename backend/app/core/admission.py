@@ -0,0 +1,274 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Deque, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import ADMISSION_CONCURRENCY, SERVICE_EVENTS
+
+# User that provider calls made by the current request are attributed to, for fair queuing
+current_user_id: ContextVar[Optional[str]] = ContextVar("current_user_id", default=None)
+
+
+class AdmissionError(Exception):
+    """A request refused by admission control; it may be retried after ``retry_after`` seconds."""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimitedError(AdmissionError):
+    """The user has used up their request rate."""
+
+    status_code = 429
+
+
+class OverloadedError(AdmissionError):
+    """A provider call waited too long, or found the queue full, and was shed."""
+
+    status_code = 503
+
+
+def is_throttling_error(error: Optional[BaseException]) -> bool:
+    """Return whether an exception is a provider's "too many requests" (HTTP 429) response."""
+    return getattr(error, "status_code", None) == 429
+
+
+@dataclass
+class AdmissionStats:
+    """Counters for admission control."""
+
+    admitted: int = 0
+    # Refused by the user's token bucket
+    rate_limited: int = 0
+    # Refused because the queue was full or the wait too long
+    shed: int = 0
+    # Provider calls that failed with a 429 response
+    throttled: int = 0
+
+
+@dataclass
+class _Bucket:
+    tokens: float
+    updated_at: float
+
+
+class UserRateLimiter:
+    """
+    Per-user token buckets: each user may make ``burst`` requests at once, refilled at
+    ``rate`` requests per second.
+
+    Buckets of users who stay idle until their bucket is full again are forgotten, and at
+    most ``max_users`` buckets are kept. Not thread-safe; used from the event loop.
+    """
+
+    def __init__(self, rate: float, burst: float, max_users: int):
+        """
+        Initialize the limiter.
+
+        Args:
+            rate: Requests per second added to each bucket (0 disables rate limiting)
+            burst: Capacity of each bucket
+            max_users: Maximum number of buckets kept
+        """
+        self.rate = rate
+        self.burst = burst
+        self.stats = AdmissionStats()
+        self._buckets: TTLCache[_Bucket] = TTLCache(max_size=max_users)
+
+    def acquire(self, user_id: str, cost: float = 1.0) -> None:
+        """
+        Take ``cost`` tokens from a user's bucket.
+
+        Raises:
+            RateLimitedError: If the bucket holds fewer than ``cost`` tokens
+        """
+        if self.rate <= 0:
+            return
+
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        tokens = self.burst if bucket is None else min(self.burst, bucket.tokens + (now - bucket.updated_at) * self.rate)
+
+        if tokens < cost:
+            self.stats.rate_limited += 1
+            raise RateLimitedError("Too many requests, please slow down", retry_after=(cost - tokens) / self.rate)
+
+        tokens -= cost
+        self.stats.admitted += 1
+        # Once full again, the bucket is no different from a new one
+        self._buckets.set(user_id, _Bucket(tokens=tokens, updated_at=now), expires_at=time.time() + (self.burst - tokens) / self.rate)
+
+
+class Admission:
+    """A concurrency slot held by an admitted provider call. Use as a context manager, or call ``release``."""
+
+    def __init__(self, limiter: "FairConcurrencyLimiter"):
+        self._limiter = limiter
+        self._released = False
+
+    def release(self, error: Optional[BaseException] = None) -> None:
+        """Give the slot back, reporting how the call ended. Only the first call has an effect."""
+        if not self._released:
+            self._released = True
+            self._limiter._finish(error)
+
+    def __enter__(self) -> "Admission":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release(exc)
+
+
+class FairConcurrencyLimiter:
+    """
+    Cap on concurrent calls to a provider, with fair queuing between users and an adaptive limit.
+
+    Calls beyond the limit wait in per-user queues that are served round-robin, so one user
+    with many queued calls can't starve the others. Calls are shed when the queue is full
+    or after waiting ``max_queue_seconds``, rather than piling up behind a slow provider.
+
+    The limit adapts to the provider (additive increase, multiplicative decrease): it halves
+    when the provider answers 429, at most once per ``DECREASE_INTERVAL`` seconds since calls
+    already in flight fail together, and grows back by one for every ``limit`` successful calls.
+    Not thread-safe; used from the event loop.
+    """
+
+    DECREASE_INTERVAL = 1.0
+
+    def __init__(self, max_concurrency: int, min_concurrency: int, max_queue_length: int, max_queue_seconds: float):
+        """
+        Initialize the limiter.
+
+        Args:
+            max_concurrency: Highest concurrency limit, used until the provider throttles
+            min_concurrency: Lowest concurrency limit after throttling
+            max_queue_length: Calls waiting beyond this many are shed immediately
+            max_queue_seconds: Calls waiting longer than this are shed
+        """
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = max(1, min(min_concurrency, max_concurrency))
+        self.max_queue_length = max_queue_length
+        self.max_queue_seconds = max_queue_seconds
+        self.limit = float(max_concurrency)
+        self.active = 0
+        self.queued = 0
+        self.stats = AdmissionStats()
+        self._last_decrease = float("-inf")
+        # Users with waiting calls, in round-robin order
+        self._queues: "OrderedDict[Optional[str], Deque[asyncio.Future]]" = OrderedDict()
+
+    async def acquire(self, user_id: Optional[str]) -> Admission:
+        """
+        Wait for a concurrency slot for a call made on behalf of a user.
+
+        Raises:
+            OverloadedError: If the call is shed
+        """
+        if self.active < int(self.limit) and not self.queued:
+            self.active += 1
+            self.stats.admitted += 1
+            return Admission(self)
+
+        if self.queued >= self.max_queue_length:
+            self.stats.shed += 1
+            raise OverloadedError("Service is overloaded, please retry later", retry_after=self.max_queue_seconds)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(future)
+        self.queued += 1
+
+        try:
+            await asyncio.wait_for(future, self.max_queue_seconds)
+        except BaseException as error:
+            if future.done() and not future.cancelled():
+                # The slot was granted as the wait ended; pass it on
+                self._finish(None, count=False)
+            else:
+                self._dequeue(user_id, future)
+
+            if isinstance(error, asyncio.TimeoutError):
+                self.stats.shed += 1
+                raise OverloadedError("Service is overloaded, please retry later", retry_after=self.max_queue_seconds) from None
+            raise
+
+        return Admission(self)
+
+    def _dequeue(self, user_id: Optional[str], future: asyncio.Future) -> None:
+        """Remove a waiter that gave up."""
+        queue = self._queues.get(user_id)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self.queued -= 1
+            if not queue:
+                del self._queues[user_id]
+
+    def _finish(self, error: Optional[BaseException], count: bool = True) -> None:
+        """Release a slot, adapt the limit to how the call ended, and admit waiting calls."""
+        self.active -= 1
+
+        if count and is_throttling_error(error):
+            self.stats.throttled += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= self.DECREASE_INTERVAL:
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self._last_decrease = now
+        elif count and error is None:
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+        # Serve users round-robin: take the head call of the first user, then move that user to the back
+        while self._queues and self.active < int(self.limit):
+            user_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+
+            if not future.done():
+                future.set_result(None)
+                self.active += 1
+                self.stats.admitted += 1
+
+
+@lru_cache()
+def get_user_rate_limiter() -> UserRateLimiter:
+    """Return the process-wide per-user request rate limiter."""
+    limiter = UserRateLimiter(rate=settings.ADMISSION_USER_RATE, burst=settings.ADMISSION_USER_BURST, max_users=settings.ADMISSION_MAX_USERS)
+    SERVICE_EVENTS.register(("user_rate_limit", ""), limiter.stats)
+    return limiter
+
+
+@lru_cache()
+def get_concurrency_limiter(provider: str) -> FairConcurrencyLimiter:
+    """Return the process-wide concurrency limiter of a provider."""
+    limiter = FairConcurrencyLimiter(
+        max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+        min_concurrency=settings.ADMISSION_MIN_CONCURRENCY,
+        max_queue_length=settings.ADMISSION_MAX_QUEUE_LENGTH,
+        max_queue_seconds=settings.ADMISSION_MAX_QUEUE_SECONDS,
+    )
+    SERVICE_EVENTS.register(("admission", provider), limiter.stats)
+    ADMISSION_CONCURRENCY.register(
+        lambda: [((provider, "limit"), int(limiter.limit)), ((provider, "active"), limiter.active), ((provider, "queued"), limiter.queued)]
+    )
+    return limiter
+
+
+def admit_user(user_id: str) -> None:
+    """
+    Charge a request to a user's rate limit, and attribute the provider calls it makes to the user.
+
+    Raises:
+        RateLimitedError: If the user is over their rate limit
+    """
+    get_user_rate_limiter().acquire(user_id)
+    current_user_id.set(user_id)
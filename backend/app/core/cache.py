@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    Bounded in-process LRU cache with per-entry expiry.
+
+    Entries are evicted in least-recently-used order once ``max_size`` entries (or
+    ``max_bytes`` of caller-reported entry sizes) are exceeded, and are dropped lazily
+    on lookup once their expiry timestamp has passed.
+    The cache is not thread-safe; it is intended to be used from the event loop.
+    """
+
+    def __init__(self, max_size: Optional[int] = 1024, max_bytes: Optional[int] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of entries kept before evicting the oldest (None for no limit)
+            max_bytes: Optional cap on the total size reported by ``set``
+        """
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[V, Optional[float], int]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Optional[V]:
+        """Return the cached value for a key, or ``default`` if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+
+        value, expires_at, _ = entry
+        if expires_at is not None and expires_at <= time.time():
+            self.pop(key)
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: V, expires_at: Optional[float] = None, size: int = 0) -> None:
+        """
+        Store a value.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            expires_at: Optional absolute UNIX timestamp after which the entry is stale
+            size: Size of the value in bytes, counted against ``max_bytes``
+        """
+        if (self.max_size is not None and self.max_size <= 0) or (self.max_bytes is not None and size > self.max_bytes):
+            return
+
+        self.pop(key)
+        self._entries[key] = (value, expires_at, size)
+        self.total_bytes += size
+
+        while (self.max_size is not None and len(self._entries) > self.max_size) or (self.max_bytes is not None and self.total_bytes > self.max_bytes):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def pop(self, key: Hashable) -> None:
+        """Remove a key if present."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
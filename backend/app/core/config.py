@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import Dict, List, Optional, Union
 
 from pydantic_settings import BaseSettings
 
@@ -8,6 +8,8 @@ class Settings(BaseSettings):
 
     # Application
     ENVIRONMENT: str = "development"
+    # Serve Prometheus metrics at /metrics; keep the path private to the scraper (e.g. at the proxy) when enabled
+    METRICS_ENABLED: bool = False
 
     # CORS
     CORS_ORIGINS: Union[List[str], str] = ["http://localhost:3000"]
@@ -15,15 +17,130 @@ class Settings(BaseSettings):
     # Supabase
     SUPABASE_URL: str
     SUPABASE_SERVICE_KEY: str
+    # Connection pool shared by all services that talk to Supabase
+    SUPABASE_HTTP_MAX_CONNECTIONS: int = 100
+    SUPABASE_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    SUPABASE_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    SUPABASE_HTTP_TIMEOUT: float = 10.0
+    # Database listings: rows per keyset-paginated page (at most the server's max-rows, 1000 by default)
+    SUPABASE_DB_PAGE_SIZE: int = 1000
+    # Bulk writes: rows per insert or upsert request, and requests in flight at a time
+    SUPABASE_DB_BATCH_SIZE: int = 500
+    SUPABASE_DB_WRITE_CONCURRENCY: int = 4
+
+    # Auth token verification
+    # "remote" asks Supabase Auth on every request, "local" verifies the JWT signature in-process
+    SUPABASE_AUTH_MODE: str = "remote"
+    SUPABASE_JWT_SECRET: str = ""
+    SUPABASE_JWKS_URL: str = ""
+    SUPABASE_JWT_AUDIENCE: str = "authenticated"
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    # Re-validate cached tokens against Supabase Auth after this many seconds (0 disables)
+    AUTH_REMOTE_RECHECK_SECONDS: int = 0
 
     # LLM
     OPENAI_API_KEY: str = ""
     ANTHROPIC_API_KEY: str = ""
+    # Cache of deterministic (temperature 0) generations: "memory", "sqlite" (shared by workers on a host) or "none"
+    LLM_CACHE_BACKEND: str = "memory"
+    LLM_CACHE_TTL_SECONDS: int = 3600
+    LLM_CACHE_MAX_ENTRIES: int = 10000
+    LLM_CACHE_PATH: str = ".cache/llm_responses.sqlite3"
+    # Tail latency policy for text generation
+    # Budget for a whole request, fallbacks included (requests may ask for less); streams must start within it
+    LLM_DEADLINE_SECONDS: float = 60.0
+    # Time one provider gets before falling back to the next
+    LLM_ATTEMPT_TIMEOUT_SECONDS: float = 30.0
+    # Retries made by the provider SDKs themselves, within an attempt
+    LLM_MAX_RETRIES: int = 2
+    # Send a second, hedged request once a call is slower than this percentile of recent latencies (0 disables)
+    LLM_HEDGE_PERCENTILE: float = 0.0
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 1.0
+    # Targets tried in order when a provider errors or times out, e.g. {"openai": ["anthropic:claude-3-haiku-20240307"]}
+    LLM_FALLBACKS: Dict[str, List[str]] = {}
+
+    # Admission control in front of LLM and embedding providers
+    # Per-user token bucket: requests per second and burst size (a rate of 0 disables it)
+    ADMISSION_USER_RATE: float = 0.0
+    ADMISSION_USER_BURST: float = 20.0
+    ADMISSION_MAX_USERS: int = 100000
+    # Concurrent calls per provider; the limit drops towards the minimum when the provider answers 429
+    ADMISSION_MAX_CONCURRENCY: int = 32
+    ADMISSION_MIN_CONCURRENCY: int = 2
+    # Calls beyond the limit queue fairly between users, and are shed when the queue is full or after waiting this long
+    ADMISSION_MAX_QUEUE_LENGTH: int = 256
+    ADMISSION_MAX_QUEUE_SECONDS: float = 5.0
+
+    # Embeddings
+    # Provider limits for a single batched embeddings request
+    EMBEDDING_BATCH_MAX_ITEMS: int = 2048
+    EMBEDDING_BATCH_MAX_TOKENS: int = 300000
+    # Maximum number of batched embedding requests in flight per service
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    # Content-addressed cache of embedding vectors (in-process LRU + local SQLite file)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_MEMORY_BYTES: int = 256 * 1024 * 1024
+    EMBEDDING_CACHE_PATH: str = ".cache/embeddings.sqlite3"
+    # Vectors kept in the SQLite file; the oldest written are evicted beyond it
+    EMBEDDING_CACHE_MAX_DISK_ENTRIES: int = 250000
+    # "local" provider: embeddings computed on this machine's CPU
+    # Length of the vectors of the built-in "hashing" model
+    LOCAL_EMBEDDING_DIMENSIONS: int = 384
+    # Weights of the "projection" model: an .npz file with a "projection" matrix and optional "idf" vector
+    LOCAL_EMBEDDING_WEIGHTS_PATH: str = ""
+    # Threads embedding chunks of a batch in parallel, and the number of texts in each chunk
+    LOCAL_EMBEDDING_WORKERS: int = 4
+    LOCAL_EMBEDDING_CHUNK_SIZE: int = 256
 
     # Vector Database
     QDRANT_URL: str = ""
     QDRANT_API_KEY: str = ""
     QDRANT_COLLECTION_NAME: str = "default_collection"
+    # Without QDRANT_URL, collections are kept in an embedded index persisted here (empty keeps them in memory only)
+    QDRANT_EMBEDDED_PATH: str = ".vector_index"
+    # Seconds before a Qdrant call is abandoned
+    QDRANT_TIMEOUT: float = 10.0
+    # Threads used to run blocking Qdrant client calls off the event loop
+    QDRANT_MAX_WORKERS: int = 8
+    # Collection tuning, applied when the service creates a collection
+    # Vector quantization: "" (none), "scalar" (int8) or "binary"
+    QDRANT_QUANTIZATION: str = ""
+    # Keep quantized vectors in RAM even when the original vectors are on disk
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = True
+    # Re-rank quantized search candidates with the original vectors, fetching this many times the limit
+    QDRANT_QUANTIZATION_RESCORE: bool = True
+    QDRANT_QUANTIZATION_OVERSAMPLING: float = 2.0
+    # HNSW graph parameters (None keeps the server defaults); QDRANT_HNSW_EF is used at search time
+    QDRANT_HNSW_M: Optional[int] = None
+    QDRANT_HNSW_EF_CONSTRUCT: Optional[int] = None
+    QDRANT_HNSW_EF: Optional[int] = None
+    QDRANT_ON_DISK_VECTORS: bool = False
+    QDRANT_ON_DISK_PAYLOAD: bool = False
+    # Filterable metadata fields and their payload index types, e.g. {"source": "keyword", "year": "integer"}
+    QDRANT_PAYLOAD_INDEXES: Dict[str, str] = {}
+    # Store a BM25 sparse vector with each point, enabling hybrid search (needs Qdrant server 1.10 or later)
+    QDRANT_SPARSE_VECTORS: bool = False
+
+    # Uploads to Supabase Storage
+    # Bucket the upload endpoints write to
+    STORAGE_UPLOAD_BUCKET: str = "default"
+    # Larger files are sent with resumable (TUS) uploads, in 6 MB chunks; smaller ones in a single request
+    STORAGE_RESUMABLE_THRESHOLD_BYTES: int = 6 * 1024 * 1024
+    # Times a resumable upload resumes from the last stored offset after a failed chunk
+    STORAGE_UPLOAD_RETRIES: int = 3
+    # Files of one request uploaded at a time
+    STORAGE_UPLOAD_CONCURRENCY: int = 4
+
+    # Incremental sync of Supabase Storage buckets into the vector database
+    # Local record of the synced files: their entity tags, content hashes and vector IDs
+    STORAGE_SYNC_MANIFEST_PATH: str = ".cache/storage_sync.sqlite3"
+    # Files downloaded, chunked and embedded at a time, and entries per listing request
+    STORAGE_SYNC_CONCURRENCY: int = 4
+    STORAGE_SYNC_PAGE_SIZE: int = 1000
+    # Larger files are skipped
+    STORAGE_SYNC_MAX_FILE_BYTES: int = 20 * 1024 * 1024
+    STORAGE_SYNC_CHUNK_SIZE: int = 512
+    STORAGE_SYNC_CHUNK_OVERLAP: int = 64
 
     class Config:
         env_file = ".env"
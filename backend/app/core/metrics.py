@@ -0,0 +1,290 @@
+import dataclasses
+import math
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+
+Labels = Tuple[str, ...]
+
+# Histogram buckets in seconds, from fast in-process work up to slow LLM generations
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Buckets for counts of items, such as texts per embedding request
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base class of metrics: a name, help text, type and label names."""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """Yield (sample name, label names, label values, value) for the exposition."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{_format_labels(names, values)} {_format_value(value)}" for name, names, values, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        for labels, value in list(self._values.items()):
+            yield self.name, self.labelnames, labels, value
+
+
+class Gauge(_Metric):
+    """Value per label set that can go up and down."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def set(self, labels: Labels, value: float) -> None:
+        self._values[labels] = value
+
+    def samples(self):
+        for labels, value in list(self._values.items()):
+            yield self.name, self.labelnames, labels, value
+
+
+class _Series:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    """Distribution of observed values per label set, counted in fixed buckets."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, _Series] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _Series(len(self.buckets))
+        # Only the first bucket holding the value is counted here; buckets are made cumulative when rendered
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+
+    def samples(self):
+        names = self.labelnames + ("le",)
+        for labels, series in list(self._series.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (math.inf,), series.counts):
+                total += count
+                yield f"{self.name}_bucket", names, labels + (_format_value(bound),), total
+            yield f"{self.name}_sum", self.labelnames, labels, series.sum
+            yield f"{self.name}_count", self.labelnames, labels, total
+
+
+class StatsMetric(_Metric):
+    """
+    Counters read at scrape time from the stats dataclasses services already keep, such as
+    ResponseCacheStats, so the hot path is not instrumented twice.
+
+    Each numeric field becomes a sample with ``event=<field>``; dict fields become one
+    sample per key, with ``event=<field>:<key>``. Stats objects are held weakly, so
+    registering the stats of short-lived services does not keep them alive.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._sources: List[Tuple[Labels, "weakref.ref[Any]"]] = []
+
+    def register(self, labels: Labels, stats: Any) -> None:
+        """Expose a stats dataclass under the given label values."""
+        self._sources.append((labels, weakref.ref(stats)))
+
+    def samples(self):
+        names = self.labelnames + ("event",)
+        self._sources = [(labels, ref) for labels, ref in self._sources if ref() is not None]
+        for labels, ref in self._sources:
+            stats = ref()
+            if stats is None:
+                continue
+            for field in dataclasses.fields(stats):
+                value = getattr(stats, field.name)
+                if isinstance(value, dict):
+                    for key, count in list(value.items()):
+                        yield self.name, names, labels + (f"{field.name}:{key}",), count
+                else:
+                    yield self.name, names, labels + (field.name,), value
+
+
+class CallbackGauge(_Metric):
+    """Gauge whose values are computed by a callback at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._callbacks: List[Callable[[], Iterable[Tuple[Labels, float]]]] = []
+
+    def register(self, callback: Callable[[], Iterable[Tuple[Labels, float]]]) -> None:
+        """Add a callback yielding (label values, value) pairs."""
+        self._callbacks.append(callback)
+
+    def samples(self):
+        for callback in self._callbacks:
+            for labels, value in callback():
+                yield self.name, self.labelnames, labels, value
+
+
+class MetricsRegistry:
+    """
+    The metrics of the process, rendered in the Prometheus text exposition format.
+
+    Metrics are plain dictionaries updated from the event loop, where updates never
+    interleave, so recording takes no locks. Rendering copies each metric's entries
+    before reading them.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def add(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.add(Counter("http_requests_total", "HTTP requests handled, by route and status code.", ("method", "route", "status")))
+HTTP_REQUEST_DURATION = REGISTRY.add(
+    Histogram("http_request_duration_seconds", "Time to handle HTTP requests, response body included.", ("method", "route"))
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.add(Gauge("http_requests_in_flight", "HTTP requests being handled.", ("method", "route")))
+
+UPSTREAM_DURATION = REGISTRY.add(
+    Histogram(
+        "upstream_request_duration_seconds",
+        "Time spent in calls to upstream dependencies (supabase_auth, openai, anthropic, qdrant, ...).",
+        ("dependency", "operation", "outcome"),
+    )
+)
+LLM_TOKENS = REGISTRY.add(Counter("llm_tokens_total", "Tokens reported by LLM and embedding providers.", ("provider", "model", "type")))
+EMBEDDING_BATCH_SIZE = REGISTRY.add(
+    Histogram("embedding_batch_size", "Texts per embedding call sent to a provider.", ("provider",), buckets=SIZE_BUCKETS)
+)
+
+SERVICE_EVENTS = REGISTRY.add(
+    StatsMetric(
+        "service_events_total",
+        "Counters kept by services: cache hits and misses, coalesced calls, admission and routing outcomes.",
+        ("component", "provider"),
+    )
+)
+ADMISSION_CONCURRENCY = REGISTRY.add(
+    CallbackGauge("admission_concurrency", "Provider concurrency limiter state: limit, active and queued calls.", ("provider", "state"))
+)
+
+
+@contextmanager
+def observe_upstream(dependency: str, operation: str) -> Iterator[None]:
+    """Time a call to an upstream dependency, labelled with whether it succeeded."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        UPSTREAM_DURATION.observe((dependency, operation, outcome), time.perf_counter() - started)
+
+
+def record_usage(provider: str, model: str, prompt_tokens: int, completion_tokens: Optional[int] = None) -> None:
+    """Count the tokens a provider reported for a call."""
+    LLM_TOKENS.inc((provider, model, "prompt"), prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.inc((provider, model, "completion"), completion_tokens)
+
+
+class InstrumentedAPIRoute(APIRoute):
+    """API route recording request counts, latency and in-flight requests under its path template."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        super().__init__(path, endpoint, **kwargs)
+        handle = self.app
+        route = self.path
+
+        async def app(scope, receive, send):
+            key = (scope["method"], route)
+            status = 500
+
+            async def send_with_status(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                await send(message)
+
+            HTTP_REQUESTS_IN_FLIGHT.inc(key)
+            started = time.perf_counter()
+            try:
+                await handle(scope, receive, send_with_status)
+            finally:
+                HTTP_REQUEST_DURATION.observe(key, time.perf_counter() - started)
+                HTTP_REQUESTS_IN_FLIGHT.dec(key)
+                HTTP_REQUESTS.inc(key + (str(status),))
+
+        self.app = app
@@ -0,0 +1,93 @@
+import logging
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# ID of the request being handled, for log lines and upstream calls made on its behalf
+current_request_id: ContextVar[Optional[str]] = ContextVar("current_request_id", default=None)
+
+# Request IDs sent by clients or proxies are kept if they are short and made of safe characters
+_VALID_REQUEST_ID = re.compile(rb"[A-Za-z0-9._:\-]{1,128}")
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware giving each HTTP request an ID and timing it.
+
+    The ID is taken from an incoming ``X-Request-ID`` header when it is valid, and generated
+    otherwise. It is stored in ``current_request_id`` and ``scope["state"]``, and returned in
+    the ``X-Request-ID`` response header along with a ``Server-Timing`` header holding the
+    time until the response started. Streaming responses pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                if _VALID_REQUEST_ID.fullmatch(value):
+                    request_id = value.decode("latin-1")
+                break
+        if request_id is None:
+            request_id = uuid.uuid4().hex
+
+        scope.setdefault("state", {})["request_id"] = request_id
+        token = current_request_id.set(request_id)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_context(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (time.perf_counter() - started) * 1000
+                headers = list(message.get("headers", ()))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                headers.append((b"server-timing", f"app;dur={elapsed:.1f}".encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_context)
+        finally:
+            current_request_id.reset(token)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    f"{scope['method']} {scope['path']} {status} {(time.perf_counter() - started) * 1000:.1f}ms request_id={request_id}"
+                )
+
+
+class OptionsMiddleware:
+    """
+    ASGI middleware answering OPTIONS requests that reach it with 204 and an ``Allow`` header.
+
+    Install it inside ``CORSMiddleware``: CORS preflight requests are answered by
+    ``CORSMiddleware``, with its access control headers, before they get here, so only
+    plain OPTIONS requests are short-circuited instead of failing route matching with 405.
+    """
+
+    def __init__(self, app: ASGIApp, allow_methods: Iterable[str]):
+        self.app = app
+        self._allow = ", ".join(allow_methods).encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        await send({"type": "http.response.start", "status": 204, "headers": [(b"allow", self._allow)]})
+        await send({"type": "http.response.body", "body": b""})
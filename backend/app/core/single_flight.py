@@ -0,0 +1,85 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class SingleFlightStats:
+    """Counters for a SingleFlight group."""
+
+    # Calls made through the group, and how many of them joined a call already in flight
+    calls: int = 0
+    collapsed: int = 0
+
+
+class _Flight(Generic[T]):
+    """An upstream call in progress and the number of callers waiting on it."""
+
+    def __init__(self, task: "asyncio.Task[T]"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """
+    Collapse concurrent calls with the same key into a single upstream call.
+
+    The first caller for a key starts the call as a task; callers arriving while it is
+    in flight await the same task. A caller that is cancelled stops waiting without
+    affecting the others, and the upstream call is only cancelled once every caller
+    has gone away. Results are not kept after the call completes.
+    The group is not thread-safe; it is intended to be used from the event loop.
+    """
+
+    def __init__(self):
+        """Initialize an empty group."""
+        self.stats = SingleFlightStats()
+        self._flights: Dict[Hashable, _Flight[T]] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Run ``func`` unless a call with the same key is already in flight, and return its result.
+
+        Args:
+            key: Identity of the call
+            func: Starts the upstream call; only invoked when no call for ``key`` is in flight
+
+        Returns:
+            Tuple of the result and whether it was shared with an earlier caller
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+
+        self.stats.calls += 1
+        if shared:
+            self.stats.collapsed += 1
+
+        flight.waiters += 1
+        try:
+            # Shield the shared task so that cancelling one caller doesn't cancel it for everyone
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                self._forget(key, flight)
+
+    def _finish(self, key: Hashable, flight: _Flight[T]) -> None:
+        """Forget a completed flight, marking its exception as retrieved in case every caller left."""
+        if not flight.task.cancelled():
+            flight.task.exception()
+        self._forget(key, flight)
+
+    def _forget(self, key: Hashable, flight: _Flight[T]) -> None:
+        """Remove a finished or abandoned flight, unless a newer one has replaced it."""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def __len__(self) -> int:
+        return len(self._flights)
@@ -0,0 +1,87 @@
+import base64
+from typing import Any, List, Literal, Optional, Sequence, Union
+
+import numpy as np
+from fastapi.responses import Response
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency; without it, responses are always JSON
+    msgpack = None
+
+# How vectors are written in responses: "float" as numbers, "float32"/"float16" as little-endian
+# bytes (base64 text in JSON bodies, raw binary in msgpack bodies)
+VectorEncoding = Literal["float", "float32", "float16"]
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2")}
+
+
+def encode_vectors(vectors: Union[Sequence[Sequence[float]], np.ndarray], encoding: VectorEncoding, binary: bool = False) -> List[Any]:
+    """
+    Encode equal-length vectors for a response.
+
+    Binary encodings convert all vectors to one NumPy array and slice its buffer, so no
+    per-element Python work is done.
+
+    Args:
+        vectors: Vectors to encode
+        encoding: Encoding to use
+        binary: Return raw bytes instead of base64 text, for binary response bodies
+
+    Returns:
+        The encoded vectors, in order
+    """
+    if encoding == "float":
+        return vectors.tolist() if isinstance(vectors, np.ndarray) else list(vectors)
+    if not len(vectors):
+        return []
+
+    matrix = np.ascontiguousarray(vectors, dtype=_DTYPES[encoding])
+    data = matrix.tobytes()
+    row_bytes = matrix.shape[1] * matrix.itemsize
+    rows = [data[start : start + row_bytes] for start in range(0, len(data), row_bytes)]
+
+    return rows if binary else [base64.b64encode(row).decode("ascii") for row in rows]
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """
+    Decide from an Accept header whether to respond with msgpack rather than JSON.
+
+    msgpack is chosen when it has a higher quality value than JSON (or appears first on a
+    tie) and the msgpack package is installed; anything else, including ``*/*``, gets JSON.
+    """
+    if not accept or msgpack is None:
+        return False
+
+    best_json = best_msgpack = None
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        # Higher quality wins, then earlier position
+        rank = (quality, -position)
+        if media_type.lower() in MSGPACK_MEDIA_TYPES and quality > 0:
+            best_msgpack = max(best_msgpack or rank, rank)
+        elif media_type.lower() in ("application/json", "application/*", "*/*") and quality > 0:
+            best_json = max(best_json or rank, rank)
+
+    return best_msgpack is not None and (best_json is None or best_msgpack > best_json)
+
+
+class MsgpackResponse(Response):
+    """Response with a msgpack body; bytes values are written as msgpack binary."""
+
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True)
@@ -1,39 +1,80 @@
-from fastapi import FastAPI, Request, Response
+from contextlib import asynccontextmanager
+import logging
+import math
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 
 from app.api.router import api_router
+from app.core.admission import AdmissionError
 from app.core.config import settings
+from app.core.metrics import REGISTRY
+from app.core.middleware import OptionsMiddleware, RequestContextMiddleware
+from app.services.supabase.client import get_supabase_registry
+from app.services.vectordb import get_vector_db_service
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared clients on startup and release their connections on shutdown."""
+    supabase_registry = get_supabase_registry()
+    # Create the shared Supabase client up front rather than on the first request
+    supabase_registry.client
+
+    # Open the vector DB up front, so that an embedded index already in use by another worker stops startup
+    vector_db = get_vector_db_service()
+    # Warm the vector DB collection registry; failures only cost an extra check on first use
+    try:
+        await vector_db.load_collections()
+    except Exception as e:
+        logger.warning(f"Could not load vector DB collections: {str(e)}")
+
+    yield
+    supabase_registry.close()
+    # Flush and close the embedded index, releasing its directory; a restarted app opens a new service
+    vector_db.close()
+    get_vector_db_service.cache_clear()
+
 
 app = FastAPI(
     title="Full Stack App Backend",
     description="API for the Full Stack Application",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 
-# Custom middleware to handle OPTIONS requests properly
-class OptionsMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if request.method == "OPTIONS":
-            return Response(status_code=200)
-        return await call_next(request)
+CORS_METHODS = ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"]
 
+# Middleware added last runs first: request IDs and timing, then CORS, then OPTIONS.
+# All three are plain ASGI middleware, so streaming responses pass through unbuffered.
 
-# Add OPTIONS middleware first
-app.add_middleware(OptionsMiddleware)
+# Answer OPTIONS requests that are not CORS preflights (CORSMiddleware answers those)
+app.add_middleware(OptionsMiddleware, allow_methods=CORS_METHODS)
 
 # Set up CORS - Expanded configuration
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000", *settings.CORS_ORIGINS],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-    allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "X-Requested-With", "X-CSRF-Token"],
-    expose_headers=["Content-Type", "Authorization"],
+    allow_methods=CORS_METHODS,
+    allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "X-Requested-With", "X-CSRF-Token", "X-LLM-Cache", "X-Request-ID"],
+    expose_headers=["Content-Type", "Authorization", "Retry-After", "X-Request-ID", "Server-Timing"],
     max_age=600,  # 10 minutes cache for preflight requests
 )
 
+app.add_middleware(RequestContextMiddleware)
+
+
+@app.exception_handler(AdmissionError)
+async def admission_error_handler(request: Request, exc: AdmissionError):
+    """Answer requests refused by admission control with 429 or 503 and a Retry-After header."""
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers={"Retry-After": str(math.ceil(exc.retry_after))})
+
+
 # Include API router
 app.include_router(api_router, prefix="/api")
 
@@ -44,6 +85,14 @@ async def root():
     return {"status": "online", "environment": settings.ENVIRONMENT, "version": "0.1.0"}
 
 
+if settings.METRICS_ENABLED:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Process metrics in the Prometheus text exposition format."""
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 if __name__ == "__main__":
     import uvicorn
 
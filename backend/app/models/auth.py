@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import Any, Dict, List, Optional, Union
 
 
 class UserProfile(BaseModel):
@@ -11,6 +11,18 @@ class UserProfile(BaseModel):
     avatar_url: Optional[str] = None
 
 
+class AuthenticatedUser(BaseModel):
+    """User identity resolved from a locally verified access token."""
+
+    id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+    aud: Optional[Union[str, List[str]]] = None
+    app_metadata: Dict[str, Any] = Field(default_factory=dict)
+    user_metadata: Dict[str, Any] = Field(default_factory=dict)
+    expires_at: int
+
+
 class TokenResponse(BaseModel):
     """OAuth token response."""
 
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from typing import List, Optional, Literal, Union
+
+from app.core.vector_encoding import VectorEncoding
 
 
 class LLMUsage(BaseModel):
@@ -18,6 +20,8 @@ class TextGenerationRequest(BaseModel):
     max_tokens: int = Field(default=500, ge=1, le=4000)
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
     provider: Literal["openai", "anthropic"] = "openai"
+    # Seconds to wait for an answer, fallbacks included; capped by the server's LLM_DEADLINE_SECONDS
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
 
 
 class TextGenerationResponse(BaseModel):
@@ -26,19 +30,26 @@ class TextGenerationResponse(BaseModel):
     text: str
     model: str
     usage: LLMUsage
+    # What answered: "primary", "hedge", "cache" or "fallback:<provider>:<model>"
+    route: Optional[str] = None
 
 
 class EmbeddingRequest(BaseModel):
     """Request for creating an embedding."""
 
     text: str
-    model: str = "text-embedding-ada-002"
-    provider: Literal["openai", "anthropic"] = "openai"
+    # Defaults to the provider's default model ("text-embedding-ada-002" for "openai", "hashing" for "local")
+    model: Optional[str] = None
+    # "local" embeds on the server's CPU, with models such as "hashing"
+    provider: Literal["openai", "local"] = "openai"
+    # "float32"/"float16" return the vector as base64 little-endian bytes (raw bytes in msgpack responses)
+    encoding: VectorEncoding = "float"
 
 
 class EmbeddingResponse(BaseModel):
     """Response from embedding creation."""
 
-    embedding: List[float]
+    # A list of numbers, or base64 text for binary encodings
+    embedding: Union[List[float], str]
     model: str
     usage: LLMUsage
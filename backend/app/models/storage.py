@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class UploadedFile(BaseModel):
+    """A file stored in Supabase Storage."""
+
+    # Path of the file within the bucket
+    path: str
+    url: str
+    size: int
+    content_type: Optional[str] = None
+
+
+class UploadResponse(BaseModel):
+    """Files stored by an upload request, in the order they were sent."""
+
+    files: List[UploadedFile]
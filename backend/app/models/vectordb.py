@@ -1,5 +1,7 @@
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Dict, Any, Literal, Optional, Union
+
+from app.core.vector_encoding import VectorEncoding
 
 
 class Document(BaseModel):
@@ -10,17 +12,42 @@ class Document(BaseModel):
     metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
 
 
+class ChunkingOptions(BaseModel):
+    """Options for splitting documents into token windows before embedding."""
+
+    chunk_size: int = Field(default=512, gt=0, le=8191)
+    chunk_overlap: int = Field(default=64, ge=0)
+
+    @model_validator(mode="after")
+    def check_overlap(self) -> "ChunkingOptions":
+        if self.chunk_overlap >= self.chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        return self
+
+
 class DocumentInput(BaseModel):
     """Input for adding documents to the vector database."""
 
     documents: List[Document]
     embedding_model: str = "text-embedding-ada-002"
+    # Split each document into chunks stored as separate points (default: one point per document)
+    chunking: Optional[ChunkingOptions] = None
 
 
 class DocumentUploadResponse(BaseModel):
     """Response from adding documents to the vector database."""
 
     document_ids: List[str]
+    # IDs of the stored chunks of each document, when chunking was requested
+    chunk_ids: Optional[List[List[str]]] = None
+
+
+class IngestionProgress(BaseModel):
+    """Progress update sent after each batch of a streaming ingestion is stored."""
+
+    batch: int
+    document_ids: List[str]
+    documents_processed: int
 
 
 class SearchQuery(BaseModel):
@@ -30,6 +57,13 @@ class SearchQuery(BaseModel):
     embedding_model: str = "text-embedding-ada-002"
     limit: int = Field(default=10, gt=0, le=100)
     filter_metadata: Optional[Dict[str, Any]] = None
+    # Return the best-scoring chunk per parent document instead of every matching chunk
+    collapse_chunks: bool = False
+    # Also match the query text lexically (BM25) and fuse the dense and lexical rankings
+    hybrid: bool = False
+    # Include each result's stored vector, encoded as numbers or as base64 little-endian bytes
+    with_vectors: bool = False
+    vector_encoding: VectorEncoding = "float"
 
 
 class SearchResult(BaseModel):
@@ -39,6 +73,27 @@ class SearchResult(BaseModel):
     score: float
     document: Dict[str, Any]
     metadata: Dict[str, Any]
+    # Stored vector, when requested with with_vectors
+    vector: Optional[Union[List[float], str]] = None
+
+
+class BatchSearchQuery(BaseModel):
+    """Several queries searched with one embedding request and one vector database request."""
+
+    queries: List[SearchQuery] = Field(min_length=1, max_length=100)
+    # Also merge the results into one list: "rrf" (reciprocal rank fusion) or "max" (best score per document)
+    fusion: Optional[Literal["rrf", "max"]] = None
+    # Length of the fused list (default: the largest query limit)
+    fusion_limit: Optional[int] = Field(default=None, gt=0, le=1000)
+
+
+class BatchSearchResult(BaseModel):
+    """Results of a batch search."""
+
+    # Results of each query, in the order of the queries
+    results: List[List[SearchResult]]
+    # Results merged across queries, each document once, when fusion was requested
+    fused: Optional[List[SearchResult]] = None
 
 
 class DeleteDocumentsRequest(BaseModel):
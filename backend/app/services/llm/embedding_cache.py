@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import SERVICE_EVENTS
+
+
+def embedding_cache_key(provider: str, model: str, text: str) -> bytes:
+    """Return the content address of an embedding: a hash of (provider, model, normalized text)."""
+    normalized = unicodedata.normalize("NFC", text).strip()
+    return hashlib.sha256(f"{provider}\0{model}\0{normalized}".encode("utf-8")).digest()
+
+
+@dataclass
+class EmbeddingCacheStats:
+    """Hit/miss counters for the embedding cache."""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+
+class EmbeddingCache:
+    """
+    Two-tier, content-addressed store of embedding vectors.
+
+    The first tier is an in-process LRU capped by the size of the stored vectors. The
+    second tier is a local SQLite file that survives restarts and can be shared by
+    several workers on the same host. Vectors are stored as float32. Disk reads and writes
+    run in worker threads, so they don't block the event loop.
+
+    The oldest written vectors beyond ``max_disk_entries`` are evicted from the file every
+    ``PRUNE_INTERVAL`` written vectors rather than on every write.
+    """
+
+    PRUNE_INTERVAL = 1000
+
+    def __init__(
+        self,
+        max_memory_bytes: int = settings.EMBEDDING_CACHE_MAX_MEMORY_BYTES,
+        path: str = settings.EMBEDDING_CACHE_PATH,
+        max_disk_entries: int = settings.EMBEDDING_CACHE_MAX_DISK_ENTRIES,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_memory_bytes: Size cap of the in-process tier
+            path: Path of the SQLite file for the persistent tier (empty to disable it)
+            max_disk_entries: Number of vectors kept in the persistent tier after pruning
+        """
+        self.memory: TTLCache[np.ndarray] = TTLCache(max_size=None, max_bytes=max_memory_bytes)
+        self.stats = EmbeddingCacheStats()
+        self.max_disk_entries = max_disk_entries
+        self._db: Optional[sqlite3.Connection] = None
+        self._unpruned_writes = 0
+        # The connection is used from worker threads, one transaction at a time
+        self._lock = threading.Lock()
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            # WAL lets readers in other workers proceed while one worker writes, without an fsync per commit
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+
+    async def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Look up several keys, checking memory first and then disk. Missing keys are omitted."""
+        found: Dict[bytes, np.ndarray] = {}
+        disk_keys = []
+
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+                self.stats.memory_hits += 1
+            else:
+                disk_keys.append(key)
+
+        if disk_keys and self._db is not None:
+            for key, vector in (await asyncio.to_thread(self._read, disk_keys)).items():
+                found[key] = vector
+                self.memory.set(key, vector, size=vector.nbytes)
+                self.stats.disk_hits += 1
+
+        self.stats.misses += len(keys) - len(found)
+        return found
+
+    async def set_many(self, vectors: Dict[bytes, np.ndarray]) -> None:
+        """Store several vectors in both tiers."""
+        for key, vector in vectors.items():
+            self.memory.set(key, vector, size=vector.nbytes)
+
+        if vectors and self._db is not None:
+            await asyncio.to_thread(self._write, [(key, vector.tobytes()) for key, vector in vectors.items()])
+
+    def _read(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Read vectors from the persistent tier; runs in a worker thread."""
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, blob in self._db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk).fetchall():
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _write(self, rows: List[Tuple[bytes, bytes]]) -> None:
+        """Write vectors to the persistent tier in one transaction; runs in a worker thread."""
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+
+            self._unpruned_writes += len(rows)
+            if self._unpruned_writes >= self.PRUNE_INTERVAL:
+                self._unpruned_writes = 0
+                self._prune()
+
+    def _prune(self) -> None:
+        """Delete the oldest written vectors beyond the size limit. Call with the lock held."""
+        # A replaced row gets a new rowid, so rowid order is write order
+        self._db.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY rowid LIMIT max((SELECT count(*) FROM embeddings) - ?, 0))",
+            (self.max_disk_entries,),
+        )
+
+    def close(self) -> None:
+        """Close the persistent tier."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+@lru_cache()
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache."""
+    cache = EmbeddingCache()
+    SERVICE_EVENTS.register(("embedding_cache", ""), cache.stats)
+    return cache
@@ -1,22 +1,102 @@
 from abc import ABC, abstractmethod
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, TypeVar
+import asyncio
+import base64
 import openai
 import numpy as np
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from functools import lru_cache
 
+from app.core.admission import FairConcurrencyLimiter, current_user_id, get_concurrency_limiter
 from app.core.config import settings
+from app.core.metrics import EMBEDDING_BATCH_SIZE, SERVICE_EVENTS, observe_upstream, record_usage
+from app.core.single_flight import SingleFlight
 from app.models.llm import LLMUsage
+from app.services.llm.embedding_cache import EmbeddingCache, embedding_cache_key, get_embedding_cache
+from app.services.llm.local_embedding import get_local_embedding_model
+
+
+_Response = TypeVar("_Response", "EmbeddingResponse", "BatchEmbeddingResponse")
+
+# Model used when a request names a provider but no model
+DEFAULT_EMBEDDING_MODELS: Dict[str, str] = {"openai": "text-embedding-ada-002", "local": "hashing"}
 
 
 class EmbeddingResponse(BaseModel):
     """Response from an embedding service."""
 
-    embedding: List[float]
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    # A float32 vector; converted to a number list only where a JSON body needs one
+    embedding: np.ndarray
+    model: str
+    usage: LLMUsage
+
+
+class BatchEmbeddingResponse(BaseModel):
+    """Response from a batched embedding call, with embeddings in input order."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    # A float32 matrix with one row per input text
+    embeddings: np.ndarray
     model: str
     usage: LLMUsage
 
 
+def _decode_embedding(embedding: str) -> np.ndarray:
+    """Decode an embedding the OpenAI API returned as base64 little-endian float32 bytes."""
+    return np.frombuffer(base64.b64decode(embedding), dtype="<f4")
+
+
+def _stack(arrays: List[np.ndarray], rows: bool = True) -> np.ndarray:
+    """Join vectors (or, with rows=False, matrices of vectors) into one float32 matrix."""
+    if not arrays:
+        return np.empty((0, 0), dtype=np.float32)
+    return (np.stack if rows else np.concatenate)(arrays).astype(np.float32, copy=False)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Return an upper bound on the number of tokens in a text.
+
+    Byte-level BPE tokenizers never produce more tokens than UTF-8 bytes, so the byte
+    length is a safe bound for splitting requests without loading a tokenizer.
+    """
+    return max(len(text.encode("utf-8")), 1)
+
+
+def split_batches(texts: List[str], max_items: int, max_tokens: int) -> List[Tuple[int, int]]:
+    """
+    Split texts into contiguous batches that respect per-request item and token limits.
+
+    Args:
+        texts: Texts to embed
+        max_items: Maximum number of texts per batch
+        max_tokens: Maximum estimated tokens per batch (a single longer text gets its own batch)
+
+    Returns:
+        List of (start, end) index ranges into ``texts``
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if i > start and (i - start >= max_items or batch_tokens + tokens > max_tokens):
+            batches.append((start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += tokens
+
+    if start < len(texts):
+        batches.append((start, len(texts)))
+
+    return batches
+
+
 class EmbeddingService(ABC):
     """Abstract base class for embedding services."""
 
@@ -25,6 +105,11 @@ class EmbeddingService(ABC):
         """Create an embedding vector for the text."""
         pass
 
+    @abstractmethod
+    async def create_embeddings(self, texts: List[str], model: str) -> BatchEmbeddingResponse:
+        """Create embedding vectors for several texts, returned in input order."""
+        pass
+
 
 class OpenAIEmbeddingService(EmbeddingService):
     """OpenAI implementation of the embedding service."""
@@ -32,39 +117,221 @@ class OpenAIEmbeddingService(EmbeddingService):
     def __init__(self, api_key: str):
         """Initialize the OpenAI client."""
         self.client = openai.AsyncOpenAI(api_key=api_key)
+        self._batch_semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
 
     async def create_embedding(self, text: str, model: str = "text-embedding-ada-002") -> EmbeddingResponse:
         """Create an embedding using OpenAI."""
-        response = await self.client.embeddings.create(model=model, input=text)
+        # Base64 bodies are smaller than JSON numbers, and decode straight into an array
+        response = await self.client.embeddings.create(model=model, input=text, encoding_format="base64")
 
-        embedding = response.data[0].embedding
+        embedding = _decode_embedding(response.data[0].embedding)
 
         usage = LLMUsage(prompt_tokens=response.usage.prompt_tokens, completion_tokens=0, total_tokens=response.usage.total_tokens)
 
         return EmbeddingResponse(embedding=embedding, model=model, usage=usage)
 
+    async def create_embeddings(self, texts: List[str], model: str = "text-embedding-ada-002") -> BatchEmbeddingResponse:
+        """
+        Create embeddings for several texts using OpenAI's list-input API.
 
-class AnthropicEmbeddingService(EmbeddingService):
-    """Anthropic implementation of the embedding service."""
+        Texts are split into batches by the configured item and token limits, and the
+        batches are sent concurrently, bounded by ``EMBEDDING_MAX_CONCURRENCY``.
+        """
+        batches = split_batches(texts, settings.EMBEDDING_BATCH_MAX_ITEMS, settings.EMBEDDING_BATCH_MAX_TOKENS)
+        responses = await asyncio.gather(*(self._embed_batch(texts[start:end], model) for start, end in batches))
 
-    def __init__(self, api_key: str):
-        """Initialize the Anthropic client."""
-        # Note: Anthropic doesn't currently have a dedicated embeddings API,
-        # so this is a placeholder for future implementation
-        self.api_key = api_key
+        embeddings: List[np.ndarray] = []
+        prompt_tokens = 0
+        total_tokens = 0
+        for response in responses:
+            # The API reports each item's position within its batch; don't rely on response order
+            embeddings.extend(_decode_embedding(item.embedding) for item in sorted(response.data, key=lambda item: item.index))
+            prompt_tokens += response.usage.prompt_tokens
+            total_tokens += response.usage.total_tokens
+
+        usage = LLMUsage(prompt_tokens=prompt_tokens, completion_tokens=0, total_tokens=total_tokens)
+
+        return BatchEmbeddingResponse(embeddings=_stack(embeddings), model=model, usage=usage)
+
+    async def _embed_batch(self, texts: List[str], model: str):
+        """Send one batched embeddings request, waiting for a free concurrency slot."""
+        async with self._batch_semaphore:
+            return await self.client.embeddings.create(model=model, input=texts, encoding_format="base64")
+
+
+class LocalEmbeddingService(EmbeddingService):
+    """
+    Embedding service computing embeddings on the local CPU, with no network calls.
+
+    Models are looked up by name among the local embedding models (see
+    ``app.services.llm.local_embedding``). Batches are split into chunks that are embedded
+    in parallel on a thread pool; the models work in NumPy array operations, which release
+    the GIL. A text always gets the same vector, whatever batch it is embedded in.
+    Usage counts the lexical terms of the texts.
+    """
+
+    def __init__(self, max_workers: int, chunk_size: int):
+        """
+        Initialize the worker pool.
+
+        Args:
+            max_workers: Number of threads embedding chunks in parallel
+            chunk_size: Number of texts embedded by one worker at a time
+        """
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="local-embedding")
+
+    async def create_embedding(self, text: str, model: str = "hashing") -> EmbeddingResponse:
+        """Create an embedding with a local model."""
+        response = await self.create_embeddings([text], model=model)
+
+        return EmbeddingResponse(embedding=response.embeddings[0], model=model, usage=response.usage)
 
-    async def create_embedding(self, text: str, model: str = "claude-embedding") -> EmbeddingResponse:
-        """Create an embedding using Anthropic."""
-        # This is a placeholder implementation
-        # In a real implementation, you'd call the Anthropic embedding API when available
+    async def create_embeddings(self, texts: List[str], model: str = "hashing") -> BatchEmbeddingResponse:
+        """Create embeddings for several texts with a local model, embedding chunks of the batch in parallel."""
+        local_model = get_local_embedding_model(model)
+        loop = asyncio.get_running_loop()
 
-        # For now, return a random embedding as a placeholder
-        # In production, you would replace this with the actual API call
-        random_embedding = list(np.random.normal(0, 1, 1536))
+        chunks = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, local_model.embed, texts[start : start + self.chunk_size]) for start in range(0, len(texts), self.chunk_size))
+        )
 
-        usage = LLMUsage(prompt_tokens=len(text.split()), completion_tokens=0, total_tokens=len(text.split()))
+        tokens = sum(int(term_counts.sum()) for _, term_counts in chunks)
+        usage = LLMUsage(prompt_tokens=tokens, completion_tokens=0, total_tokens=tokens)
 
-        return EmbeddingResponse(embedding=[float(x) for x in random_embedding], model=model, usage=usage)
+        return BatchEmbeddingResponse(embeddings=_stack([vectors for vectors, _ in chunks], rows=False), model=model, usage=usage)
+
+
+class AdmittedEmbeddingService(EmbeddingService):
+    """
+    Embedding service wrapper that runs calls under a provider's FairConcurrencyLimiter,
+    queued on behalf of the user in ``current_user_id``. The upstream latency, batch size
+    and token usage of admitted calls are recorded in the process metrics.
+    """
+
+    def __init__(self, service: EmbeddingService, provider: str, limiter: FairConcurrencyLimiter):
+        """
+        Initialize the wrapper.
+
+        Args:
+            service: The embedding service to call once admitted
+            provider: Provider name, used as the metrics label
+            limiter: Concurrency limiter of the service's provider
+        """
+        self.service = service
+        self.provider = provider
+        self.limiter = limiter
+
+    async def create_embedding(self, text: str, model: str = "text-embedding-ada-002") -> EmbeddingResponse:
+        """Create an embedding once a concurrency slot is free."""
+        with await self.limiter.acquire(current_user_id.get()):
+            with observe_upstream(self.provider, "embedding"):
+                response = await self.service.create_embedding(text=text, model=model)
+        EMBEDDING_BATCH_SIZE.observe((self.provider,), 1)
+        record_usage(self.provider, model, response.usage.prompt_tokens)
+        return response
+
+    async def create_embeddings(self, texts: List[str], model: str = "text-embedding-ada-002") -> BatchEmbeddingResponse:
+        """Create embeddings for several texts once a concurrency slot is free."""
+        with await self.limiter.acquire(current_user_id.get()):
+            with observe_upstream(self.provider, "embedding"):
+                response = await self.service.create_embeddings(texts=texts, model=model)
+        EMBEDDING_BATCH_SIZE.observe((self.provider,), len(texts))
+        record_usage(self.provider, model, response.usage.prompt_tokens)
+        return response
+
+
+class CachedEmbeddingService(EmbeddingService):
+    """Embedding service wrapper that serves repeated texts from an EmbeddingCache."""
+
+    def __init__(self, service: EmbeddingService, provider: str, cache: EmbeddingCache):
+        """
+        Initialize the wrapper.
+
+        Args:
+            service: The embedding service to call on cache misses
+            provider: Provider name, part of the cache key
+            cache: The cache to read from and write to
+        """
+        self.service = service
+        self.provider = provider
+        self.cache = cache
+
+    async def create_embedding(self, text: str, model: str = "text-embedding-ada-002") -> EmbeddingResponse:
+        """Create an embedding, reusing a cached vector for previously seen text."""
+        key = embedding_cache_key(self.provider, model, text)
+        cached = (await self.cache.get_many([key])).get(key)
+
+        if cached is not None:
+            return EmbeddingResponse(embedding=cached, model=model, usage=LLMUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0))
+
+        response = await self.service.create_embedding(text=text, model=model)
+        await self.cache.set_many({key: response.embedding})
+
+        return response
+
+    async def create_embeddings(self, texts: List[str], model: str = "text-embedding-ada-002") -> BatchEmbeddingResponse:
+        """Create embeddings for several texts, only sending uncached texts to the provider."""
+        keys = [embedding_cache_key(self.provider, model, text) for text in texts]
+        found = await self.cache.get_many(keys)
+
+        # Embed each missing text once, even if it appears several times in the batch
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        usage = LLMUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+        if missing:
+            response = await self.service.create_embeddings(texts=list(missing.values()), model=model)
+            # Copy the rows, so cached vectors don't keep the whole batch matrix alive
+            fresh = {key: embedding.copy() for key, embedding in zip(missing, response.embeddings)}
+            await self.cache.set_many(fresh)
+            found.update(fresh)
+            usage = response.usage
+
+        return BatchEmbeddingResponse(embeddings=_stack([found[key] for key in keys]), model=model, usage=usage)
+
+
+def _without_usage(response: _Response) -> _Response:
+    """Return a copy of an embedding response reporting zero token usage."""
+    return response.model_copy(update={"usage": LLMUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0)})
+
+
+class CoalescingEmbeddingService(EmbeddingService):
+    """
+    Embedding service wrapper that collapses identical concurrent requests into one upstream call.
+
+    Callers that join a request already in flight receive its embeddings with zero usage,
+    so token usage is only counted once.
+    """
+
+    def __init__(self, service: EmbeddingService, provider: str):
+        """
+        Initialize the wrapper.
+
+        Args:
+            service: The embedding service to call
+            provider: Provider name, part of the request key
+        """
+        self.service = service
+        self.provider = provider
+        self.flights: SingleFlight[EmbeddingResponse] = SingleFlight()
+        self.batch_flights: SingleFlight[BatchEmbeddingResponse] = SingleFlight()
+
+    async def create_embedding(self, text: str, model: str = "text-embedding-ada-002") -> EmbeddingResponse:
+        """Create an embedding, sharing the upstream call with concurrent requests for the same text."""
+        key = embedding_cache_key(self.provider, model, text)
+        response, shared = await self.flights.do(key, lambda: self.service.create_embedding(text=text, model=model))
+
+        return _without_usage(response) if shared else response
+
+    async def create_embeddings(self, texts: List[str], model: str = "text-embedding-ada-002") -> BatchEmbeddingResponse:
+        """Create embeddings for several texts, sharing the upstream call with concurrent identical batches."""
+        key = tuple(embedding_cache_key(self.provider, model, text) for text in texts)
+        response, shared = await self.batch_flights.do(key, lambda: self.service.create_embeddings(texts=texts, model=model))
+
+        return _without_usage(response) if shared else response
 
 
 class EmbeddingServiceFactory:
@@ -77,15 +344,37 @@ class EmbeddingServiceFactory:
             if not settings.OPENAI_API_KEY:
                 raise ValueError("OpenAI API key not configured")
             return OpenAIEmbeddingService(api_key=settings.OPENAI_API_KEY)
+        elif provider == "local":
+            return LocalEmbeddingService(max_workers=settings.LOCAL_EMBEDDING_WORKERS, chunk_size=settings.LOCAL_EMBEDDING_CHUNK_SIZE)
         elif provider == "anthropic":
-            if not settings.ANTHROPIC_API_KEY:
-                raise ValueError("Anthropic API key not configured")
-            return AnthropicEmbeddingService(api_key=settings.ANTHROPIC_API_KEY)
+            raise ValueError("Anthropic does not provide an embeddings API; use the \"local\" embedding provider instead")
         else:
             raise ValueError(f"Unsupported embedding provider: {provider}")
 
 
+def default_embedding_model(provider: str) -> str:
+    """Return the embedding model used for a provider when none is requested."""
+    try:
+        return DEFAULT_EMBEDDING_MODELS[provider]
+    except KeyError:
+        raise ValueError(f"Unsupported embedding provider: {provider}") from None
+
+
 @lru_cache()
 def get_embedding_service(provider: str = "openai") -> EmbeddingService:
     """Dependency to get an embedding service."""
-    return EmbeddingServiceFactory.get_service(provider)
+    service = EmbeddingServiceFactory.get_service(provider)
+
+    # Local embeddings only use this machine's CPU, which their worker pool already bounds
+    if provider != "local":
+        service = AdmittedEmbeddingService(service, provider=provider, limiter=get_concurrency_limiter(provider))
+
+    # Local embeddings are cheaper to recompute than to look up
+    if settings.EMBEDDING_CACHE_ENABLED and provider != "local":
+        service = CachedEmbeddingService(service, provider=provider, cache=get_embedding_cache())
+
+    # Outermost, so that concurrent cache misses for the same text also share one call
+    coalescing = CoalescingEmbeddingService(service, provider=provider)
+    SERVICE_EVENTS.register(("embedding_single_flight", provider), coalescing.flights.stats)
+    SERVICE_EVENTS.register(("embedding_batch_single_flight", provider), coalescing.batch_flights.stats)
+    return coalescing
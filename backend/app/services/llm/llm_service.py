@@ -1,11 +1,23 @@
 from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import logging
 import openai
 import anthropic
+import numpy as np
 from pydantic import BaseModel
 from functools import lru_cache
 
+from app.core.admission import AdmissionError, FairConcurrencyLimiter, current_user_id, get_concurrency_limiter
 from app.core.config import settings
+from app.core.metrics import SERVICE_EVENTS, observe_upstream, record_usage
+from app.core.single_flight import SingleFlight
 from app.models.llm import LLMUsage
+from app.services.llm.response_cache import ResponseCache, get_response_cache, response_cache_key
+
+logger = logging.getLogger(__name__)
 
 
 class LLMResponse(BaseModel):
@@ -14,6 +26,16 @@ class LLMResponse(BaseModel):
     text: str
     model: str
     usage: LLMUsage
+    # How a PolicyLLMService obtained the response: "primary", "hedge" or "fallback:<provider>:<model>"
+    route: Optional[str] = None
+
+
+class LLMStreamEvent(BaseModel):
+    """A chunk of a streamed generation. The final event carries usage instead of text."""
+
+    text: str = ""
+    model: str
+    usage: Optional[LLMUsage] = None
 
 
 class LLMService(ABC):
@@ -24,13 +46,23 @@ class LLMService(ABC):
         """Generate text using the LLM."""
         pass
 
+    @abstractmethod
+    def generate_stream(self, prompt: str, model: str, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> AsyncIterator[LLMStreamEvent]:
+        """
+        Stream generated text as it is produced.
+
+        Yields text events followed by a single usage event. Closing the iterator early
+        closes the upstream request.
+        """
+        pass
+
 
 class OpenAIService(LLMService):
     """OpenAI implementation of the LLM service."""
 
     def __init__(self, api_key: str):
         """Initialize the OpenAI client."""
-        self.client = openai.AsyncOpenAI(api_key=api_key)
+        self.client = openai.AsyncOpenAI(api_key=api_key, timeout=settings.LLM_ATTEMPT_TIMEOUT_SECONDS, max_retries=settings.LLM_MAX_RETRIES)
 
     async def generate_text(self, prompt: str, model: str = "gpt-3.5-turbo", max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
         """Generate text using OpenAI."""
@@ -44,13 +76,39 @@ class OpenAIService(LLMService):
 
         return LLMResponse(text=response.choices[0].message.content, model=model, usage=usage)
 
+    async def generate_stream(
+        self, prompt: str, model: str = "gpt-3.5-turbo", max_tokens: int = 500, temperature: float = 0.7, **kwargs
+    ) -> AsyncIterator[LLMStreamEvent]:
+        """Stream text using OpenAI."""
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs,
+        )
+
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield LLMStreamEvent(text=chunk.choices[0].delta.content, model=model)
+
+                # With include_usage, the last chunk has no choices and carries the usage for the whole request
+                if chunk.usage:
+                    usage = LLMUsage(
+                        prompt_tokens=chunk.usage.prompt_tokens, completion_tokens=chunk.usage.completion_tokens, total_tokens=chunk.usage.total_tokens
+                    )
+                    yield LLMStreamEvent(model=model, usage=usage)
+
 
 class AnthropicService(LLMService):
     """Anthropic (Claude) implementation of the LLM service."""
 
     def __init__(self, api_key: str):
         """Initialize the Anthropic client."""
-        self.client = anthropic.AsyncAnthropic(api_key=api_key)
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, timeout=settings.LLM_ATTEMPT_TIMEOUT_SECONDS, max_retries=settings.LLM_MAX_RETRIES)
 
     async def generate_text(
         self, prompt: str, model: str = "claude-3-sonnet-20240229", max_tokens: int = 500, temperature: float = 0.7, **kwargs
@@ -68,6 +126,405 @@ class AnthropicService(LLMService):
 
         return LLMResponse(text=response.content[0].text, model=model, usage=usage)
 
+    async def generate_stream(
+        self, prompt: str, model: str = "claude-3-sonnet-20240229", max_tokens: int = 500, temperature: float = 0.7, **kwargs
+    ) -> AsyncIterator[LLMStreamEvent]:
+        """Stream text using Anthropic Claude."""
+        stream = await self.client.messages.create(
+            model=model, max_tokens=max_tokens, temperature=temperature, messages=[{"role": "user", "content": prompt}], stream=True, **kwargs
+        )
+
+        input_tokens = 0
+        output_tokens = 0
+        async with stream:
+            async for event in stream:
+                if event.type == "message_start":
+                    input_tokens = event.message.usage.input_tokens
+                elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                    yield LLMStreamEvent(text=event.delta.text, model=model)
+                elif event.type == "message_delta":
+                    # Output usage is cumulative, the last message_delta has the final count
+                    output_tokens = event.usage.output_tokens
+
+        usage = LLMUsage(prompt_tokens=input_tokens, completion_tokens=output_tokens, total_tokens=input_tokens + output_tokens)
+        yield LLMStreamEvent(model=model, usage=usage)
+
+
+class AdmittedLLMService(LLMService):
+    """
+    LLM service wrapper that runs calls under a provider's FairConcurrencyLimiter.
+
+    Calls are queued on behalf of the user in ``current_user_id``; a stream holds its slot
+    until it ends. Provider 429 responses lower the limiter's concurrency limit. The upstream
+    latency and token usage of admitted calls are recorded in the process metrics.
+    """
+
+    def __init__(self, service: LLMService, provider: str, limiter: FairConcurrencyLimiter):
+        """
+        Initialize the wrapper.
+
+        Args:
+            service: The LLM service to call once admitted
+            provider: Provider name, used as the metrics label
+            limiter: Concurrency limiter of the service's provider
+        """
+        self.service = service
+        self.provider = provider
+        self.limiter = limiter
+
+    async def generate_text(self, prompt: str, model: str, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> LLMResponse:
+        """Generate text once a concurrency slot is free."""
+        with await self.limiter.acquire(current_user_id.get()):
+            with observe_upstream(self.provider, "generate"):
+                response = await self.service.generate_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+        record_usage(self.provider, model, response.usage.prompt_tokens, response.usage.completion_tokens)
+        return response
+
+    async def generate_stream(self, prompt: str, model: str, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> AsyncIterator[LLMStreamEvent]:
+        """Stream text once a concurrency slot is free, holding the slot until the stream ends."""
+        with await self.limiter.acquire(current_user_id.get()):
+            stream = self.service.generate_stream(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+            try:
+                with observe_upstream(self.provider, "generate_stream"):
+                    async for event in stream:
+                        if event.usage is not None:
+                            record_usage(self.provider, model, event.usage.prompt_tokens, event.usage.completion_tokens)
+                        yield event
+            finally:
+                await stream.aclose()
+
+
+def _without_usage(response: LLMResponse) -> LLMResponse:
+    """Return a copy of a response reporting zero token usage."""
+    return response.model_copy(update={"usage": LLMUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0)})
+
+
+class CachedLLMService(LLMService):
+    """
+    LLM service wrapper that serves repeated deterministic requests from a ResponseCache.
+
+    Requests are cached when ``temperature`` is 0, or when the caller opts in with
+    ``cache=True``. ``cache=False`` bypasses the cache for that request. Identical
+    cacheable requests that arrive while one is in flight share its upstream call,
+    even when no cache is configured.
+    """
+
+    def __init__(self, service: LLMService, provider: str, cache: Optional[ResponseCache]):
+        """
+        Initialize the wrapper.
+
+        Args:
+            service: The LLM service to call on cache misses
+            provider: Provider name, part of the cache key
+            cache: The cache to use (None disables caching)
+        """
+        self.service = service
+        self.provider = provider
+        self.cache = cache
+        self.flights: SingleFlight[LLMResponse] = SingleFlight()
+
+    async def generate_text(
+        self, prompt: str, model: str, max_tokens: int = 500, temperature: float = 0.7, cache: Optional[bool] = None, **kwargs
+    ) -> LLMResponse:
+        """Generate text, reusing a cached or in-flight response for an identical cacheable request."""
+        cacheable = cache if cache is not None else temperature == 0
+        if not cacheable:
+            if self.cache is not None and cache is False:
+                self.cache.stats.bypassed += 1
+            return await self.service.generate_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+
+        key = response_cache_key(self.provider, model, prompt, max_tokens, temperature, kwargs)
+        if self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                # Nothing was sent to the provider for this request
+                return _without_usage(LLMResponse.model_validate_json(cached)).model_copy(update={"route": "cache"})
+
+        async def generate() -> LLMResponse:
+            response = await self.service.generate_text(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+            if self.cache is not None:
+                await self.cache.set(key, response.model_dump_json())
+            return response
+
+        response, shared = await self.flights.do(key, generate)
+
+        # Usage is reported once, to the caller whose request was sent upstream
+        return _without_usage(response) if shared else response
+
+    def generate_stream(self, prompt: str, model: str, max_tokens: int = 500, temperature: float = 0.7, **kwargs) -> AsyncIterator[LLMStreamEvent]:
+        """Stream text from the wrapped service. Streams are never cached."""
+        return self.service.generate_stream(prompt=prompt, model=model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+
+
+class LatencyTracker:
+    """Recent latencies of successful calls per (provider, model), for choosing when to hedge."""
+
+    # Latencies kept per target, and the number needed before percentiles are trusted
+    WINDOW = 256
+    MIN_SAMPLES = 20
+
+    def __init__(self):
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def record(self, provider: str, model: str, seconds: float) -> None:
+        """Record the latency of a successful call."""
+        self._latencies.setdefault((provider, model), deque(maxlen=self.WINDOW)).append(seconds)
+
+    def percentile(self, provider: str, model: str, percentile: float) -> Optional[float]:
+        """Return a percentile of recent latencies, or None until there are enough samples."""
+        latencies = self._latencies.get((provider, model))
+        if latencies is None or len(latencies) < self.MIN_SAMPLES:
+            return None
+        return float(np.percentile(latencies, percentile))
+
+
+@dataclass
+class LLMPolicy:
+    """Tail latency policy of a PolicyLLMService."""
+
+    # Budget for a whole request, fallbacks included; streams must start within it
+    deadline: float
+    # Time one target gets before the next is tried
+    attempt_timeout: float
+    # Hedge once a call is slower than this percentile of recent latencies (None disables hedging)
+    hedge_percentile: Optional[float] = None
+    hedge_min_delay: float = 0.0
+    # (provider, model) targets tried in order after the requested one
+    fallbacks: List[Tuple[str, str]] = field(default_factory=list)
+
+    @classmethod
+    def from_settings(cls, provider: str) -> "LLMPolicy":
+        """Build the policy of a provider from the application settings."""
+        fallbacks = []
+        for target in settings.LLM_FALLBACKS.get(provider, []):
+            fallback_provider, separator, fallback_model = target.partition(":")
+            if not separator or not fallback_model:
+                raise ValueError(f"Invalid LLM fallback '{target}', expected 'provider:model'")
+            fallbacks.append((fallback_provider, fallback_model))
+
+        return cls(
+            deadline=settings.LLM_DEADLINE_SECONDS,
+            attempt_timeout=settings.LLM_ATTEMPT_TIMEOUT_SECONDS,
+            hedge_percentile=settings.LLM_HEDGE_PERCENTILE or None,
+            hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+            fallbacks=fallbacks,
+        )
+
+
+@dataclass
+class LLMPolicyStats:
+    """Counters for a PolicyLLMService."""
+
+    # Requests answered by each route ("primary", "hedge", "fallback:<provider>:<model>")
+    wins: Dict[str, int] = field(default_factory=dict)
+    hedges: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    # Attempts refused by a provider's admission control
+    shed: int = 0
+    # Requests for which every target failed
+    failures: int = 0
+
+
+class PolicyLLMService(LLMService):
+    """
+    LLM service applying a tail latency policy over per-provider services.
+
+    Each request has a deadline (``LLMPolicy.deadline``, or less if the caller asks).
+    Within it, the requested provider and model get ``attempt_timeout`` seconds, and if
+    the call fails or times out the fallback targets are tried in order. When hedging is
+    enabled, a call still running after the configured percentile of its target's recent
+    latencies gets a second, identical request; the first to succeed wins and the other
+    is cancelled. Hedges skip the response cache, which would otherwise join them to the
+    call they are meant to race.
+
+    Streams fall back only until their first event, and are not hedged. The route that
+    answered is set on the response and counted in ``stats``. When every target fails,
+    the last target's error is raised: its AdmissionError if it was shed, TimeoutError if
+    it timed out or no time was left to try it, and otherwise the provider's own error.
+    """
+
+    def __init__(self, provider: str, policy: LLMPolicy, services: Callable[[str], LLMService], latencies: LatencyTracker):
+        """
+        Initialize the service.
+
+        Args:
+            provider: The requested provider
+            policy: Deadlines, hedging and fallbacks
+            services: Returns the service of a provider
+            latencies: Latency history shared by all policy services
+        """
+        self.provider = provider
+        self.policy = policy
+        self.services = services
+        self.latencies = latencies
+        self.stats = LLMPolicyStats()
+        # Fail early if the requested provider is not configured
+        services(provider)
+
+    async def generate_text(
+        self, prompt: str, model: str, max_tokens: int = 500, temperature: float = 0.7, deadline: Optional[float] = None, **kwargs
+    ) -> LLMResponse:
+        """Generate text within the deadline, hedging slow calls and falling back on failures."""
+        loop = asyncio.get_running_loop()
+        ends_at = loop.time() + min(deadline or self.policy.deadline, self.policy.deadline)
+        failures: List[str] = []
+        error: Optional[Exception] = None
+
+        for route, provider, target_model in self._targets(model):
+            remaining = ends_at - loop.time()
+            if remaining <= 0:
+                error = None
+                break
+
+            def call(overrides: Dict[str, Optional[bool]]) -> Awaitable[LLMResponse]:
+                service = self.services(provider)
+                return service.generate_text(prompt=prompt, model=target_model, max_tokens=max_tokens, temperature=temperature, **{**kwargs, **overrides})
+
+            try:
+                response, hedged = await asyncio.wait_for(self._race(provider, target_model, call), min(remaining, self.policy.attempt_timeout))
+            except Exception as e:
+                error = e
+                self._record_failure(provider, target_model, e, failures)
+                continue
+
+            # Cache hits keep the route the response cache set
+            route = response.route or ("hedge" if hedged else route)
+            self._record_win(route, failures)
+            return response.model_copy(update={"route": route})
+
+        raise self._give_up(failures, error)
+
+    async def generate_stream(
+        self, prompt: str, model: str, max_tokens: int = 500, temperature: float = 0.7, deadline: Optional[float] = None, **kwargs
+    ) -> AsyncIterator[LLMStreamEvent]:
+        """Stream text from the first target that starts streaming within its attempt timeout and the deadline."""
+        loop = asyncio.get_running_loop()
+        ends_at = loop.time() + min(deadline or self.policy.deadline, self.policy.deadline)
+        failures: List[str] = []
+        error: Optional[Exception] = None
+
+        for route, provider, target_model in self._targets(model):
+            remaining = ends_at - loop.time()
+            if remaining <= 0:
+                error = None
+                break
+
+            try:
+                stream = self.services(provider).generate_stream(prompt=prompt, model=target_model, max_tokens=max_tokens, temperature=temperature, **kwargs)
+            except Exception as e:
+                error = e
+                self._record_failure(provider, target_model, e, failures)
+                continue
+
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), min(remaining, self.policy.attempt_timeout))
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                await stream.aclose()
+                error = e
+                self._record_failure(provider, target_model, e, failures)
+                continue
+
+            self._record_win(route, failures)
+            try:
+                yield first
+                async for event in stream:
+                    yield event
+            finally:
+                await stream.aclose()
+            return
+
+        raise self._give_up(failures, error)
+
+    def _targets(self, model: str) -> List[Tuple[str, str, str]]:
+        """Return the (route, provider, model) targets to try, in order."""
+        targets = [("primary", self.provider, model)]
+        targets.extend((f"fallback:{provider}:{fallback_model}", provider, fallback_model) for provider, fallback_model in self.policy.fallbacks)
+        return targets
+
+    async def _race(self, provider: str, model: str, call: Callable[[Dict[str, Optional[bool]]], Awaitable[LLMResponse]]) -> Tuple[LLMResponse, bool]:
+        """
+        Call a target, hedging with a second request if the first is slow.
+
+        Returns:
+            Tuple of the first successful response and whether it came from the hedge
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        hedge_delay = self._hedge_delay(provider, model)
+
+        first = asyncio.ensure_future(call({}))
+        hedge: Optional[asyncio.Future] = None
+        pending = {first}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                timeout = None if hedge is not None or hedge_delay is None else max(0.0, started + hedge_delay - loop.time())
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    self.stats.hedges += 1
+                    hedge = asyncio.ensure_future(call({"cache": False}))
+                    pending.add(hedge)
+                    continue
+
+                for task in done:
+                    if task.exception() is None:
+                        response = task.result()
+                        # Cache hits say nothing about the provider's latency
+                        if response.route != "cache":
+                            self.latencies.record(provider, model, loop.time() - started)
+                        return response, task is hedge
+                    error = task.exception()
+
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _hedge_delay(self, provider: str, model: str) -> Optional[float]:
+        """Return how long to wait before hedging a call to a target, or None to not hedge."""
+        if self.policy.hedge_percentile is None:
+            return None
+        threshold = self.latencies.percentile(provider, model, self.policy.hedge_percentile)
+        return None if threshold is None else max(threshold, self.policy.hedge_min_delay)
+
+    def _record_failure(self, provider: str, model: str, error: Exception, failures: List[str]) -> None:
+        """Count a failed attempt at a target, noting why it failed."""
+        if isinstance(error, asyncio.TimeoutError):
+            self.stats.timeouts += 1
+            failures.append(f"{provider}:{model} timed out")
+        elif isinstance(error, AdmissionError):
+            self.stats.shed += 1
+            failures.append(f"{provider}:{model} shed: {str(error)}")
+        else:
+            self.stats.errors += 1
+            failures.append(f"{provider}:{model} failed: {str(error)}")
+
+    def _give_up(self, failures: List[str], error: Optional[Exception]) -> Exception:
+        """
+        Return the error to raise once no target answered.
+
+        Args:
+            failures: Why each target tried failed, in order
+            error: The last target's error, or None if the deadline ran out before it could be tried
+        """
+        self.stats.failures += 1
+        if error is None or isinstance(error, asyncio.TimeoutError):
+            return TimeoutError(f"No LLM provider answered within the deadline: {'; '.join(failures) or 'no time left'}")
+
+        if len(failures) > 1:
+            logger.warning(f"LLM request failed after: {'; '.join(failures)}")
+        return error
+
+    def _record_win(self, route: str, failures: List[str]) -> None:
+        """Count the route that answered, logging why earlier targets were passed over."""
+        self.stats.wins[route] = self.stats.wins.get(route, 0) + 1
+        if failures:
+            logger.warning(f"LLM request answered by {route} after: {'; '.join(failures)}")
+
 
 class LLMServiceFactory:
     """Factory for creating LLM service instances."""
@@ -88,6 +545,24 @@ class LLMServiceFactory:
 
 
 @lru_cache()
-def get_llm_service(provider: str = "openai") -> LLMService:
+def get_provider_llm_service(provider: str) -> CachedLLMService:
+    """Return the cached, admission-controlled service of one provider."""
+    # Admission control sits behind the cache, so cache hits never wait for a provider slot
+    service = AdmittedLLMService(LLMServiceFactory.get_service(provider), provider=provider, limiter=get_concurrency_limiter(provider))
+    cached = CachedLLMService(service, provider=provider, cache=get_response_cache())
+    SERVICE_EVENTS.register(("llm_single_flight", provider), cached.flights.stats)
+    return cached
+
+
+@lru_cache()
+def get_latency_tracker() -> LatencyTracker:
+    """Return the process-wide LLM latency history."""
+    return LatencyTracker()
+
+
+@lru_cache()
+def get_llm_service(provider: str = "openai") -> PolicyLLMService:
     """Dependency to get an LLM service."""
-    return LLMServiceFactory.get_service(provider)
+    service = PolicyLLMService(provider, policy=LLMPolicy.from_settings(provider), services=get_provider_llm_service, latencies=get_latency_tracker())
+    SERVICE_EVENTS.register(("llm_policy", provider), service.stats)
+    return service
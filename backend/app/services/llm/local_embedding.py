@@ -0,0 +1,190 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.vectordb.sparse import hash_terms
+
+# Multiplier combining the hashes of two adjacent terms into the hash of the pair
+_PAIR_MULTIPLIER = np.uint32(0x9E3779B1)
+
+# Features projected at a time by ProjectionEmbeddingModel, bounding its scratch memory
+_PROJECTION_BLOCK = 4096
+
+
+def _mix(hashes: np.ndarray) -> np.ndarray:
+    """Scramble uint32 hashes (the MurmurHash3 finalizer), so every output bit depends on every input bit."""
+    hashes = hashes ^ (hashes >> np.uint32(16))
+    hashes = hashes * np.uint32(0x85EBCA6B)
+    hashes = hashes ^ (hashes >> np.uint32(13))
+    hashes = hashes * np.uint32(0xC2B2AE35)
+    return hashes ^ (hashes >> np.uint32(16))
+
+
+def count_features(texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Count the lexical features of several texts: their terms and pairs of adjacent terms.
+
+    All texts are hashed together, in one pass of array operations over their joined code
+    points. Features are sorted by text and then by hash, so a text's features, and anything
+    summed over them, don't depend on the other texts in the batch.
+
+    Returns:
+        Tuple of arrays with one entry per distinct feature of each text: the text's index,
+        the feature hash and its number of occurrences; and the number of terms in each text
+    """
+    lowered = [text.lower() for text in texts]
+    # Texts are joined with a newline, which is never part of a term
+    lengths = np.fromiter((len(text) + 1 for text in lowered), dtype=np.int64, count=len(lowered))
+    offsets = np.cumsum(lengths) - lengths
+
+    hashes, starts = hash_terms(np.frombuffer("\n".join(lowered).encode("utf-32-le"), dtype=np.uint32))
+    documents = np.searchsorted(offsets, starts, side="right") - 1
+    term_counts = np.bincount(documents, minlength=len(texts))
+
+    same_document = documents[1:] == documents[:-1]
+    pairs = ((hashes[:-1] * _PAIR_MULTIPLIER) ^ hashes[1:])[same_document]
+    features = np.concatenate((hashes, pairs)).astype(np.uint64)
+    feature_documents = np.concatenate((documents, documents[:-1][same_document])).astype(np.uint64)
+
+    keys, counts = np.unique((feature_documents << np.uint64(32)) | features, return_counts=True)
+    return (keys >> np.uint64(32)).astype(np.int64), (keys & np.uint64(0xFFFFFFFF)).astype(np.uint32), counts, term_counts
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length in place, leaving all-zero rows (texts without terms) as they are."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+    return matrix
+
+
+class LocalEmbeddingModel(ABC):
+    """
+    Abstract base class for embedding models that run on the local CPU.
+
+    Implementations must be deterministic and safe to call from several threads at once.
+    """
+
+    # Length of the embedding vectors
+    dimensions: int
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Embed texts.
+
+        Returns:
+            Tuple of a float32 array with one unit-length embedding per text, and the number of tokens in each text
+        """
+        pass
+
+
+class HashingEmbeddingModel(LocalEmbeddingModel):
+    """
+    Feature hashing model: each term and adjacent term pair adds its sublinear frequency,
+    1 + log(count), to one dimension chosen by its hash, with a sign chosen by its hash.
+
+    Texts sharing vocabulary get similar vectors; there are no weights to load.
+    """
+
+    def __init__(self, dimensions: int):
+        """
+        Initialize the model.
+
+        Args:
+            dimensions: Length of the embedding vectors
+        """
+        if dimensions <= 0:
+            raise ValueError(f"Embedding dimensions must be positive, got {dimensions}")
+        self.dimensions = dimensions
+
+    def embed(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        documents, features, counts, term_counts = count_features(texts)
+
+        mixed = _mix(features)
+        columns = (mixed % np.uint32(self.dimensions)).astype(np.int64)
+        signs = np.where(mixed & np.uint32(0x80000000), -1.0, 1.0)
+
+        flat = np.bincount(documents * self.dimensions + columns, weights=signs * (1 + np.log(counts)), minlength=len(texts) * self.dimensions)
+        return _normalize(flat.reshape(len(texts), self.dimensions).astype(np.float32)), term_counts
+
+
+class ProjectionEmbeddingModel(LocalEmbeddingModel):
+    """
+    Model projecting TF-IDF weighted hashed features through a weight matrix loaded from disk.
+
+    The weights file is a NumPy ``.npz`` archive holding ``projection``, a (features, dimensions)
+    matrix such as the components of an LSA/SVD fit, and optionally ``idf``, one weight per
+    feature row. A feature's row is chosen by hashing it as in ``HashingEmbeddingModel``.
+    """
+
+    def __init__(self, path: str):
+        """
+        Load the model weights.
+
+        Args:
+            path: Path of the ``.npz`` weights file
+        """
+        with np.load(path) as weights:
+            self.projection = np.ascontiguousarray(weights["projection"], dtype=np.float32)
+            self.idf = np.asarray(weights["idf"], dtype=np.float32) if "idf" in weights else np.ones(len(self.projection), dtype=np.float32)
+
+        if self.projection.ndim != 2 or self.idf.shape != (len(self.projection),):
+            raise ValueError(f"Invalid embedding weights in {path}: projection {self.projection.shape}, idf {self.idf.shape}")
+        self.dimensions = self.projection.shape[1]
+
+    def embed(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        documents, features, counts, term_counts = count_features(texts)
+
+        rows = (_mix(features) % np.uint32(len(self.projection))).astype(np.int64)
+        weights = ((1 + np.log(counts)) * self.idf[rows]).astype(np.float32)
+
+        embeddings = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        # Project blocks of whole texts, so each text's sum is computed the same way in any batch
+        firsts = np.flatnonzero(np.concatenate(([True], documents[1:] != documents[:-1])))
+        cuts = np.unique(np.searchsorted(firsts, np.arange(0, len(documents), _PROJECTION_BLOCK), side="right") - 1)
+        for first, last in zip(cuts, np.append(cuts[1:], len(firsts))):
+            start, end = firsts[first], firsts[last] if last < len(firsts) else len(documents)
+            block_firsts = firsts[first:last] - start
+            sums = np.add.reduceat(self.projection[rows[start:end]] * weights[start:end, None], block_firsts, axis=0)
+            embeddings[documents[start + block_firsts]] = sums
+
+        return _normalize(embeddings), term_counts
+
+
+# Local embedding models by name. Register other local backends (for example ONNX or
+# sentence-transformers weights) with register_local_embedding_model.
+_MODEL_FACTORIES: Dict[str, Callable[[], LocalEmbeddingModel]] = {}
+
+
+def register_local_embedding_model(name: str, factory: Callable[[], LocalEmbeddingModel]) -> None:
+    """
+    Make a local embedding model available to the "local" embedding provider.
+
+    Args:
+        name: Model name requests refer to
+        factory: Creates the model; called once, on first use
+    """
+    _MODEL_FACTORIES[name] = factory
+    get_local_embedding_model.cache_clear()
+
+
+@lru_cache()
+def get_local_embedding_model(name: str) -> LocalEmbeddingModel:
+    """Return the local embedding model with the given name, loading it on first use."""
+    factory = _MODEL_FACTORIES.get(name)
+    if factory is None:
+        raise ValueError(f"Unsupported local embedding model: {name} (available: {', '.join(sorted(_MODEL_FACTORIES))})")
+    return factory()
+
+
+def _projection_model() -> LocalEmbeddingModel:
+    if not settings.LOCAL_EMBEDDING_WEIGHTS_PATH:
+        raise ValueError("Local embedding weights not configured. Please set the LOCAL_EMBEDDING_WEIGHTS_PATH environment variable.")
+    return ProjectionEmbeddingModel(settings.LOCAL_EMBEDDING_WEIGHTS_PATH)
+
+
+register_local_embedding_model("hashing", lambda: HashingEmbeddingModel(settings.LOCAL_EMBEDDING_DIMENSIONS))
+register_local_embedding_model("projection", _projection_model)
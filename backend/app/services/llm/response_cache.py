@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import SERVICE_EVENTS
+
+
+def response_cache_key(provider: str, model: str, prompt: str, max_tokens: int, temperature: float, options: Dict[str, Any]) -> bytes:
+    """Return the cache key of a generation request."""
+    request = [provider, model, prompt, max_tokens, temperature, options]
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).digest()
+
+
+class ResponseCacheBackend(ABC):
+    """Abstract base class for LLM response cache storage."""
+
+    @abstractmethod
+    async def get(self, key: bytes) -> Optional[str]:
+        """Return the stored value for a key, or None if it is missing or expired."""
+        pass
+
+    @abstractmethod
+    async def set(self, key: bytes, value: str, ttl: float) -> None:
+        """Store a value for ``ttl`` seconds."""
+        pass
+
+
+class MemoryResponseCacheBackend(ResponseCacheBackend):
+    """Per-process response cache storage with LRU eviction."""
+
+    def __init__(self, max_entries: int):
+        """Initialize the in-memory storage."""
+        self._entries: TTLCache[str] = TTLCache(max_size=max_entries)
+
+    async def get(self, key: bytes) -> Optional[str]:
+        return self._entries.get(key)
+
+    async def set(self, key: bytes, value: str, ttl: float) -> None:
+        self._entries.set(key, value, expires_at=time.time() + ttl)
+
+
+class SQLiteResponseCacheBackend(ResponseCacheBackend):
+    """
+    Response cache storage in a local SQLite file, shared by all workers on the host.
+
+    Expired entries are purged, and the oldest entries evicted beyond ``max_entries``,
+    every ``PRUNE_INTERVAL`` writes rather than on every write. Reads and writes run in
+    worker threads, so waiting on another worker's write lock doesn't block the event loop.
+    """
+
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, path: str, max_entries: int):
+        """
+        Initialize the SQLite storage.
+
+        Args:
+            path: Path of the SQLite file
+            max_entries: Number of entries kept after pruning
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_entries = max_entries
+        self._writes = 0
+        # The connection is used from worker threads, one statement at a time
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS responses (key BLOB PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+
+    async def get(self, key: bytes) -> Optional[str]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: bytes, value: str, ttl: float) -> None:
+        await asyncio.to_thread(self._set, key, value, time.time() + ttl)
+
+    def _get(self, key: bytes) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM responses WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: bytes, value: str, expires_at: float) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+
+            self._writes += 1
+            if self._writes % self.PRUNE_INTERVAL == 0:
+                self._prune()
+
+    def _prune(self) -> None:
+        """Delete expired entries, then the entries closest to expiry beyond the size limit. Call with the lock held."""
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY expires_at LIMIT max((SELECT count(*) FROM responses) - ?, 0))",
+            (self.max_entries,),
+        )
+
+
+@dataclass
+class ResponseCacheStats:
+    """Hit/miss counters for the LLM response cache."""
+
+    hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+
+
+class ResponseCache:
+    """Cache of LLM responses, serialized as JSON, in front of a pluggable storage backend."""
+
+    def __init__(self, backend: ResponseCacheBackend, ttl: float):
+        """
+        Initialize the cache.
+
+        Args:
+            backend: Storage for cached responses
+            ttl: Seconds a cached response stays valid
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = ResponseCacheStats()
+
+    async def get(self, key: bytes) -> Optional[str]:
+        """Return a cached response, counting the hit or miss."""
+        value = await self.backend.get(key)
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    async def set(self, key: bytes, value: str) -> None:
+        """Store a response."""
+        await self.backend.set(key, value, self.ttl)
+
+
+@lru_cache()
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide LLM response cache, or None if it is disabled."""
+    if settings.LLM_CACHE_BACKEND == "memory":
+        backend: ResponseCacheBackend = MemoryResponseCacheBackend(max_entries=settings.LLM_CACHE_MAX_ENTRIES)
+    elif settings.LLM_CACHE_BACKEND == "sqlite":
+        backend = SQLiteResponseCacheBackend(path=settings.LLM_CACHE_PATH, max_entries=settings.LLM_CACHE_MAX_ENTRIES)
+    elif settings.LLM_CACHE_BACKEND == "none":
+        return None
+    else:
+        raise ValueError(f"Unsupported LLM cache backend: {settings.LLM_CACHE_BACKEND}")
+
+    cache = ResponseCache(backend=backend, ttl=settings.LLM_CACHE_TTL_SECONDS)
+    SERVICE_EVENTS.register(("llm_response_cache", ""), cache.stats)
+    return cache
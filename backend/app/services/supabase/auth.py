@@ -1,32 +1,141 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import jwt
 from supabase import create_client, Client
-from supabase.lib.client_options import ClientOptions  # Import this
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.metrics import observe_upstream
+from app.models.auth import AuthenticatedUser
+from app.services.supabase.client import get_supabase_client
+
+# Algorithms accepted for locally verified tokens. HS256 uses the project JWT secret,
+# the asymmetric ones are resolved through the project's JWKS endpoint.
+_ASYMMETRIC_ALGORITHMS = ["RS256", "ES256"]
+
+
+@dataclass
+class _CachedToken:
+    """A verified token and the time it was last confirmed by Supabase Auth."""
+
+    user: Any
+    checked_at: float
+
+
+# Process-wide cache of verified tokens, keyed by the token's SHA-256 digest
+_token_cache: TTLCache[_CachedToken] = TTLCache(max_size=settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+@lru_cache()
+def _get_jwks_client() -> jwt.PyJWKClient:
+    """Return a JWKS client for the project's signing keys."""
+    jwks_url = settings.SUPABASE_JWKS_URL or f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json"
+    return jwt.PyJWKClient(jwks_url, cache_keys=True)
 
 
 class SupabaseAuthService:
     """Service for handling Supabase authentication."""
 
-    def __init__(self):
-        """Initialize the Supabase client."""
-        # Initialize with proper options structure
-        # The headers attribute is needed by the Supabase client
-        options = {"auto_refresh_token": True, "persist_session": True, "headers": {"X-Client-Info": "backend-api"}}
+    def __init__(self, client: Optional[Client] = None):
+        """
+        Initialize the auth service.
 
-        # Create the client with the properly structured options
-        self.supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+        Args:
+            client: Supabase client to use (default: the shared client from the registry)
+        """
+        self.supabase: Client = client or get_supabase_client()
 
     async def get_user(self, jwt_token: str):
         """Get user data from a JWT token."""
-        # Use the Supabase client to get user information
-        response = self.supabase.auth.get_user(jwt_token)
+        if settings.SUPABASE_AUTH_MODE != "local":
+            return await self._get_remote_user(jwt_token)
+
+        cache_key = hashlib.sha256(jwt_token.encode()).digest()
+        cached = _token_cache.get(cache_key)
+
+        if cached is None:
+            claims = await self._verify_token(jwt_token)
+            cached = _CachedToken(user=self._user_from_claims(claims), checked_at=time.time())
+            _token_cache.set(cache_key, cached, expires_at=claims["exp"])
+
+        recheck_interval = settings.AUTH_REMOTE_RECHECK_SECONDS
+        if recheck_interval > 0 and time.time() - cached.checked_at >= recheck_interval:
+            try:
+                await self._get_remote_user(jwt_token)
+            except Exception:
+                # The token was revoked (or can no longer be confirmed), so stop trusting it
+                _token_cache.pop(cache_key)
+                raise
+            cached.checked_at = time.time()
+
+        return cached.user
+
+    async def _get_remote_user(self, jwt_token: str):
+        """Get user data by asking Supabase Auth to validate the token."""
+        # The Supabase client is synchronous, so the round trip runs in a worker thread
+        with observe_upstream("supabase_auth", "get_user"):
+            response = await asyncio.to_thread(self.supabase.auth.get_user, jwt_token)
         return response.user
 
+    async def _verify_token(self, jwt_token: str) -> Dict[str, Any]:
+        """
+        Verify a token's signature, audience and expiry without a network round trip.
+
+        Args:
+            jwt_token: The access token issued by Supabase Auth
+
+        Returns:
+            The verified token claims
+        """
+        algorithm = jwt.get_unverified_header(jwt_token).get("alg")
+
+        if algorithm == "HS256":
+            if not settings.SUPABASE_JWT_SECRET:
+                raise ValueError("SUPABASE_JWT_SECRET is required to verify HS256 tokens locally")
+            key: Any = settings.SUPABASE_JWT_SECRET
+        elif algorithm in _ASYMMETRIC_ALGORITHMS:
+            # The JWKS client caches keys, but a cache miss performs a blocking fetch
+            signing_key = await asyncio.to_thread(_get_jwks_client().get_signing_key_from_jwt, jwt_token)
+            key = signing_key.key
+        else:
+            raise ValueError(f"Unsupported token algorithm: {algorithm}")
+
+        return jwt.decode(
+            jwt_token,
+            key,
+            algorithms=[algorithm],
+            audience=settings.SUPABASE_JWT_AUDIENCE,
+            options={"require": ["exp", "sub"]},
+        )
+
+    @staticmethod
+    def _user_from_claims(claims: Dict[str, Any]) -> AuthenticatedUser:
+        """Build a user object from verified token claims."""
+        return AuthenticatedUser(
+            id=claims["sub"],
+            email=claims.get("email"),
+            role=claims.get("role"),
+            aud=claims.get("aud"),
+            app_metadata=claims.get("app_metadata") or {},
+            user_metadata=claims.get("user_metadata") or {},
+            expires_at=claims["exp"],
+        )
+
     async def sign_in_with_provider_token(self, provider: str, token: str) -> str:
         """Exchange a provider token (Google, LinkedIn) for a Supabase token."""
         if provider not in ["google", "linkedin"]:
             raise ValueError(f"Unsupported provider: {provider}")
 
-        response = self.supabase.auth.sign_in_with_oauth_provider(provider=provider, access_token=token)
+        # Signing in changes the client's session, so use a dedicated client rather than the shared one
+        client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+        try:
+            response = client.auth.sign_in_with_oauth_provider(provider=provider, access_token=token)
+        finally:
+            client.auth.close()
 
         if not response.session or not response.session.access_token:
             raise ValueError(f"Failed to authenticate with {provider}")
@@ -36,5 +145,5 @@ class SupabaseAuthService:
 
 # Dependency to get the auth service
 def get_auth_service() -> SupabaseAuthService:
-    """Return an instance of the Supabase auth service."""
+    """Return a Supabase auth service backed by the shared client."""
     return SupabaseAuthService()
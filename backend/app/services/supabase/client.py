@@ -0,0 +1,146 @@
+from functools import lru_cache
+from typing import List, Mapping, Optional, Set, Union
+
+import httpx
+import storage3
+from supabase import create_client, Client, SupabaseAuthClient
+from supabase.lib.client_options import ClientOptions
+from storage3.utils import SyncClient
+
+from app.core.config import settings
+
+
+class SupabaseClientRegistry:
+    """
+    Process-wide owner of the shared Supabase client.
+
+    The auth, storage and database services all borrow the same client, so they share
+    keep-alive HTTP connection pools instead of opening new connections per request.
+    The registry is created in the app lifespan hook and closed on shutdown.
+    """
+
+    def __init__(self, url: str = settings.SUPABASE_URL, key: str = settings.SUPABASE_SERVICE_KEY):
+        """
+        Initialize the registry.
+
+        Args:
+            url: URL of the Supabase project
+            key: Service role key used by the backend
+        """
+        self.url = url
+        self.key = key
+        self.limits = httpx.Limits(
+            max_connections=settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SUPABASE_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+        )
+        self._client: Optional[Client] = None
+        self._sessions: List[httpx.Client] = []
+        self._known_buckets: Set[str] = set()
+
+    @property
+    def client(self) -> Client:
+        """Return the shared client, creating it on first use."""
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    def _create_client(self) -> Client:
+        """Create a Supabase client whose auth, PostgREST and storage sessions use pooled connections."""
+        # The backend never holds a user session of its own, so refreshing and persisting are disabled
+        options = ClientOptions(
+            auto_refresh_token=False,
+            persist_session=False,
+            postgrest_client_timeout=settings.SUPABASE_HTTP_TIMEOUT,
+            storage_client_timeout=settings.SUPABASE_HTTP_TIMEOUT,
+        )
+        client = create_client(self.url, self.key, options=options)
+
+        # Supabase Auth takes its HTTP client as an option (its admin API shares it), so it is rebuilt
+        # with a pooled one. The backend never signs in with the shared client, so it has no session
+        # state for the replaced client to hand over
+        client.auth.close()
+        client.auth = SupabaseAuthClient(
+            url=client.auth_url,
+            headers=client.options.headers,
+            auto_refresh_token=False,
+            persist_session=False,
+            http_client=self._pooled_session(),
+        )
+
+        postgrest_session = client.postgrest.session
+        client.postgrest.session = self._pooled_session(postgrest_session.base_url, postgrest_session.headers, postgrest_session.timeout)
+        postgrest_session.close()
+
+        # storage3 offers no HTTP client option, and its bucket and file APIs use the private _client
+        # attribute; storage3 is pinned in pyproject.toml, and this fails at startup if the attribute is gone
+        storage = client.storage
+        if not isinstance(getattr(storage, "_client", None), httpx.Client):
+            raise RuntimeError(f"storage3 {storage3.__version__} is unsupported: SyncStorageClient has no _client session to replace")
+        storage_session = self._pooled_session(storage.session.base_url, storage.session.headers, storage.session.timeout)
+        storage.session.close()
+        storage.session = storage_session
+        storage._client = storage_session
+
+        return client
+
+    def _pooled_session(
+        self,
+        base_url: Union[httpx.URL, str] = "",
+        headers: Optional[Mapping[str, str]] = None,
+        timeout: Union[httpx.Timeout, float] = settings.SUPABASE_HTTP_TIMEOUT,
+    ) -> httpx.Client:
+        """Create an HTTP session that uses the configured pool limits, closed with the registry."""
+        pooled = SyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            http2=True,
+            limits=self.limits,
+        )
+        self._sessions.append(pooled)
+        return pooled
+
+    def ensure_bucket(self, bucket_name: str) -> None:
+        """
+        Ensure a storage bucket exists, creating it if necessary.
+
+        The result is cached, so the existence check costs one round trip per bucket per process.
+
+        Args:
+            bucket_name: The name of the storage bucket
+        """
+        if bucket_name in self._known_buckets:
+            return
+
+        try:
+            self.client.storage.get_bucket(bucket_name)
+        except Exception:
+            self.client.storage.create_bucket(bucket_name)
+
+        self._known_buckets.add(bucket_name)
+
+    def forget_bucket(self, bucket_name: str) -> None:
+        """Drop a bucket from the existence cache, e.g. after it was deleted."""
+        self._known_buckets.discard(bucket_name)
+
+    def close(self) -> None:
+        """Close all pooled HTTP connections and drop the shared client."""
+        for session in self._sessions:
+            session.close()
+
+        self._sessions.clear()
+        self._known_buckets.clear()
+        self._client = None
+
+
+@lru_cache()
+def get_supabase_registry() -> SupabaseClientRegistry:
+    """Return the process-wide Supabase client registry."""
+    return SupabaseClientRegistry()
+
+
+def get_supabase_client() -> Client:
+    """Return the shared Supabase client."""
+    return get_supabase_registry().client
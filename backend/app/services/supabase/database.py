@@ -1,41 +1,196 @@
-from supabase import create_client, Client
-from typing import Dict, List, Any, Optional, TypeVar, Generic, Type
+import asyncio
+import base64
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+from postgrest.types import ReturnMethod
+from supabase import Client
+from typing import Dict, List, Any, Optional, TypeVar, Generic, Type, AsyncIterator, Iterable, Iterator, Sequence, Union
 
 from app.core.config import settings
+from app.core.metrics import observe_upstream
+from app.services.supabase.client import get_supabase_client
 
 T = TypeVar("T")
 
+Row = Union[Dict[str, Any], Any]
+
+
+@dataclass
+class Page(Generic[T]):
+    """One page of a keyset-paginated listing."""
+
+    items: List[T] = field(default_factory=list)
+    # Opaque cursor for the page after this one, or None when this is the last page
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key values of the last row of a page as an opaque, URL-safe cursor."""
+    return base64.urlsafe_b64encode(json.dumps(list(values), separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Decode a cursor made by encode_cursor back into its sort key values."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
+
+
+def _model_columns(model_class: Type[Any]) -> List[str]:
+    """The columns a model is built from: its field names (or aliases), or every column for non-Pydantic classes."""
+    fields = getattr(model_class, "model_fields", None)
+    if not fields:
+        return ["*"]
+    return [info.alias or name for name, info in fields.items()]
+
+
+def _quote(value: Any) -> str:
+    """Quote a value for use inside a PostgREST logical filter, where commas and parentheses are reserved."""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def _batches(rows: Iterable[Row], size: int) -> Iterator[List[Row]]:
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
 
 class SupabaseDatabaseService(Generic[T]):
     """Service for interacting with Supabase database."""
 
-    def __init__(self, table_name: str, model_class: Type[T]):
+    def __init__(self, table_name: str, model_class: Type[T], key: str = "id"):
         """
         Initialize the Supabase database service.
 
         Args:
             table_name: The name of the table in Supabase
             model_class: The Pydantic model class for data validation
+            key: A unique, non-null column, used to address single records and to break ties when paginating
         """
-        self.supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+        self.supabase: Client = get_supabase_client()
         self.table_name = table_name
         self.model_class = model_class
+        self.key = key
+        # Only the columns the model uses are selected, rather than every column of the table
+        self.columns = _model_columns(model_class)
+
+    def _select(self, columns: Optional[List[str]] = None, required: Sequence[str] = ()):
+        columns = list(columns or self.columns)
+        if "*" not in columns:
+            columns += [column for column in required if column not in columns]
+        return self.supabase.table(self.table_name).select(",".join(columns))
 
-    async def list(self, filters: Optional[Dict[str, Any]] = None) -> List[T]:
-        """List records with optional filtering."""
-        query = self.supabase.table(self.table_name).select("*")
+    async def _execute(self, operation: str, query):
+        """Run a query in a worker thread, as the Supabase client is synchronous."""
+        with observe_upstream("supabase_db", operation):
+            return await asyncio.to_thread(query.execute)
+
+    async def list(self, filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None, columns: Optional[List[str]] = None) -> List[T]:
+        """
+        List records with optional filtering.
 
-        if filters:
-            for key, value in filters.items():
+        Without a limit, every matching record is fetched, a page at a time, so that the
+        server's row limit does not silently truncate the result; use iter_pages to process
+        large tables without holding all of their rows.
+        """
+        if limit is not None:
+            query = self._select(columns)
+            for key, value in (filters or {}).items():
                 query = query.eq(key, value)
+            response = await self._execute("list", query.limit(limit))
+            return [self.model_class(**item) for item in response.data]
+
+        items: List[T] = []
+        async for page in self.iter_pages(filters, columns=columns):
+            items.extend(page)
+        return items
+
+    async def list_page(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        columns: Optional[List[str]] = None,
+    ) -> Page[T]:
+        """
+        Get one page of records, ordered by a column, after the position given by a cursor.
+
+        Keyset pagination: rather than an offset the server has to skip over, each page filters
+        on the sort key of the last row of the previous one, so every page costs the same
+        however deep into the table it is (given an index on the sort columns).
+
+        Args:
+            filters: Column values the records must equal
+            cursor: The next_cursor of the previous page, or None for the first page
+            limit: The maximum number of records in the page
+            order_by: The column to sort by, with the key column breaking ties; defaults to the key column.
+                It must not be null, and must not change between pages, for the listing to be consistent
+            descending: Sort in descending rather than ascending order
+            columns: The columns to select, instead of those of the model
+
+        Returns:
+            The records and the cursor of the next page
+        """
+        limit = limit or settings.SUPABASE_DB_PAGE_SIZE
+        order_by = order_by or self.key
+        sort_columns = [order_by] if order_by == self.key else [order_by, self.key]
 
-        response = query.execute()
+        query = self._select(columns, required=sort_columns)
+        for key, value in (filters or {}).items():
+            query = query.eq(key, value)
 
-        return [self.model_class(**item) for item in response.data]
+        if cursor is not None:
+            values = decode_cursor(cursor)
+            if len(values) != len(sort_columns):
+                raise ValueError(f"Cursor does not match the sort order: {cursor}")
+            op = "lt" if descending else "gt"
+            if len(values) == 1:
+                query = query.filter(order_by, op, values[0])
+            else:
+                value, key_value = values
+                query = query.or_(f"{order_by}.{op}.{_quote(value)},and({order_by}.eq.{_quote(value)},{self.key}.{op}.{_quote(key_value)})")
 
-    async def get(self, id: str) -> Optional[T]:
+        for column in sort_columns:
+            query = query.order(column, desc=descending)
+        response = await self._execute("list_page", query.limit(limit))
+
+        rows = response.data
+        next_cursor = encode_cursor([rows[-1][column] for column in sort_columns]) if len(rows) == limit else None
+        return Page(items=[self.model_class(**item) for item in rows], next_cursor=next_cursor)
+
+    async def iter_pages(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        page_size: Optional[int] = None,
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        columns: Optional[List[str]] = None,
+        cursor: Optional[str] = None,
+    ) -> AsyncIterator[List[T]]:
+        """
+        Stream the matching records a page at a time, using keyset pagination.
+
+        Only one page is held at a time, and the next one is requested when the caller asks for it.
+        """
+        while True:
+            page = await self.list_page(filters, cursor=cursor, limit=page_size, order_by=order_by, descending=descending, columns=columns)
+            if page.items:
+                yield page.items
+            if page.next_cursor is None:
+                return
+            cursor = page.next_cursor
+
+    async def get(self, id: str, columns: Optional[List[str]] = None) -> Optional[T]:
         """Get a single record by ID."""
-        response = self.supabase.table(self.table_name).select("*").eq("id", id).execute()
+        response = await self._execute("get", self._select(columns).eq(self.key, id))
 
         if not response.data:
             return None
@@ -44,16 +199,86 @@ class SupabaseDatabaseService(Generic[T]):
 
     async def create(self, data: Dict[str, Any]) -> T:
         """Create a new record."""
-        response = self.supabase.table(self.table_name).insert(data).execute()
+        response = await self._execute("create", self.supabase.table(self.table_name).insert(data))
 
         if not response.data:
             raise ValueError("Failed to create record")
 
         return self.model_class(**response.data[0])
 
+    async def create_many(self, rows: Iterable[Row], batch_size: Optional[int] = None) -> int:
+        """
+        Insert many records, in batches of one request each.
+
+        Args:
+            rows: Dicts or model instances; any iterable, including a generator, which is consumed a batch at a time
+            batch_size: The records sent per request
+
+        Returns:
+            The number of records inserted. The records are not sent back, to keep large imports
+            cheap; use create when the stored record is needed
+        """
+        return await self._write_batches("create_many", rows, batch_size, lambda batch: self.supabase.table(self.table_name).insert(
+            batch, returning=ReturnMethod.minimal, default_to_null=False
+        ))
+
+    async def upsert_many(self, rows: Iterable[Row], on_conflict: Optional[str] = None, ignore_duplicates: bool = False, batch_size: Optional[int] = None) -> int:
+        """
+        Insert many records, or update those that already exist, in batches of one request each.
+
+        Args:
+            rows: Dicts or model instances; any iterable, including a generator, which is consumed a batch at a time
+            on_conflict: Comma-separated columns of the unique constraint identifying existing records; defaults to the key column
+            ignore_duplicates: Leave existing records unchanged, instead of updating them
+            batch_size: The records sent per request
+
+        Returns:
+            The number of records sent
+        """
+        return await self._write_batches("upsert_many", rows, batch_size, lambda batch: self.supabase.table(self.table_name).upsert(
+            batch, returning=ReturnMethod.minimal, on_conflict=on_conflict or self.key, ignore_duplicates=ignore_duplicates, default_to_null=False
+        ))
+
+    async def _write_batches(self, operation: str, rows: Iterable[Row], batch_size: Optional[int], build_query) -> int:
+        """
+        Send the rows in batches, a few requests at a time.
+
+        Batches are only read from rows while a request slot is free, so memory stays bounded by the
+        batch size and concurrency however many rows there are. The first failed batch stops the write
+        and is raised; batches already sent stay written.
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.SUPABASE_DB_WRITE_CONCURRENCY))
+        tasks: List[asyncio.Task] = []
+
+        async def send(batch: List[Dict[str, Any]]) -> int:
+            try:
+                await self._execute(operation, build_query(batch))
+                return len(batch)
+            finally:
+                semaphore.release()
+
+        try:
+            for batch in _batches(rows, batch_size or settings.SUPABASE_DB_BATCH_SIZE):
+                await semaphore.acquire()
+                for task in tasks:
+                    if task.done() and task.exception():
+                        semaphore.release()
+                        raise task.exception()
+                tasks.append(asyncio.create_task(send([self._to_row(row) for row in batch])))
+            return sum(await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _to_row(row: Row) -> Dict[str, Any]:
+        if hasattr(row, "model_dump"):
+            return row.model_dump(mode="json", by_alias=True, exclude_unset=True)
+        return row
+
     async def update(self, id: str, data: Dict[str, Any]) -> T:
         """Update an existing record."""
-        response = self.supabase.table(self.table_name).update(data).eq("id", id).execute()
+        response = await self._execute("update", self.supabase.table(self.table_name).update(data).eq(self.key, id))
 
         if not response.data:
             raise ValueError(f"Failed to update record with ID: {id}")
@@ -62,7 +287,7 @@ class SupabaseDatabaseService(Generic[T]):
 
     async def delete(self, id: str) -> bool:
         """Delete a record by ID."""
-        response = self.supabase.table(self.table_name).delete().eq("id", id).execute()
+        response = await self._execute("delete", self.supabase.table(self.table_name).delete().eq(self.key, id))
 
         if not response.data:
             return False
@@ -1,33 +1,59 @@
-from supabase import create_client, Client
+from supabase import Client
 from fastapi import UploadFile
-from typing import List, Optional
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import BinaryIO, Iterator, List, Optional
+import asyncio
+import base64
+import os
 import uuid
 
+import httpx
+
 from app.core.config import settings
+from app.models.storage import UploadedFile
+from app.services.supabase.client import get_supabase_registry
+
+# Supabase Storage only accepts resumable uploads in chunks of exactly 6 MB (the last one may be shorter)
+RESUMABLE_CHUNK_SIZE = 6 * 1024 * 1024
+# Bytes read from the file at a time while sending a chunk
+_READ_SIZE = 256 * 1024
+_TUS_HEADERS = {"Tus-Resumable": "1.0.0"}
+
+
+@dataclass
+class StorageObject:
+    """A file in a storage bucket, as listed by Supabase Storage."""
+
+    # Path of the file within the bucket
+    path: str
+    # Entity tag of the stored content; changes whenever the content does (empty if unknown)
+    etag: str
+    size: int
+    updated_at: Optional[str] = None
 
 
 class SupabaseStorageService:
     """Service for interacting with Supabase Storage."""
 
-    def __init__(self, bucket_name: str = "default"):
+    def __init__(self, bucket_name: str = "default", create_bucket: bool = True):
         """
         Initialize the Supabase storage service.
 
         Args:
             bucket_name: The name of the storage bucket (default: "default")
+            create_bucket: Create the bucket if it doesn't exist; without it, calls on a missing bucket fail
         """
-        self.supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
         self.bucket_name = bucket_name
 
-        # Ensure the bucket exists
-        self._ensure_bucket_exists()
+        if create_bucket:
+            # Ensure the bucket exists (cached per process by the registry)
+            get_supabase_registry().ensure_bucket(self.bucket_name)
 
-    def _ensure_bucket_exists(self):
-        """Ensure the bucket exists, creating it if necessary."""
-        try:
-            self.supabase.storage.get_bucket(self.bucket_name)
-        except Exception:
-            self.supabase.storage.create_bucket(self.bucket_name)
+    @property
+    def supabase(self) -> Client:
+        """Return the registry's current client, so a cached service follows the registry across close() and restarts."""
+        return get_supabase_registry().client
 
     async def upload_file(self, file: UploadFile, path: Optional[str] = None) -> str:
         """
@@ -40,22 +66,107 @@ class SupabaseStorageService:
         Returns:
             The public URL of the uploaded file
         """
+        return (await self.store_upload(file, path)).url
+
+    async def store_upload(self, file: UploadFile, path: Optional[str] = None) -> UploadedFile:
+        """
+        Upload a file to Supabase Storage under a unique name, without holding it in memory.
+
+        The upload runs on a worker thread and reads the file in chunks: files up to
+        ``STORAGE_RESUMABLE_THRESHOLD_BYTES`` are sent in one request, larger ones with a
+        resumable upload, one ``RESUMABLE_CHUNK_SIZE`` chunk at a time.
+
+        Args:
+            file: The file to upload
+            path: Optional path within the bucket
+
+        Returns:
+            The stored file
+        """
         # Generate a unique filename
         filename = f"{uuid.uuid4()}-{file.filename}"
 
         # Create the full path
         full_path = f"{path}/{filename}" if path else filename
+        content_type = file.content_type or "application/octet-stream"
+
+        size = await asyncio.to_thread(self._upload, file.file, full_path, content_type)
+
+        return UploadedFile(path=full_path, url=self.get_public_url(full_path), size=size, content_type=content_type)
+
+    async def upload_files(
+        self, files: List[UploadFile], path: Optional[str] = None, max_concurrency: int = settings.STORAGE_UPLOAD_CONCURRENCY
+    ) -> List[UploadedFile]:
+        """
+        Upload several files, at most ``max_concurrency`` at a time.
+
+        Returns:
+            The stored files, in the order of ``files``
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def upload(file: UploadFile) -> UploadedFile:
+            async with semaphore:
+                return await self.store_upload(file, path)
 
-        # Read file content
-        file_content = await file.read()
+        return list(await asyncio.gather(*(upload(file) for file in files)))
 
-        # Upload to Supabase Storage
-        self.supabase.storage.from_(self.bucket_name).upload(path=full_path, file=file_content, file_options={"content-type": file.content_type})
+    def _upload(self, source: BinaryIO, path: str, content_type: str) -> int:
+        """Upload the content of a file object, returning its size."""
+        source.seek(0, os.SEEK_END)
+        size = source.tell()
+        source.seek(0)
 
-        # Return the public URL
-        public_url = self.supabase.storage.from_(self.bucket_name).get_public_url(full_path)
+        if size <= settings.STORAGE_RESUMABLE_THRESHOLD_BYTES:
+            self.supabase.storage.from_(self.bucket_name).upload(path=path, file=source.read(), file_options={"content-type": content_type})
+        else:
+            self._upload_resumable(source, size, path, content_type)
+        return size
 
-        return public_url
+    def _upload_resumable(self, source: BinaryIO, size: int, path: str, content_type: str) -> None:
+        """
+        Upload a file with the TUS resumable upload protocol.
+
+        Chunks are streamed from the file as they are sent, so only a small buffer is held
+        in memory, whatever the file size. A chunk that fails with a network error, a
+        server error or an offset conflict is retried from the offset the server reports
+        having stored, up to ``STORAGE_UPLOAD_RETRIES`` times.
+        """
+        # The storage session carries the service key and uses the registry's connection pool
+        session: httpx.Client = self.supabase.storage.session
+        metadata = {"bucketName": self.bucket_name, "objectName": path, "contentType": content_type}
+        response = session.post(
+            "upload/resumable",
+            headers={
+                **_TUS_HEADERS,
+                "Upload-Length": str(size),
+                "Upload-Metadata": ",".join(f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in metadata.items()),
+                "x-upsert": "false",
+            },
+        )
+        response.raise_for_status()
+        location = response.headers["Location"]
+
+        offset = 0
+        failures = 0
+        while offset < size:
+            source.seek(offset)
+            length = min(RESUMABLE_CHUNK_SIZE, size - offset)
+            headers = {**_TUS_HEADERS, "Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream", "Content-Length": str(length)}
+            try:
+                response = session.patch(location, content=_read_range(source, length), headers=headers)
+                response.raise_for_status()
+                offset = int(response.headers["Upload-Offset"])
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = isinstance(e, httpx.TransportError) or e.response.status_code >= 500 or e.response.status_code == 409
+                failures += 1
+                if not retryable or failures > settings.STORAGE_UPLOAD_RETRIES:
+                    raise
+
+                # Resume from whatever the server has stored
+                response = session.head(location, headers=_TUS_HEADERS)
+                response.raise_for_status()
+                offset = int(response.headers["Upload-Offset"])
 
     def get_public_url(self, path: str) -> str:
         """Get the public URL for a file."""
@@ -69,7 +180,72 @@ class SupabaseStorageService:
         except Exception:
             return False
 
-    def list_files(self, path: Optional[str] = None) -> List[dict]:
-        """List files in a directory."""
-        response = self.supabase.storage.from_(self.bucket_name).list(path or "")
+    def list_files(self, path: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+        """
+        List files in a directory.
+
+        Args:
+            path: Directory within the bucket (default: the root)
+            limit: Maximum number of entries to return (default: the Storage API's 100)
+            offset: Number of entries to skip, in name order
+
+        Returns:
+            The directory's entries; sub-directories have no ``id``
+        """
+        options = {"offset": offset, "sortBy": {"column": "name", "order": "asc"}}
+        if limit is not None:
+            options["limit"] = limit
+        response = self.supabase.storage.from_(self.bucket_name).list(path or "", options)
         return response
+
+    def iter_file_pages(self, prefix: str = "", page_size: int = 1000) -> Iterator[List[StorageObject]]:
+        """
+        Walk a directory and its sub-directories, yielding their files a page at a time.
+
+        Each page is one listing request, so callers can process a large bucket without
+        holding its whole listing.
+
+        Args:
+            prefix: Directory to walk (default: the whole bucket)
+            page_size: Entries requested per listing call
+        """
+        directories = [prefix.strip("/")]
+        while directories:
+            directory = directories.pop()
+            offset = 0
+            while True:
+                entries = self.list_files(directory, limit=page_size, offset=offset)
+                files = []
+                for entry in entries:
+                    path = f"{directory}/{entry['name']}" if directory else entry["name"]
+                    if entry.get("id") is None:
+                        directories.append(path)
+                    else:
+                        metadata = entry.get("metadata") or {}
+                        etag = str(metadata.get("eTag") or "").strip('"')
+                        files.append(StorageObject(path=path, etag=etag, size=int(metadata.get("size") or 0), updated_at=entry.get("updated_at")))
+                if files:
+                    yield files
+                if len(entries) < page_size:
+                    break
+                offset += page_size
+
+    def download_file(self, path: str) -> bytes:
+        """Download the content of a file."""
+        return self.supabase.storage.from_(self.bucket_name).download(path)
+
+
+def _read_range(source: BinaryIO, length: int) -> Iterator[bytes]:
+    """Yield the next ``length`` bytes of a file in small blocks."""
+    while length > 0:
+        block = source.read(min(_READ_SIZE, length))
+        if not block:
+            return
+        length -= len(block)
+        yield block
+
+
+@lru_cache()
+def get_storage_service() -> SupabaseStorageService:
+    """Dependency to get the storage service of the configured upload bucket."""
+    return SupabaseStorageService(bucket_name=settings.STORAGE_UPLOAD_BUCKET)
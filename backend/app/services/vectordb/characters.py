@@ -0,0 +1,48 @@
+from functools import lru_cache
+
+import numpy as np
+
+# Character classes shared by the lexical tokenizers (chunk sizing and sparse vectors)
+OTHER, LETTER, DIGIT, SYMBOL, CJK = 0, 1, 2, 3, 4
+
+# Scripts written without spaces, where every character is roughly one token
+CJK_RANGES = [(0x3040, 0x30FF), (0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xAC00, 0xD7AF)]
+
+
+@lru_cache()
+def _plane_classes() -> np.ndarray:
+    """Return the character class of every code point in the Basic Multilingual Plane."""
+    classes = np.empty(0x10000, dtype=np.uint8)
+    for code_point in range(0x10000):
+        char = chr(code_point)
+        if char.isdecimal():
+            classes[code_point] = DIGIT
+        elif char.isalnum():
+            classes[code_point] = LETTER
+        elif char.isspace() or char == "_":
+            classes[code_point] = OTHER
+        else:
+            classes[code_point] = SYMBOL
+
+    for first, last in CJK_RANGES:
+        classes[first : last + 1] = CJK
+
+    return classes
+
+
+def character_classes(code_points: np.ndarray) -> np.ndarray:
+    """
+    Classify code points with a table lookup.
+
+    Code points outside the Basic Multilingual Plane (mostly emoji and rare scripts) are
+    classed as symbols.
+
+    Args:
+        code_points: Array of code points, e.g. a string encoded as UTF-32
+
+    Returns:
+        Array of the character class of each code point
+    """
+    classes = _plane_classes()[np.minimum(code_points, 0xFFFF)]
+    classes[code_points > 0xFFFF] = SYMBOL
+    return classes
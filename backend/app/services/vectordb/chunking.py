@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+from app.services.vectordb.characters import DIGIT, LETTER, OTHER, SYMBOL, character_classes
+
+
+def token_spans(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split text into approximate tokens without a vocabulary file.
+
+    Mirrors BPE pre-tokenization closely enough for sizing chunks: every run of letters,
+    group of up to three digits, punctuation mark or symbol, and CJK character is one token.
+    The work is vectorized over the text's code points, so no per-token Python code runs.
+
+    Returns:
+        Arrays of token start and end offsets into ``text``
+    """
+    # UTF-32 has one unit per code point, so array positions are also str offsets
+    code_points = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    classes = character_classes(code_points)
+
+    previous = np.concatenate(([OTHER], classes[:-1]))
+    following = np.concatenate((classes[1:], [OTHER]))
+
+    single = classes >= SYMBOL
+    letter = classes == LETTER
+    digit = classes == DIGIT
+
+    # Position of each digit within its run, to split digit runs into groups of three
+    positions = np.arange(len(classes))
+    run_starts = np.maximum.accumulate(np.where(digit & (previous != DIGIT), positions, 0))
+    digit_position = (positions - run_starts) % 3
+
+    starts = single | (letter & (previous != LETTER)) | (digit & (digit_position == 0))
+    ends = single | (letter & (following != LETTER)) | (digit & ((following != DIGIT) | (digit_position == 2)))
+
+    return np.flatnonzero(starts), np.flatnonzero(ends) + 1
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A slice of a document, with character offsets into the original text."""
+
+    text: str
+    index: int
+    start: int
+    end: int
+
+
+class TokenChunker:
+    """Split text into windows of a fixed number of tokens, with overlap between neighbours."""
+
+    def __init__(self, chunk_size: int, chunk_overlap: int = 0):
+        """
+        Initialize the chunker.
+
+        Args:
+            chunk_size: Maximum number of tokens per chunk
+            chunk_overlap: Number of tokens shared by consecutive chunks
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be at least 0 and smaller than chunk_size")
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def chunk(self, text: str) -> List[Chunk]:
+        """Split a text into chunks. Blank text yields no chunks."""
+        if not text.strip():
+            return []
+
+        # Every token is at least one character long, so short texts need no tokenizing
+        if len(text) <= self.chunk_size:
+            return [Chunk(text=text, index=0, start=0, end=len(text))]
+
+        starts, ends = token_spans(text)
+        if len(starts) <= self.chunk_size:
+            return [Chunk(text=text, index=0, start=0, end=len(text))]
+
+        # Token windows [first, first + chunk_size), the last one ending at the final token
+        step = self.chunk_size - self.chunk_overlap
+        firsts = np.arange(0, max(len(starts) - self.chunk_overlap, 1), step)
+        lasts = np.minimum(firsts + self.chunk_size, len(starts)) - 1
+
+        chunks = []
+        for index, (start, end) in enumerate(zip(starts[firsts].tolist(), ends[lasts].tolist())):
+            chunks.append(Chunk(text=text[start:end], index=index, start=start, end=end))
+
+        return chunks
@@ -0,0 +1,739 @@
+import json
+import math
+import os
+import shutil
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from qdrant_client.http import models
+from qdrant_client.http.models import Distance, VectorParams
+
+from app.services.vectordb.fusion import reciprocal_rank_fusion
+
+try:
+    import fcntl
+except ImportError:  # POSIX only; on Windows the index directory is not locked against other processes
+    fcntl = None
+
+# Rows scored per matrix multiply, bounding the temporary score matrix for large collections
+SEARCH_BLOCK_ROWS = 65536
+
+# Compact a collection once it holds more deleted rows than this, and more than live ones
+COMPACTION_MIN_DEAD_ROWS = 1024
+
+_INITIAL_CAPACITY = 1024
+
+# (id, score, payload) of a search hit
+_Hit = Tuple[Any, float, Dict[str, Any]]
+# Sparse vectors of a point by name, as (indices, values)
+_SparseVectors = Dict[str, Tuple[List[int], List[float]]]
+
+
+def _index_values(value: Any) -> List[Any]:
+    """Return the index keys of a payload value: scalars index as themselves, lists by each scalar element."""
+    values = value if isinstance(value, list) else [value]
+    # bool is an int subclass; keep True and 1 apart like Qdrant does
+    return [(type(item) is bool, item) for item in values if isinstance(item, (str, int, float, bool))]
+
+
+def _top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the k best scores of each query.
+
+    Args:
+        scores: Score matrix of shape (queries, candidates)
+        rows: Row number of each candidate column, shape (candidates,) or (queries, candidates)
+
+    Returns:
+        Scores and row numbers of shape (queries, min(k, candidates)), best first
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return scores[:, :0], np.empty(scores.shape[:1] + (0,), dtype=np.int64)
+    if k < scores.shape[1]:
+        selected = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        selected = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+
+    selected_scores = np.take_along_axis(scores, selected, axis=1)
+    order = np.argsort(-selected_scores, axis=1, kind="stable")
+    selected = np.take_along_axis(selected, order, axis=1)
+
+    rows = np.broadcast_to(rows, scores.shape)
+    return np.take_along_axis(selected_scores, order, axis=1), np.take_along_axis(rows, selected, axis=1)
+
+
+class _Collection:
+    """
+    One collection: a contiguous float32 matrix of vectors, their payloads, and an inverted payload index.
+
+    Named sparse vectors are kept as postings lists per term, scored like BM25 when the
+    vector is configured with the IDF modifier. When backed by a directory, vectors live in a memory-mapped file and every change is
+    appended to a log of point upserts and deletions, so writes cost a row update and a
+    log line rather than rewriting the collection. Deleted rows are reclaimed by
+    compacting into a new generation of files once they outnumber the live rows.
+    """
+
+    def __init__(self, directory: Optional[str], vector_size: int, distance: Distance, sparse_vectors: Dict[str, bool], generation: int = 0):
+        self.directory = directory
+        self.vector_size = vector_size
+        self.distance = distance
+        # Sparse vector names, and whether each applies inverse document frequency at query time
+        self.sparse_vectors = sparse_vectors
+        self.generation = generation
+        self.payload_schema: Dict[str, models.PayloadSchemaType] = {}
+
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((0, vector_size), dtype=np.float32)
+        self._count = 0
+        self._live = np.zeros(0, dtype=bool)
+        self._row_ids: List[Any] = []
+        self._rows: Dict[Any, int] = {}
+        self._payloads: Dict[int, Dict[str, Any]] = {}
+        self._index: Dict[str, Dict[Any, Set[int]]] = {}
+        self._sparse: Dict[int, _SparseVectors] = {}
+        self._postings: Dict[str, Dict[int, Dict[int, float]]] = {name: {} for name in sparse_vectors}
+        self._log = None
+
+    @classmethod
+    def create(cls, directory: Optional[str], vector_size: int, distance: Distance, sparse_vectors: Dict[str, bool]) -> "_Collection":
+        """Create an empty collection, writing its files if it has a directory."""
+        if distance not in (Distance.COSINE, Distance.DOT):
+            raise ValueError(f"Distance {distance} is not supported by the embedded vector index")
+
+        collection = cls(directory, vector_size, distance, sparse_vectors)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            collection._open_files()
+            collection._write_config()
+        return collection
+
+    @classmethod
+    def load(cls, directory: str) -> "_Collection":
+        """Open a collection from its directory, replaying its log to rebuild the payloads and index."""
+        with open(os.path.join(directory, "config.json")) as f:
+            config = json.load(f)
+
+        collection = cls(directory, config["vector_size"], Distance(config["distance"]), config.get("sparse_vectors", {}), config["generation"])
+        collection.payload_schema = {name: models.PayloadSchemaType(schema) for name, schema in config.get("payload_schema", {}).items()}
+
+        with open(collection._path("log", "jsonl"), "r+b") as f:
+            complete = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A write interrupted by a crash; the rest of the log is complete. Drop the partial
+                    # entry so that the next one appended doesn't run into it
+                    f.truncate(complete)
+                    break
+                complete += len(line)
+                entry = json.loads(line)
+                if entry["row"] is None:
+                    collection._remove(entry["id"])
+                else:
+                    collection._assign(entry["id"], entry["row"], entry["payload"], entry.get("sparse", {}))
+
+        collection._open_files()
+        return collection
+
+    def _path(self, name: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{name}.{self.generation}.{extension}")
+
+    def _open_files(self):
+        """Map the vector file of the current generation and open its log for appending."""
+        vectors_path = self._path("vectors", "f32")
+        if not os.path.exists(vectors_path):
+            open(vectors_path, "wb").close()
+
+        row_bytes = self.vector_size * 4
+        capacity = os.path.getsize(vectors_path) // row_bytes
+        if capacity < max(self._count, 1):
+            capacity = max(self._count, _INITIAL_CAPACITY)
+            with open(vectors_path, "r+b") as f:
+                f.truncate(capacity * row_bytes)
+
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.vector_size))
+        self._live = np.zeros(capacity, dtype=bool)
+        self._live[list(self._rows.values())] = True
+        self._log = open(self._path("log", "jsonl"), "ab")
+
+    def _write_config(self):
+        """Atomically replace the collection's config, which names the current generation of files."""
+        config = {
+            "vector_size": self.vector_size,
+            "distance": self.distance.value,
+            "sparse_vectors": self.sparse_vectors,
+            "generation": self.generation,
+            "payload_schema": {name: schema.value for name, schema in self.payload_schema.items()},
+        }
+        path = os.path.join(self.directory, "config.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(config, f)
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+
+    @property
+    def points_count(self) -> int:
+        return len(self._rows)
+
+    def set_payload_schema(self, field_name: str, schema: models.PayloadSchemaType):
+        """Record a declared payload index. Every top-level payload key is indexed regardless."""
+        with self._lock:
+            self.payload_schema[field_name] = schema
+            if self.directory:
+                self._write_config()
+
+    def _reserve(self, rows: int):
+        """Grow the vector matrix, doubling its capacity, so that it holds at least ``rows`` rows."""
+        capacity = len(self._vectors)
+        if rows <= capacity:
+            return
+
+        capacity = max(capacity * 2, rows, _INITIAL_CAPACITY)
+        if self.directory:
+            self._vectors.flush()
+            with open(self._path("vectors", "f32"), "r+b") as f:
+                f.truncate(capacity * self.vector_size * 4)
+            self._vectors = np.memmap(self._path("vectors", "f32"), dtype=np.float32, mode="r+", shape=(capacity, self.vector_size))
+        else:
+            vectors = np.zeros((capacity, self.vector_size), dtype=np.float32)
+            vectors[: self._count] = self._vectors[: self._count]
+            self._vectors = vectors
+
+        self._live = np.concatenate((self._live, np.zeros(capacity - len(self._live), dtype=bool)))
+
+    def _assign(self, point_id: Any, row: int, payload: Dict[str, Any], sparse: _SparseVectors):
+        """Point an ID at a row with the given payload and sparse vectors, replacing what the ID held before."""
+        self._remove(point_id)
+
+        self._rows[point_id] = row
+        while len(self._row_ids) <= row:
+            self._row_ids.append(None)
+        self._row_ids[row] = point_id
+        self._payloads[row] = payload
+        self._count = max(self._count, row + 1)
+        if row < len(self._live):
+            self._live[row] = True
+
+        for key, value in payload.items():
+            for index_value in _index_values(value):
+                self._index.setdefault(key, {}).setdefault(index_value, set()).add(row)
+
+        self._sparse[row] = sparse
+        for name, (indices, values) in sparse.items():
+            postings = self._postings[name]
+            for term, value in zip(indices, values):
+                postings.setdefault(term, {})[row] = value
+
+    def _remove(self, point_id: Any):
+        """Forget an ID, its payload and its index entries. Its row stays allocated until compaction."""
+        row = self._rows.pop(point_id, None)
+        if row is None:
+            return
+
+        self._row_ids[row] = None
+        if row < len(self._live):
+            self._live[row] = False
+
+        for key, value in self._payloads.pop(row).items():
+            for index_value in _index_values(value):
+                rows = self._index[key][index_value]
+                rows.discard(row)
+                if not rows:
+                    del self._index[key][index_value]
+
+        for name, (indices, _) in self._sparse.pop(row).items():
+            postings = self._postings[name]
+            for term in indices:
+                del postings[term][row]
+                if not postings[term]:
+                    del postings[term]
+
+    def _split_vectors(self, point: models.PointStruct) -> Tuple[List[float], _SparseVectors]:
+        """Separate a point's dense vector from its named sparse vectors."""
+        if not isinstance(point.vector, dict):
+            return point.vector, {}
+
+        unknown = set(point.vector) - {""} - set(self.sparse_vectors)
+        if "" not in point.vector or unknown:
+            raise ValueError("Points need an unnamed dense vector and may only add the collection's sparse vectors")
+
+        sparse = {name: (vector.indices, vector.values) for name, vector in point.vector.items() if name}
+        return point.vector[""], sparse
+
+    def upsert(self, points: Sequence[models.PointStruct]):
+        """Insert or replace points. Vectors are normalized first when using cosine distance."""
+        if not points:
+            return
+
+        dense, sparse = zip(*(self._split_vectors(point) for point in points))
+        vectors = np.asarray(dense, dtype=np.float32)
+        if vectors.shape[1] != self.vector_size:
+            raise ValueError(f"Vector size {vectors.shape[1]} does not match the collection (expects {self.vector_size})")
+        if self.distance == Distance.COSINE:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            # New IDs take fresh rows at the end; existing IDs are overwritten in place
+            rows = []
+            next_row = self._count
+            for point in points:
+                row = self._rows.get(point.id)
+                if row is None:
+                    row = next_row
+                    next_row += 1
+                rows.append(row)
+
+            self._reserve(next_row)
+            self._vectors[rows] = vectors
+            for point, row, point_sparse in zip(points, rows, sparse):
+                self._assign(point.id, row, dict(point.payload or {}), point_sparse)
+
+            if self.directory:
+                # Vectors are flushed before the log names their rows, so the log never points at missing data
+                self._vectors.flush()
+                self._append_log(
+                    {"id": point.id, "row": row, "payload": point.payload or {}, "sparse": point_sparse} for point, row, point_sparse in zip(points, rows, sparse)
+                )
+
+    def delete(self, point_ids: Iterable[Any]):
+        """Delete points by ID, compacting the collection if deleted rows now dominate."""
+        with self._lock:
+            deleted = [point_id for point_id in point_ids if point_id in self._rows]
+            for point_id in deleted:
+                self._remove(point_id)
+
+            if self.directory and deleted:
+                self._append_log({"id": point_id, "row": None} for point_id in deleted)
+
+            dead = self._count - len(self._rows)
+            if dead > COMPACTION_MIN_DEAD_ROWS and dead > len(self._rows):
+                self._compact()
+
+    def _append_log(self, entries: Iterable[Dict[str, Any]]):
+        self._log.write(b"".join(json.dumps(entry).encode("utf-8") + b"\n" for entry in entries))
+        self._log.flush()
+
+    def _compact(self):
+        """Rewrite the live rows contiguously, into a new generation of files when persistent."""
+        live_rows = np.flatnonzero(self._live[: self._count])
+        vectors = np.array(self._vectors[live_rows])
+        entries = [(self._row_ids[row], self._payloads[row], self._sparse[row]) for row in live_rows.tolist()]
+
+        self._rows, self._row_ids, self._payloads, self._index, self._sparse = {}, [], {}, {}, {}
+        self._postings = {name: {} for name in self.sparse_vectors}
+        self._count = 0
+        self._live = np.zeros(0, dtype=bool)
+
+        if not self.directory:
+            self._vectors = np.zeros((0, self.vector_size), dtype=np.float32)
+        else:
+            old_generation = self.generation
+            self._log.close()
+            self.generation += 1
+            for path in (self._path("vectors", "f32"), self._path("log", "jsonl")):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._vectors = np.zeros((0, self.vector_size), dtype=np.float32)
+            self._open_files()
+
+        self._reserve(len(entries))
+        self._vectors[: len(entries)] = vectors
+        for row, (point_id, payload, sparse) in enumerate(entries):
+            self._assign(point_id, row, payload, sparse)
+
+        if self.directory:
+            self._vectors.flush()
+            self._append_log(
+                {"id": point_id, "row": row, "payload": payload, "sparse": sparse} for row, (point_id, payload, sparse) in enumerate(entries)
+            )
+            # Switching the config over is the commit point of the compaction
+            self._write_config()
+            for extension, name in (("f32", "vectors"), ("jsonl", "log")):
+                os.remove(os.path.join(self.directory, f"{name}.{old_generation}.{extension}"))
+
+    def _filter_rows(self, query_filter: models.Filter) -> np.ndarray:
+        """
+        Resolve a filter to the rows that match it using the inverted index. Call with the lock held.
+
+        Raises:
+            ValueError: If the filter uses conditions other than ``must`` exact matches
+        """
+        if query_filter.should or query_filter.must_not:
+            raise ValueError("The embedded vector index only supports 'must' filter conditions")
+
+        matched: Optional[Set[int]] = None
+        for condition in query_filter.must or []:
+            if not isinstance(condition, models.FieldCondition) or not isinstance(condition.match, models.MatchValue):
+                raise ValueError("The embedded vector index only supports exact-match field conditions")
+
+            (index_value,) = _index_values(condition.match.value)
+            rows = self._index.get(condition.key, {}).get(index_value, set())
+            matched = set(rows) if matched is None else matched & rows
+            if not matched:
+                break
+
+        if matched is None:
+            return np.flatnonzero(self._live[: self._count])
+        return np.fromiter(sorted(matched), dtype=np.int64)
+
+    def search(self, queries: np.ndarray, limit: int, query_filter: Optional[models.Filter] = None) -> List[List[_Hit]]:
+        """
+        Score a batch of queries against every live row, or only the rows matching a filter.
+
+        Args:
+            queries: Query matrix of shape (queries, vector_size)
+            limit: Number of results per query
+            query_filter: Optional filter on payload values
+
+        Returns:
+            For each query, (id, score, payload) tuples, best first
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.shape[1] != self.vector_size:
+            raise ValueError(f"Vector size {queries.shape[1]} does not match the collection (expects {self.vector_size})")
+        if self.distance == Distance.COSINE:
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            # Snapshot under the lock; the matrix multiplies below run without it. Compaction
+            # replaces these objects rather than mutating them, so the snapshot stays consistent.
+            vectors, row_ids, payloads = self._vectors, self._row_ids, self._payloads
+            count = self._count
+            live = self._live[:count].copy()
+            rows = self._filter_rows(query_filter) if query_filter is not None else None
+
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+
+        if rows is not None:
+            if len(rows):
+                best_scores, best_rows = _top_k(queries @ vectors[rows].T, rows, limit)
+        else:
+            for start in range(0, count, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, count)
+                scores = queries @ vectors[start:end].T
+                scores[:, ~live[start:end]] = -np.inf
+                block_scores, block_rows = _top_k(scores, np.arange(start, end), limit)
+                best_scores, best_rows = _top_k(np.hstack((best_scores, block_scores)), np.hstack((best_rows, block_rows)), limit)
+
+        results = []
+        with self._lock:
+            for query_scores, query_rows in zip(best_scores.tolist(), best_rows.tolist()):
+                hits = []
+                for score, row in zip(query_scores, query_rows):
+                    # Skip deleted rows, including rows deleted while the scores were computed
+                    payload = payloads.get(row) if score != -np.inf else None
+                    if payload is not None:
+                        hits.append((row_ids[row], score, dict(payload)))
+                results.append(hits)
+
+        return results
+
+    def get_vectors(self, point_ids: Sequence[Any]) -> List[Optional[List[float]]]:
+        """Return the stored (normalized, for cosine distance) vectors of points, None for unknown IDs."""
+        with self._lock:
+            rows = [self._rows.get(point_id) for point_id in point_ids]
+            found = [row for row in rows if row is not None]
+            vectors = iter(self._vectors[found].tolist())
+        return [next(vectors) if row is not None else None for row in rows]
+
+    def sparse_search(self, name: str, query: models.SparseVector, limit: int, query_filter: Optional[models.Filter] = None) -> List[_Hit]:
+        """
+        Score a sparse query against a named sparse vector, by dot product with the query's terms.
+
+        With the IDF modifier each term is weighted by ``ln((N - n + 0.5) / (n + 0.5) + 1)``,
+        where ``N`` is the number of points and ``n`` the number of points with the term,
+        which together with BM25 term weights stored at ingestion gives BM25 scores.
+        """
+        if name not in self.sparse_vectors:
+            raise ValueError(f"Sparse vector '{name}' is not configured for the collection")
+
+        with self._lock:
+            postings = self._postings[name]
+            points = len(self._rows)
+            scores = np.zeros(self._count, dtype=np.float32)
+
+            for term, query_value in zip(query.indices, query.values):
+                term_postings = postings.get(term)
+                if not term_postings:
+                    continue
+
+                weight = query_value
+                if self.sparse_vectors[name]:
+                    weight *= math.log((points - len(term_postings) + 0.5) / (len(term_postings) + 0.5) + 1)
+
+                rows = np.fromiter(term_postings.keys(), dtype=np.int64, count=len(term_postings))
+                values = np.fromiter(term_postings.values(), dtype=np.float32, count=len(term_postings))
+                scores[rows] += weight * values
+
+            # Only points sharing a term with the query match
+            rows = self._filter_rows(query_filter) if query_filter is not None else np.arange(self._count)
+            rows = rows[scores[rows] > 0]
+            best_scores, best_rows = _top_k(scores[rows][np.newaxis, :], rows, limit)
+
+            return [(self._row_ids[row], score, dict(self._payloads[row])) for score, row in zip(best_scores[0].tolist(), best_rows[0].tolist())]
+
+
+class EmbeddedVectorIndex:
+    """
+    In-process vector store implementing the subset of the QdrantClient API used by QdrantService.
+
+    Each collection is a contiguous float32 matrix, memory-mapped from ``path`` when one is
+    given, searched by batched matrix multiplication. Cosine collections store normalized
+    vectors so a search is a single dot product per row. Payload filters are resolved
+    through an inverted index on top-level payload keys. Named sparse vectors and
+    reciprocal rank fusion queries are supported for hybrid search. Collections are safe to use from
+    several threads; searches only hold a lock while taking a snapshot of the collection.
+    A persistent index belongs to one process at a time: its directory is locked until ``close``.
+    """
+
+    def __init__(self, path: str = ""):
+        """
+        Initialize the index.
+
+        Args:
+            path: Directory to persist collections in (empty keeps them in memory only)
+
+        Raises:
+            RuntimeError: If another process (or another index in this one) has the directory open
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._collections: Dict[str, _Collection] = {}
+        self._directory_lock = None
+
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._lock_directory()
+            for name in sorted(os.listdir(path)):
+                if os.path.exists(os.path.join(path, name, "config.json")):
+                    self._collections[name] = _Collection.load(os.path.join(path, name))
+
+    def _lock_directory(self):
+        """
+        Take an exclusive lock on the index directory.
+
+        Each process allocates rows and appends to the logs on its own, so two processes
+        writing the same collection would overwrite each other's rows.
+        """
+        if fcntl is None:
+            return
+
+        lock_file = open(os.path.join(self.path, ".lock"), "wb")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(
+                f"The embedded vector index at {self.path} is already open in another process. Run a single worker, "
+                "give each process its own QDRANT_EMBEDDED_PATH, or set QDRANT_URL to share a Qdrant server"
+            ) from None
+        self._directory_lock = lock_file
+
+    def _collection(self, collection_name: str) -> _Collection:
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            raise ValueError(f"Collection {collection_name} not found")
+        return collection
+
+    def get_collections(self) -> models.CollectionsResponse:
+        return models.CollectionsResponse(collections=[models.CollectionDescription(name=name) for name in list(self._collections)])
+
+    def get_collection(self, collection_name: str) -> models.CollectionInfo:
+        collection = self._collection(collection_name)
+        points = collection.points_count
+
+        return models.CollectionInfo(
+            status=models.CollectionStatus.GREEN,
+            optimizer_status=models.OptimizersStatusOneOf.OK,
+            vectors_count=points,
+            indexed_vectors_count=points,
+            points_count=points,
+            segments_count=1,
+            config=models.CollectionConfig(
+                params=models.CollectionParams(
+                    vectors=VectorParams(size=collection.vector_size, distance=collection.distance, on_disk=bool(self.path)),
+                    sparse_vectors={
+                        name: models.SparseVectorParams(modifier=models.Modifier.IDF if idf else None) for name, idf in collection.sparse_vectors.items()
+                    }
+                    or None,
+                ),
+                hnsw_config=models.HnswConfig(m=0, ef_construct=0, full_scan_threshold=0),
+                optimizer_config=models.OptimizersConfig(
+                    deleted_threshold=0.5, vacuum_min_vector_number=COMPACTION_MIN_DEAD_ROWS, default_segment_number=1, flush_interval_sec=0, max_optimization_threads=1
+                ),
+                wal_config=models.WalConfig(wal_capacity_mb=0, wal_segments_ahead=0),
+            ),
+            payload_schema={name: models.PayloadIndexInfo(data_type=schema, points=points) for name, schema in collection.payload_schema.items()},
+        )
+
+    def create_collection(
+        self, collection_name: str, vectors_config: VectorParams, sparse_vectors_config: Optional[Dict[str, models.SparseVectorParams]] = None, **kwargs: Any
+    ) -> bool:
+        """Create a collection. HNSW, quantization and on-disk options don't apply to an exact index and are ignored."""
+        if not isinstance(vectors_config, VectorParams):
+            raise ValueError("The embedded vector index only supports a single unnamed vector per point")
+
+        with self._lock:
+            if collection_name in self._collections:
+                raise ValueError(f"Collection {collection_name} already exists")
+
+            directory = os.path.join(self.path, collection_name) if self.path else None
+            sparse_vectors = {name: params.modifier == models.Modifier.IDF for name, params in (sparse_vectors_config or {}).items()}
+            self._collections[collection_name] = _Collection.create(directory, vectors_config.size, vectors_config.distance, sparse_vectors)
+
+        return True
+
+    def delete_collection(self, collection_name: str, **kwargs: Any) -> bool:
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+        if collection is None:
+            return False
+
+        collection.close()
+        if collection.directory:
+            shutil.rmtree(collection.directory)
+        return True
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema: models.PayloadSchemaType, **kwargs: Any) -> models.UpdateResult:
+        self._collection(collection_name).set_payload_schema(field_name, models.PayloadSchemaType(field_schema))
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def upsert(self, collection_name: str, points: Sequence[models.PointStruct], **kwargs: Any) -> models.UpdateResult:
+        self._collection(collection_name).upsert(points)
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def delete(self, collection_name: str, points_selector: models.PointIdsList, **kwargs: Any) -> models.UpdateResult:
+        if not isinstance(points_selector, models.PointIdsList):
+            raise ValueError("The embedded vector index only supports deleting points by ID")
+
+        self._collection(collection_name).delete(points_selector.points)
+        return models.UpdateResult(operation_id=0, status=models.UpdateStatus.COMPLETED)
+
+    def search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        limit: int = 10,
+        query_filter: Optional[models.Filter] = None,
+        with_vectors: bool = False,
+        **kwargs: Any,
+    ) -> List[models.ScoredPoint]:
+        """Exact nearest-neighbour search. Search parameters for approximate indexes are ignored."""
+        collection = self._collection(collection_name)
+        (hits,) = collection.search(np.asarray([query_vector], dtype=np.float32), limit, query_filter)
+
+        return self._scored_points(collection, hits, with_vectors)
+
+    def search_batch(self, collection_name: str, requests: Sequence[models.SearchRequest], **kwargs: Any) -> List[List[models.ScoredPoint]]:
+        """Run several searches, scoring all unfiltered requests with one matrix multiply per block of rows."""
+        collection = self._collection(collection_name)
+        results: List[List[models.ScoredPoint]] = [[] for _ in requests]
+
+        # Unfiltered requests share the scan of the whole matrix
+        unfiltered = [i for i, request in enumerate(requests) if request.filter is None]
+        if unfiltered:
+            limit = max(requests[i].limit + (requests[i].offset or 0) for i in unfiltered)
+            batch_hits = collection.search(np.asarray([requests[i].vector for i in unfiltered], dtype=np.float32), limit)
+            for i, hits in zip(unfiltered, batch_hits):
+                offset = requests[i].offset or 0
+                results[i] = self._scored_points(collection, hits[offset : offset + requests[i].limit], bool(requests[i].with_vector))
+
+        for i, request in enumerate(requests):
+            if request.filter is not None:
+                offset = request.offset or 0
+                (hits,) = collection.search(np.asarray([request.vector], dtype=np.float32), request.limit + offset, request.filter)
+                results[i] = self._scored_points(collection, hits[offset:], bool(request.with_vector))
+
+        return results
+
+    def query_points(
+        self,
+        collection_name: str,
+        query: Any = None,
+        using: Optional[str] = None,
+        prefetch: Optional[List[models.Prefetch]] = None,
+        query_filter: Optional[models.Filter] = None,
+        limit: int = 10,
+        offset: Optional[int] = None,
+        with_vectors: bool = False,
+        **kwargs: Any,
+    ) -> models.QueryResponse:
+        """
+        Run a query of the universal query API.
+
+        Supports dense and sparse nearest-neighbour queries, and reciprocal rank fusion of
+        prefetched queries.
+        """
+        offset = offset or 0
+        collection = self._collection(collection_name)
+        hits = self._query(collection, query, using, prefetch, query_filter, limit + offset)
+
+        return models.QueryResponse(points=self._scored_points(collection, hits[offset:], with_vectors))
+
+    def query_batch_points(self, collection_name: str, requests: Sequence[models.QueryRequest], **kwargs: Any) -> List[models.QueryResponse]:
+        return [
+            self.query_points(
+                collection_name,
+                query=request.query,
+                using=request.using,
+                prefetch=request.prefetch,
+                query_filter=request.filter,
+                limit=request.limit or 10,
+                offset=request.offset,
+                with_vectors=bool(request.with_vector),
+            )
+            for request in requests
+        ]
+
+    def _query(
+        self, collection: _Collection, query: Any, using: Optional[str], prefetch: Optional[List[models.Prefetch]], query_filter: Optional[models.Filter], limit: int
+    ) -> List[_Hit]:
+        if isinstance(query, models.FusionQuery):
+            if query.fusion != models.Fusion.RRF:
+                raise ValueError("The embedded vector index only supports reciprocal rank fusion")
+
+            prefetches = prefetch if isinstance(prefetch, list) else [prefetch] if prefetch else []
+            result_lists = []
+            for sub in prefetches:
+                # A query's filter also applies to its prefetches
+                sub_hits = self._query(collection, sub.query, sub.using, sub.prefetch, sub.filter or query_filter, sub.limit or 10)
+                result_lists.append([{"id": point_id, "score": score, "payload": payload} for point_id, score, payload in sub_hits])
+
+            return [(hit["id"], hit["score"], hit["payload"]) for hit in reciprocal_rank_fusion(result_lists, limit)]
+
+        if prefetch:
+            raise ValueError("The embedded vector index only supports prefetches with fusion queries")
+        if isinstance(query, models.SparseVector):
+            return collection.sparse_search(using, query, limit, query_filter)
+        if isinstance(query, list) and not using:
+            (hits,) = collection.search(np.asarray([query], dtype=np.float32), limit, query_filter)
+            return hits
+
+        raise ValueError("Unsupported query for the embedded vector index")
+
+    @staticmethod
+    def _scored_points(collection: _Collection, hits: List[_Hit], with_vectors: bool) -> List[models.ScoredPoint]:
+        vectors = collection.get_vectors([point_id for point_id, _, _ in hits]) if with_vectors else [None] * len(hits)
+        return [
+            models.ScoredPoint(id=point_id, version=0, score=score, payload=payload, vector=vector) for (point_id, score, payload), vector in zip(hits, vectors)
+        ]
+
+    def close(self, **kwargs: Any):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            if self._directory_lock is not None:
+                # Closing the file releases the lock
+                self._directory_lock.close()
+                self._directory_lock = None
@@ -0,0 +1,50 @@
+from typing import Any, Dict, List
+
+# Rank offset of reciprocal rank fusion; 60 is the value from the original paper
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], limit: int, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Merge ranked result lists by reciprocal rank fusion.
+
+    Each document scores the sum of ``1 / (k + rank)`` over the lists it appears in, so
+    documents ranked well by several lists rise to the top regardless of how the lists'
+    own scores are scaled.
+
+    Args:
+        result_lists: Ranked lists of search results, best first
+        limit: Maximum number of fused results
+        k: Rank offset damping the weight of the top ranks
+
+    Returns:
+        Fused results, each document once, with its fused score
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.setdefault(result["id"], {**result, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+
+    return sorted(fused.values(), key=lambda result: result["score"], reverse=True)[:limit]
+
+
+def max_score_fusion(result_lists: List[List[Dict[str, Any]]], limit: int) -> List[Dict[str, Any]]:
+    """
+    Merge result lists scored on the same scale, keeping each document's best score.
+
+    Args:
+        result_lists: Lists of search results
+        limit: Maximum number of fused results
+
+    Returns:
+        Fused results, each document once, best score first
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for results in result_lists:
+        for result in results:
+            best = fused.get(result["id"])
+            if best is None or result["score"] > best["score"]:
+                fused[result["id"]] = result
+
+    return sorted(fused.values(), key=lambda result: result["score"], reverse=True)[:limit]
@@ -0,0 +1,135 @@
+import asyncio
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+from app.models.vectordb import Document, IngestionProgress
+from app.services.llm.embedding_service import EmbeddingService
+from app.services.vectordb.qdrant_service import QdrantService
+
+# Batches buffered between pipeline stages. Together with the batch size this bounds
+# the memory used by an ingestion, whatever the size of the input.
+MAX_PENDING_BATCHES = 2
+
+# Queue items are a batch, a failure from an upstream stage, or None once a stage is done
+_ParsedItem = Union[List[Document], BaseException, None]
+_EmbeddedItem = Union[Tuple[List[Document], List[List[float]]], BaseException, None]
+
+
+class DocumentParseError(ValueError):
+    """Raised when a line of NDJSON input is not a valid document."""
+
+
+async def read_ndjson_documents(chunks: AsyncIterator[bytes]) -> AsyncIterator[Document]:
+    """
+    Parse newline-delimited JSON documents from a stream of byte chunks.
+
+    Only the current incomplete line is buffered, so memory does not grow with the input.
+    """
+    partial: List[bytes] = []
+    line_number = 0
+
+    async for chunk in chunks:
+        *lines, tail = chunk.split(b"\n")
+        if lines:
+            # The first complete line starts with whatever was left over from earlier chunks
+            lines[0] = b"".join(partial) + lines[0]
+            partial = []
+        partial.append(tail)
+
+        for line in lines:
+            line_number += 1
+            document = _parse_line(line, line_number)
+            if document is not None:
+                yield document
+
+    document = _parse_line(b"".join(partial), line_number + 1)
+    if document is not None:
+        yield document
+
+
+def _parse_line(line: bytes, line_number: int) -> Optional[Document]:
+    """Parse one NDJSON line, skipping blank lines."""
+    if not line.strip():
+        return None
+
+    try:
+        return Document.model_validate_json(line)
+    except ValueError as e:
+        raise DocumentParseError(f"Invalid document on line {line_number}: {str(e)}") from e
+
+
+async def ingest_documents(
+    documents: AsyncIterator[Document],
+    embedding_service: EmbeddingService,
+    vector_db: QdrantService,
+    embedding_model: str,
+    batch_size: int,
+) -> AsyncIterator[IngestionProgress]:
+    """
+    Embed and store a stream of documents in batches.
+
+    Parsing, embedding and upserting run as concurrent stages connected by bounded queues,
+    so a slow stage applies backpressure all the way back to reading the input. A progress
+    update is yielded after each batch is stored.
+
+    Args:
+        documents: Documents to ingest
+        embedding_service: Service used to embed each batch
+        vector_db: Vector database to store the batches in
+        embedding_model: Embedding model to use
+        batch_size: Number of documents per embedding and upsert request
+    """
+    parsed: "asyncio.Queue[_ParsedItem]" = asyncio.Queue(maxsize=MAX_PENDING_BATCHES)
+    embedded: "asyncio.Queue[_EmbeddedItem]" = asyncio.Queue(maxsize=MAX_PENDING_BATCHES)
+
+    async def batch_documents():
+        try:
+            batch: List[Document] = []
+            async for document in documents:
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    await parsed.put(batch)
+                    batch = []
+            if batch:
+                await parsed.put(batch)
+            await parsed.put(None)
+        except Exception as e:
+            await parsed.put(e)
+
+    async def embed_batches():
+        while True:
+            item = await parsed.get()
+            if item is None or isinstance(item, BaseException):
+                await embedded.put(item)
+                return
+            try:
+                response = await embedding_service.create_embeddings(texts=[doc.text for doc in item], model=embedding_model)
+            except Exception as e:
+                await embedded.put(e)
+                return
+            await embedded.put((item, response.embeddings))
+
+    stages = [asyncio.create_task(batch_documents()), asyncio.create_task(embed_batches())]
+    batch_number = 0
+    documents_processed = 0
+
+    try:
+        while True:
+            item = await embedded.get()
+            if item is None:
+                break
+            if isinstance(item, BaseException):
+                raise item
+
+            batch, embeddings = item
+            docs = [{"text": doc.text, "title": doc.title} for doc in batch]
+            metadata = [doc.metadata or {} for doc in batch]
+            document_ids = await vector_db.add_documents(documents=docs, embeddings=embeddings, metadata=metadata)
+
+            batch_number += 1
+            documents_processed += len(batch)
+            yield IngestionProgress(batch=batch_number, document_ids=document_ids, documents_processed=documents_processed)
+    finally:
+        # Stop reading and embedding if the consumer went away or a stage failed
+        for stage in stages:
+            stage.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
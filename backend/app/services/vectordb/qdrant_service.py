@@ -1,18 +1,114 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Callable, Optional, TypeVar, Union
+import asyncio
 import uuid
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache, partial
 
+import numpy as np
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
-from qdrant_client.http.models import Distance, VectorParams
+from qdrant_client.http.models import Distance, PayloadSchemaType, VectorParams
 
 from app.core.config import settings
+from app.core.metrics import observe_upstream
+from app.services.vectordb.embedded_index import EmbeddedVectorIndex
+from app.services.vectordb.sparse import SPARSE_VECTOR_NAME, document_sparse_vector, query_sparse_vector
+
+T = TypeVar("T")
+
+# Extra hits fetched when collapsing chunks, so enough distinct parent documents remain
+CHUNK_COLLAPSE_OVERSAMPLING = 4
+
+# Candidates fetched from each of the dense and sparse searches of a hybrid search, per result
+HYBRID_PREFETCH_OVERSAMPLING = 2
+
+
+@dataclass(frozen=True)
+class CollectionInfo:
+    """Vector configuration of a known collection."""
+
+    vector_size: int
+    distance: Distance
+    # Whether points carry a sparse lexical vector, enabling hybrid search
+    sparse: bool = False
+
+
+@dataclass(frozen=True)
+class CollectionTuning:
+    """Storage and index settings used when creating a collection, and at search time."""
+
+    quantization: str = settings.QDRANT_QUANTIZATION
+    quantization_always_ram: bool = settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+    quantization_rescore: bool = settings.QDRANT_QUANTIZATION_RESCORE
+    quantization_oversampling: float = settings.QDRANT_QUANTIZATION_OVERSAMPLING
+    hnsw_m: Optional[int] = settings.QDRANT_HNSW_M
+    hnsw_ef_construct: Optional[int] = settings.QDRANT_HNSW_EF_CONSTRUCT
+    hnsw_ef: Optional[int] = settings.QDRANT_HNSW_EF
+    on_disk_vectors: bool = settings.QDRANT_ON_DISK_VECTORS
+    on_disk_payload: bool = settings.QDRANT_ON_DISK_PAYLOAD
+    payload_indexes: Dict[str, str] = field(default_factory=lambda: dict(settings.QDRANT_PAYLOAD_INDEXES))
+    sparse_vectors: bool = settings.QDRANT_SPARSE_VECTORS
+
+    def __post_init__(self):
+        if self.quantization not in ("", "scalar", "binary"):
+            raise ValueError(f"Unsupported quantization: {self.quantization}")
+        for field_name, field_type in self.payload_indexes.items():
+            if field_type not in PayloadSchemaType._value2member_map_:
+                raise ValueError(f"Unsupported payload index type for '{field_name}': {field_type}")
+
+    def quantization_config(self) -> Optional[Union[models.ScalarQuantization, models.BinaryQuantization]]:
+        """Return the quantization to create a collection with, if any."""
+        if self.quantization == "scalar":
+            config = models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=self.quantization_always_ram)
+            return models.ScalarQuantization(scalar=config)
+        if self.quantization == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=self.quantization_always_ram))
+        return None
+
+    def hnsw_config(self) -> Optional[models.HnswConfigDiff]:
+        """Return the HNSW parameters to create a collection with, if any differ from the server defaults."""
+        if self.hnsw_m is None and self.hnsw_ef_construct is None:
+            return None
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def sparse_vectors_config(self) -> Optional[Dict[str, models.SparseVectorParams]]:
+        """Return the sparse vectors to create a collection with, if any."""
+        if not self.sparse_vectors:
+            return None
+        # The server applies inverse document frequency at query time, completing the BM25 weights stored at ingestion
+        return {SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)}
+
+    def search_params(self) -> Optional[models.SearchParams]:
+        """Return the search-time parameters, if any differ from the server defaults."""
+        quantization = None
+        if self.quantization:
+            quantization = models.QuantizationSearchParams(rescore=self.quantization_rescore, oversampling=self.quantization_oversampling)
+
+        if self.hnsw_ef is None and quantization is None:
+            return None
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
 
 
 class QdrantService:
-    """Service for interacting with Qdrant vector database."""
-
-    def __init__(self, url: str = settings.QDRANT_URL, api_key: str = settings.QDRANT_API_KEY, collection_name: str = settings.QDRANT_COLLECTION_NAME):
+    """
+    Service for interacting with Qdrant vector database.
+
+    The Qdrant client is synchronous, so every call is run on a bounded thread pool to
+    keep the event loop free while waiting on the network. Without a server URL, an
+    EmbeddedVectorIndex stands in for the client.
+    """
+
+    def __init__(
+        self,
+        url: str = settings.QDRANT_URL,
+        api_key: str = settings.QDRANT_API_KEY,
+        collection_name: str = settings.QDRANT_COLLECTION_NAME,
+        timeout: float = settings.QDRANT_TIMEOUT,
+        max_workers: int = settings.QDRANT_MAX_WORKERS,
+        tuning: Optional[CollectionTuning] = None,
+        embedded_path: str = settings.QDRANT_EMBEDDED_PATH,
+    ):
         """
         Initialize the Qdrant service.
 
@@ -20,14 +116,86 @@ class QdrantService:
             url: URL of the Qdrant server
             api_key: API key for Qdrant
             collection_name: Name of the collection to use
+            timeout: Seconds before a Qdrant call is abandoned
+            max_workers: Number of threads running blocking client calls
+            tuning: Collection storage and index settings (defaults to the application settings)
+            embedded_path: Directory of the embedded index used when no URL is given (empty for memory only)
         """
         if not url:
-            # Use local in-memory Qdrant instance if no URL provided
-            self.client = QdrantClient(":memory:")
+            # Use the embedded index if no URL provided
+            self.client: Union[QdrantClient, EmbeddedVectorIndex] = EmbeddedVectorIndex(path=embedded_path)
         else:
-            self.client = QdrantClient(url=url, api_key=api_key)
+            self.client = QdrantClient(url=url, api_key=api_key, timeout=timeout)
+        # Name of the dependency in upstream latency metrics
+        self._dependency = "qdrant" if url else "embedded_index"
 
         self.collection_name = collection_name
+        self.timeout = timeout
+        self.tuning = tuning or CollectionTuning()
+        self._search_params = self.tuning.search_params()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="qdrant")
+        # Collections known to exist, so the hot path can skip the existence check
+        self._collections: Dict[str, CollectionInfo] = {}
+        # Serialises checking for and creating each collection, so concurrent requests create it once
+        self._collection_locks: Dict[str, asyncio.Lock] = {}
+
+    async def _run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run a blocking client call on the thread pool.
+
+        Raises:
+            asyncio.TimeoutError: If the call does not finish within the configured timeout
+        """
+        loop = asyncio.get_running_loop()
+        with observe_upstream(self._dependency, getattr(func, "__name__", "call")):
+            return await asyncio.wait_for(loop.run_in_executor(self._executor, partial(func, *args, **kwargs)), timeout=self.timeout)
+
+    def close(self):
+        """Release the thread pool and the client's connections, once calls already running have finished."""
+        # Waiting keeps the embedded index from being closed under a write still in progress
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.client.close()
+
+    async def load_collections(self):
+        """Fill the collection registry from the server, typically once at startup."""
+        await self._run(self._load_collections)
+
+    def _load_collections(self):
+        """Record the vector configuration of every collection on the server."""
+        for collection in self.client.get_collections().collections:
+            info = self.client.get_collection(collection.name)
+            if collection.name == self.collection_name:
+                self._create_payload_indexes(info.payload_schema)
+            self._record_collection(collection.name, info.config.params.vectors, info.config.params.sparse_vectors)
+
+    def _record_collection(self, name: str, vectors_config: Any, sparse_vectors_config: Optional[Dict[str, Any]] = None):
+        """Add a collection to the registry if it uses a single unnamed dense vector."""
+        if isinstance(vectors_config, VectorParams):
+            sparse = SPARSE_VECTOR_NAME in (sparse_vectors_config or {})
+            self._collections[name] = CollectionInfo(vector_size=vectors_config.size, distance=vectors_config.distance, sparse=sparse)
+
+    def invalidate_collection(self, name: Optional[str] = None):
+        """Forget a collection so the next operation checks the server again."""
+        self._collections.pop(name or self.collection_name, None)
+
+    def _is_known_collection(self, vector_size: int) -> bool:
+        """
+        Check a vector size against the registry without any network I/O.
+
+        Returns:
+            True if the collection is known to exist with a matching vector size
+
+        Raises:
+            ValueError: If the collection is known to use a different vector size
+        """
+        info = self._collections.get(self.collection_name)
+        if info is None:
+            return False
+
+        if info.vector_size != vector_size:
+            raise ValueError(f"Vector size {vector_size} does not match collection '{self.collection_name}' (expects {info.vector_size})")
+
+        return True
 
     def ensure_collection_exists(self, vector_size: int = 1536):
         """
@@ -36,19 +204,82 @@ class QdrantService:
         Args:
             vector_size: Size of the embedding vectors
         """
+        if self._is_known_collection(vector_size):
+            return
+
         collections = self.client.get_collections().collections
         collection_names = [collection.name for collection in collections]
 
-        if self.collection_name not in collection_names:
-            self.client.create_collection(collection_name=self.collection_name, vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE))
+        if self.collection_name not in collection_names and self._create_collection(vector_size):
+            vectors_config = VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=self.tuning.on_disk_vectors or None)
+            sparse_vectors_config = self.tuning.sparse_vectors_config()
+            self._create_payload_indexes({})
+        else:
+            info = self.client.get_collection(self.collection_name)
+            vectors_config = info.config.params.vectors
+            sparse_vectors_config = info.config.params.sparse_vectors
+            self._create_payload_indexes(info.payload_schema)
+
+        self._record_collection(self.collection_name, vectors_config, sparse_vectors_config)
+        self._is_known_collection(vector_size)
 
-    async def add_documents(self, documents: List[Dict[str, Any]], embeddings: List[List[float]], metadata: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    def _create_collection(self, vector_size: int) -> bool:
+        """
+        Create the collection with the configured tuning.
+
+        Returns:
+            True if it was created, False if another process created it first
+        """
+        try:
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=self.tuning.on_disk_vectors or None),
+                sparse_vectors_config=self.tuning.sparse_vectors_config(),
+                on_disk_payload=self.tuning.on_disk_payload or None,
+                hnsw_config=self.tuning.hnsw_config(),
+                quantization_config=self.tuning.quantization_config(),
+            )
+        except Exception:
+            # The "already exists" error differs between server versions and the embedded index, so check instead
+            if self.collection_name not in [collection.name for collection in self.client.get_collections().collections]:
+                raise
+            return False
+        return True
+
+    def _create_payload_indexes(self, existing: Dict[str, Any]):
+        """Index every declared filterable metadata field that the collection does not index yet."""
+        for field_name, field_type in self.tuning.payload_indexes.items():
+            if field_name not in existing:
+                self.client.create_payload_index(collection_name=self.collection_name, field_name=field_name, field_schema=PayloadSchemaType(field_type))
+
+    async def _ensure_collection(self, vector_size: int) -> CollectionInfo:
+        """Ensure the collection exists, only going to the server if it is not in the registry."""
+        if not self._is_known_collection(vector_size):
+            lock = self._collection_locks.setdefault(self.collection_name, asyncio.Lock())
+            async with lock:
+                # Concurrent first requests wait here, and find the collection created by the first one
+                if not self._is_known_collection(vector_size):
+                    await self._run(self.ensure_collection_exists, vector_size)
+        return self._collections[self.collection_name]
+
+    async def _run_on_collection(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a client call against the collection, dropping it from the registry if the call fails."""
+        try:
+            return await self._run(func, *args, **kwargs)
+        except Exception:
+            # The collection may have been deleted or reconfigured behind our back
+            self.invalidate_collection()
+            raise
+
+    async def add_documents(
+        self, documents: List[Dict[str, Any]], embeddings: Union[np.ndarray, List[List[float]]], metadata: Optional[List[Dict[str, Any]]] = None
+    ) -> List[str]:
         """
         Add documents and their embeddings to the vector database.
 
         Args:
             documents: List of documents (can be any dictionary with text field)
-            embeddings: List of embedding vectors
+            embeddings: Embedding vectors, one per document (a float32 matrix or number lists)
             metadata: Optional metadata for each document
 
         Returns:
@@ -63,16 +294,30 @@ class QdrantService:
         ids = [str(uuid.uuid4()) for _ in documents]
 
         # Ensure collection exists
-        self.ensure_collection_exists(len(embeddings[0]))
+        collection = await self._ensure_collection(len(embeddings[0]))
+
+        # Add the lexical vector of each document alongside its embedding, if the collection has them
+        vectors: List[Any] = _vector_lists(embeddings)
+        if collection.sparse:
+            sparse_vectors = await asyncio.to_thread(lambda: [document_sparse_vector(_lexical_text(document)) for document in documents])
+            vectors = [{"": embedding, SPARSE_VECTOR_NAME: sparse_vector} for embedding, sparse_vector in zip(vectors, sparse_vectors)]
 
         # Add points to collection
-        points = [models.PointStruct(id=ids[i], vector=embeddings[i], payload={"document": documents[i], **metadata[i]}) for i in range(len(documents))]
+        points = [models.PointStruct(id=ids[i], vector=vectors[i], payload={"document": documents[i], **metadata[i]}) for i in range(len(documents))]
 
-        self.client.upsert(collection_name=self.collection_name, points=points)
+        await self._run_on_collection(self.client.upsert, collection_name=self.collection_name, points=points)
 
         return ids
 
-    async def search(self, query_embedding: List[float], limit: int = 10, filter_params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    async def search(
+        self,
+        query_embedding: Union[np.ndarray, List[float]],
+        limit: int = 10,
+        filter_params: Optional[Dict[str, Any]] = None,
+        collapse_chunks: bool = False,
+        query_text: Optional[str] = None,
+        with_vectors: bool = False,
+    ) -> List[Dict[str, Any]]:
         """
         Search for documents similar to the query embedding.
 
@@ -80,33 +325,175 @@ class QdrantService:
             query_embedding: Embedding vector of the query
             limit: Maximum number of results to return
             filter_params: Optional filter parameters
+            collapse_chunks: Keep only the best-scoring chunk of each parent document,
+                reported under the parent document's ID
+            query_text: Also match this text lexically (BM25) and fuse both rankings
+                by reciprocal rank fusion on the server
+            with_vectors: Include each result's stored dense vector under "vector"
 
         Returns:
-            List of matching documents with scores
+            List of matching documents with scores (fused rank scores for hybrid searches)
         """
+        query_embedding = _vector_lists(query_embedding)
+
         # Ensure collection exists
-        self.ensure_collection_exists(len(query_embedding))
+        collection = await self._ensure_collection(len(query_embedding))
 
-        # Create filter if provided
-        filter_condition = None
-        if filter_params:
-            filter_condition = models.Filter(
-                must=[models.FieldCondition(key=key, match=models.MatchValue(value=value)) for key, value in filter_params.items()]
+        # Perform search
+        search_limit = limit * CHUNK_COLLAPSE_OVERSAMPLING if collapse_chunks else limit
+        if query_text is not None:
+            request = self._hybrid_request(collection, query_embedding, query_text, search_limit, self._filter(filter_params))
+            response = await self._run_on_collection(
+                self.client.query_points,
+                collection_name=self.collection_name,
+                prefetch=request.prefetch,
+                query=request.query,
+                query_filter=request.filter,
+                limit=request.limit,
+                with_payload=True,
+                with_vectors=with_vectors,
             )
+            return self._format_results(response.points, limit, collapse_chunks)
+
+        search_result = await self._run_on_collection(
+            self.client.search,
+            collection_name=self.collection_name,
+            query_vector=query_embedding,
+            limit=search_limit,
+            query_filter=self._filter(filter_params),
+            search_params=self._search_params,
+            with_vectors=with_vectors,
+        )
+
+        return self._format_results(search_result, limit, collapse_chunks)
+
+    def _hybrid_request(
+        self, collection: CollectionInfo, query_embedding: List[float], query_text: str, limit: int, query_filter: Optional[models.Filter]
+    ) -> models.QueryRequest:
+        """Build a query fusing dense and sparse (lexical) candidates with reciprocal rank fusion."""
+        if not collection.sparse:
+            raise ValueError(f"Collection '{self.collection_name}' has no sparse vectors for hybrid search (enable QDRANT_SPARSE_VECTORS before creating it)")
+
+        prefetch_limit = limit * HYBRID_PREFETCH_OVERSAMPLING
+        return models.QueryRequest(
+            prefetch=[
+                models.Prefetch(query=query_embedding, filter=query_filter, params=self._search_params, limit=prefetch_limit),
+                models.Prefetch(query=query_sparse_vector(query_text), using=SPARSE_VECTOR_NAME, filter=query_filter, limit=prefetch_limit),
+            ],
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            filter=query_filter,
+            limit=limit,
+            with_payload=True,
+        )
+
+    async def search_batch(self, searches: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Run several searches in one request to the vector database.
 
-        # Perform search
-        search_result = self.client.search(collection_name=self.collection_name, query_vector=query_embedding, limit=limit, query_filter=filter_condition)
+        Args:
+            searches: Searches given as the keyword arguments of ``search`` (query_embedding, and
+                optionally limit, filter_params, collapse_chunks, query_text and with_vectors)
+
+        Returns:
+            The results of each search, in order
+        """
+        if not searches:
+            return []
+        searches = [{**search, "query_embedding": _vector_lists(search["query_embedding"])} for search in searches]
+
+        vector_sizes = {len(search["query_embedding"]) for search in searches}
+        if len(vector_sizes) > 1:
+            raise ValueError("All query embeddings in a batch must have the same size")
 
-        # Format results
+        # Ensure collection exists
+        collection = await self._ensure_collection(vector_sizes.pop())
+
+        if any(search.get("query_text") is not None for search in searches):
+            return await self._query_batch(collection, searches)
+
+        requests = []
+        for search in searches:
+            limit = search.get("limit", 10)
+            requests.append(
+                models.SearchRequest(
+                    vector=search["query_embedding"],
+                    filter=self._filter(search.get("filter_params")),
+                    params=self._search_params,
+                    limit=limit * CHUNK_COLLAPSE_OVERSAMPLING if search.get("collapse_chunks") else limit,
+                    with_payload=True,
+                    with_vector=search.get("with_vectors", False),
+                )
+            )
+
+        batch_result = await self._run_on_collection(self.client.search_batch, collection_name=self.collection_name, requests=requests)
+
+        return [
+            self._format_results(search_result, search.get("limit", 10), search.get("collapse_chunks", False))
+            for search, search_result in zip(searches, batch_result)
+        ]
+
+    async def _query_batch(self, collection: CollectionInfo, searches: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Run a batch that includes hybrid searches through the query API."""
+        requests = []
+        for search in searches:
+            limit = search.get("limit", 10)
+            search_limit = limit * CHUNK_COLLAPSE_OVERSAMPLING if search.get("collapse_chunks") else limit
+            query_filter = self._filter(search.get("filter_params"))
+
+            if search.get("query_text") is not None:
+                request = self._hybrid_request(collection, search["query_embedding"], search["query_text"], search_limit, query_filter)
+            else:
+                request = models.QueryRequest(query=search["query_embedding"], filter=query_filter, params=self._search_params, limit=search_limit, with_payload=True)
+            request.with_vector = search.get("with_vectors", False)
+            requests.append(request)
+
+        responses = await self._run_on_collection(self.client.query_batch_points, collection_name=self.collection_name, requests=requests)
+
+        return [
+            self._format_results(response.points, search.get("limit", 10), search.get("collapse_chunks", False))
+            for search, response in zip(searches, responses)
+        ]
+
+    @staticmethod
+    def _filter(filter_params: Optional[Dict[str, Any]]) -> Optional[models.Filter]:
+        """Build an exact-match filter on metadata fields, if any are given."""
+        if not filter_params:
+            return None
+        return models.Filter(must=[models.FieldCondition(key=key, match=models.MatchValue(value=value)) for key, value in filter_params.items()])
+
+    def _format_results(self, search_result: List[models.ScoredPoint], limit: int, collapse_chunks: bool) -> List[Dict[str, Any]]:
+        """Turn scored points into result dictionaries, collapsing chunks if requested."""
         results = []
         for scored_point in search_result:
-            payload = scored_point.payload
+            # Copy, as the same payload object can be returned for several searches of a batch
+            payload = dict(scored_point.payload or {})
             document = payload.pop("document") if "document" in payload else {}
 
-            results.append({"id": scored_point.id, "score": scored_point.score, "document": document, "metadata": payload})
+            result = {"id": scored_point.id, "score": scored_point.score, "document": document, "metadata": payload}
+            if scored_point.vector is not None:
+                # Collections with sparse vectors return every vector by name; the dense one is unnamed
+                result["vector"] = scored_point.vector.get("") if isinstance(scored_point.vector, dict) else scored_point.vector
+            results.append(result)
+
+        if collapse_chunks:
+            results = self._collapse_chunks(results)[:limit]
 
         return results
 
+    @staticmethod
+    def _collapse_chunks(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep the first (best-scoring) hit per parent document. Unchunked documents are their own parent."""
+        collapsed = []
+        seen_parents = set()
+
+        for result in results:
+            parent_id = result["metadata"].get("parent_id", result["id"])
+            if parent_id not in seen_parents:
+                seen_parents.add(parent_id)
+                collapsed.append({**result, "id": parent_id})
+
+        return collapsed
+
     async def delete(self, ids: Union[str, List[str]]) -> bool:
         """
         Delete documents from the vector database.
@@ -121,12 +508,22 @@ class QdrantService:
             ids = [ids]
 
         try:
-            self.client.delete(collection_name=self.collection_name, points_selector=models.PointIdsList(points=ids))
+            await self._run_on_collection(self.client.delete, collection_name=self.collection_name, points_selector=models.PointIdsList(points=ids))
             return True
         except Exception:
             return False
 
 
+def _lexical_text(document: Dict[str, Any]) -> str:
+    """Return the text of a document that is indexed for lexical matching."""
+    return "\n".join(str(document[key]) for key in ("title", "text") if document.get(key))
+
+
+def _vector_lists(vectors: Union[np.ndarray, List[Any]]) -> List[Any]:
+    """Return vectors as number lists, as Qdrant's point and query models hold them (embeddings arrive as float32 arrays)."""
+    return vectors.tolist() if isinstance(vectors, np.ndarray) else vectors
+
+
 @lru_cache()
 def get_vector_db_service() -> QdrantService:
     """Dependency to get a Vector DB service."""
@@ -0,0 +1,83 @@
+from typing import Tuple
+
+import numpy as np
+from qdrant_client.http import models
+
+from app.services.vectordb.characters import CJK, DIGIT, LETTER, character_classes
+
+# Name of the sparse vector holding a point's lexical terms
+SPARSE_VECTOR_NAME = "text"
+
+# BM25 term frequency saturation and length normalization. Inverse document frequency is
+# applied by the vector database at query time (the IDF modifier), so it stays correct as
+# the collection grows without re-encoding stored documents.
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Document length, in terms, that length normalization is relative to
+BM25_AVG_DOC_LENGTH = 256
+
+# Multiplier of the polynomial term hash; odd, so it has an inverse modulo 2**32
+_HASH_MULTIPLIER = 0x01000193
+_HASH_INVERSE = pow(_HASH_MULTIPLIER, -1, 2**32)
+
+
+def term_hashes(text: str) -> np.ndarray:
+    """
+    Split text into lowercase lexical terms and return a stable 32-bit hash of each.
+
+    A term is a run of letters and digits, so identifiers like "E1234" or "v2" stay whole,
+    or a single CJK character. Hashes are polynomial over the term's code points and are
+    computed for all terms at once with array operations, with no per-term Python code.
+
+    Returns:
+        Array of uint32 term hashes, in text order
+    """
+    hashes, _ = hash_terms(np.frombuffer(text.lower().encode("utf-32-le"), dtype=np.uint32))
+    return hashes
+
+
+def hash_terms(code_points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hash the terms of already lowercased text given as code points, as in ``term_hashes``.
+
+    Returns:
+        Tuple of the uint32 term hashes and the code point offset where each term starts, in text order
+    """
+    if not len(code_points):
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int64)
+
+    classes = character_classes(code_points)
+
+    word = (classes == LETTER) | (classes == DIGIT)
+    single = classes == CJK
+    starts = np.flatnonzero(single | (word & ~np.concatenate(([False], word[:-1]))))
+    if not len(starts):
+        return np.empty(0, dtype=np.uint32), starts
+
+    # uint32 arithmetic wraps around, giving hashes modulo 2**32 for free
+    powers = np.cumprod(np.full(len(code_points), _HASH_MULTIPLIER, dtype=np.uint32), dtype=np.uint32)
+    inverse_powers = np.cumprod(np.full(len(code_points), _HASH_INVERSE, dtype=np.uint32), dtype=np.uint32)
+
+    # Characters outside terms add nothing, so each segment between two term starts sums to its term alone
+    weighted = np.where(word | single, code_points * powers, np.uint32(0)).astype(np.uint32)
+    sums = np.add.reduceat(weighted, starts, dtype=np.uint32)
+
+    # Divide out each term's offset, so equal terms hash equally wherever they occur
+    return sums * inverse_powers[starts], starts
+
+
+def document_sparse_vector(text: str) -> models.SparseVector:
+    """Return the BM25 term-frequency weights of a document, as a sparse vector over term hashes."""
+    hashes = term_hashes(text)
+    terms, counts = np.unique(hashes, return_counts=True)
+
+    length_norm = 1 - BM25_B + BM25_B * len(hashes) / BM25_AVG_DOC_LENGTH
+    weights = counts * (BM25_K1 + 1) / (counts + BM25_K1 * length_norm)
+
+    return models.SparseVector(indices=terms.tolist(), values=weights.tolist())
+
+
+def query_sparse_vector(text: str) -> models.SparseVector:
+    """Return the sparse vector of a query: each distinct term once, with unit weight."""
+    terms = np.unique(term_hashes(text))
+    return models.SparseVector(indices=terms.tolist(), values=[1.0] * len(terms))
@@ -0,0 +1,362 @@
+"""
+Incremental sync of a Supabase Storage bucket into the vector database.
+
+Usage (from the backend directory):
+    python -m app.services.vectordb.storage_sync --bucket documents [--prefix reports] [--provider openai] [--model text-embedding-ada-002]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.services.llm.embedding_service import EmbeddingService, default_embedding_model, get_embedding_service
+from app.services.supabase.storage import StorageObject, SupabaseStorageService
+from app.services.vectordb.chunking import TokenChunker
+from app.services.vectordb.qdrant_service import QdrantService, get_vector_db_service
+
+logger = logging.getLogger(__name__)
+
+# Vector IDs deleted per request when files are removed
+_DELETE_BATCH = 1000
+
+
+@dataclass
+class ManifestEntry:
+    """What the manifest knows about a synced file."""
+
+    path: str
+    etag: str
+    # SHA-256 of the content, so a file whose entity tag changed but whose content didn't is not re-embedded
+    content_hash: str
+    point_ids: List[str] = field(default_factory=list)
+    # Vectors of earlier versions that are still to be deleted
+    stale_ids: List[str] = field(default_factory=list)
+
+
+class SyncManifest:
+    """
+    Local SQLite record of the files synced from each bucket into each collection.
+
+    Entries are only written once a file's vectors are stored, so a sync that fails part
+    way leaves the remaining files to be picked up by the next one. The vectors a new version
+    replaces are recorded as stale until they are deleted, so none are lost track of.
+    """
+
+    def __init__(self, path: str = settings.STORAGE_SYNC_MANIFEST_PATH):
+        """
+        Open the manifest.
+
+        Args:
+            path: Path of the SQLite file (":memory:" for a manifest that is not kept)
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "collection TEXT NOT NULL, bucket TEXT NOT NULL, path TEXT NOT NULL, "
+            "etag TEXT NOT NULL, content_hash TEXT NOT NULL, point_ids TEXT NOT NULL, "
+            "PRIMARY KEY (collection, bucket, path))"
+        )
+        # Manifests written before stale vectors were tracked lack the column
+        if "stale_ids" not in [row[1] for row in self._db.execute("PRAGMA table_info(files)")]:
+            self._db.execute("ALTER TABLE files ADD COLUMN stale_ids TEXT NOT NULL DEFAULT '[]'")
+
+    def entries(self, collection: str, bucket: str, prefix: str = "") -> Dict[str, ManifestEntry]:
+        """Return the entries of the files synced from a bucket, optionally only those under a directory."""
+        prefix = prefix.strip("/")
+        rows = self._db.execute(
+            "SELECT path, etag, content_hash, point_ids, stale_ids FROM files "
+            "WHERE collection = ? AND bucket = ? AND (? = '' OR path = ? OR substr(path, 1, ?) = ?)",
+            (collection, bucket, prefix, prefix, len(prefix) + 1, prefix + "/"),
+        ).fetchall()
+        return {
+            path: ManifestEntry(path=path, etag=etag, content_hash=content_hash, point_ids=json.loads(point_ids), stale_ids=json.loads(stale_ids))
+            for path, etag, content_hash, point_ids, stale_ids in rows
+        }
+
+    def put(self, collection: str, bucket: str, entry: ManifestEntry) -> None:
+        """Record a synced file."""
+        self._db.execute(
+            "INSERT OR REPLACE INTO files (collection, bucket, path, etag, content_hash, point_ids, stale_ids) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (collection, bucket, entry.path, entry.etag, entry.content_hash, json.dumps(entry.point_ids), json.dumps(entry.stale_ids)),
+        )
+
+    def remove(self, collection: str, bucket: str, paths: List[str]) -> None:
+        """Forget removed files."""
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany("DELETE FROM files WHERE collection = ? AND bucket = ? AND path = ?", [(collection, bucket, path) for path in paths])
+
+    def close(self) -> None:
+        self._db.close()
+
+
+@dataclass
+class SyncStats:
+    """Counts of what a sync found and did."""
+
+    listed: int = 0
+    unchanged: int = 0
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    # Files that are not UTF-8 text, or larger than the size limit
+    skipped: int = 0
+    # Files that could not be synced; they are retried by the next sync
+    failed: int = 0
+    chunks_embedded: int = 0
+
+
+class StorageSync:
+    """
+    Keep the vectors of a bucket's files in step with the bucket, re-embedding only what changed.
+
+    A sync walks the bucket with paginated listings and compares each file's entity tag with
+    the manifest. New and changed files are downloaded, chunked, embedded and stored by a
+    bounded pool of workers, and the vectors of their previous version are then deleted;
+    if that fails, the next sync retries it. Files in the manifest that are no longer listed
+    have their vectors deleted. The work done is proportional to the number of changed
+    files; unchanged files cost a listing entry.
+
+    Each file is stored as chunks linked by a ``parent_id`` derived from its bucket and path,
+    with ``source``, ``bucket`` and ``path`` metadata.
+    """
+
+    def __init__(
+        self,
+        storage: SupabaseStorageService,
+        vector_db: QdrantService,
+        embedding_service: EmbeddingService,
+        manifest: SyncManifest,
+        embedding_model: str = "text-embedding-ada-002",
+        chunker: Optional[TokenChunker] = None,
+        concurrency: int = settings.STORAGE_SYNC_CONCURRENCY,
+        page_size: int = settings.STORAGE_SYNC_PAGE_SIZE,
+        max_file_bytes: int = settings.STORAGE_SYNC_MAX_FILE_BYTES,
+    ):
+        """
+        Initialize the sync.
+
+        Args:
+            storage: Storage service of the bucket to sync
+            vector_db: Vector database to store the chunks in
+            embedding_service: Service used to embed the chunks
+            manifest: Record of the files already synced
+            embedding_model: Embedding model to use
+            chunker: Splits files into chunks (default: the configured chunk size and overlap)
+            concurrency: Number of files processed at a time
+            page_size: Entries requested per listing call
+            max_file_bytes: Larger files are skipped
+        """
+        self.storage = storage
+        self.vector_db = vector_db
+        self.embedding_service = embedding_service
+        self.manifest = manifest
+        self.embedding_model = embedding_model
+        self.chunker = chunker or TokenChunker(chunk_size=settings.STORAGE_SYNC_CHUNK_SIZE, chunk_overlap=settings.STORAGE_SYNC_CHUNK_OVERLAP)
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.max_file_bytes = max_file_bytes
+
+    async def run(self, prefix: str = "") -> SyncStats:
+        """
+        Sync the bucket, or only the files under a directory.
+
+        Removed files are only detected once the whole listing was read; if listing fails,
+        the error is raised and no vectors are deleted.
+        """
+        stats = SyncStats()
+        collection = self.vector_db.collection_name
+        bucket = self.storage.bucket_name
+        known = await asyncio.to_thread(self.manifest.entries, collection, bucket, prefix)
+        for entry in known.values():
+            if entry.stale_ids:
+                await self._delete_stale(entry)
+        seen: Set[str] = set()
+        pending: "asyncio.Queue[Optional[StorageObject]]" = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def work():
+            while True:
+                item = await pending.get()
+                if item is None:
+                    return
+                await self._sync_file(item, known.get(item.path), stats)
+
+        workers = [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        try:
+            pages = self.storage.iter_file_pages(prefix, self.page_size)
+            while True:
+                page = await asyncio.to_thread(next, pages, None)
+                if page is None:
+                    break
+                for item in page:
+                    stats.listed += 1
+                    seen.add(item.path)
+                    entry = known.get(item.path)
+                    if entry is not None and item.etag and entry.etag == item.etag:
+                        stats.unchanged += 1
+                    else:
+                        await pending.put(item)
+
+            for _ in workers:
+                await pending.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        await self._remove([known[path] for path in known.keys() - seen], stats)
+        return stats
+
+    async def _sync_file(self, item: StorageObject, entry: Optional[ManifestEntry], stats: SyncStats) -> None:
+        """Store the chunks of a new or changed file, then delete the vectors of its previous version."""
+        collection = self.vector_db.collection_name
+        bucket = self.storage.bucket_name
+        try:
+            if item.size > self.max_file_bytes:
+                stats.skipped += 1
+                logger.warning(f"Skipping {bucket}/{item.path}: {item.size} bytes is over the {self.max_file_bytes} byte limit")
+                return
+
+            content = await asyncio.to_thread(self.storage.download_file, item.path)
+            content_hash = hashlib.sha256(content).hexdigest()
+
+            if entry is not None and entry.content_hash == content_hash:
+                # Same content under a new entity tag; remember the tag so the file isn't downloaded again
+                stats.unchanged += 1
+                retagged = ManifestEntry(item.path, item.etag, content_hash, entry.point_ids, entry.stale_ids)
+                await asyncio.to_thread(self.manifest.put, collection, bucket, retagged)
+                return
+
+            try:
+                text = content.decode("utf-8")
+            except UnicodeDecodeError:
+                text = None
+                stats.skipped += 1
+                logger.info(f"Skipping {bucket}/{item.path}: not UTF-8 text")
+
+            point_ids = await self._store(item, text) if text is not None else []
+            if text is not None:
+                stats.chunks_embedded += len(point_ids)
+                if entry is None:
+                    stats.added += 1
+                else:
+                    stats.updated += 1
+
+            # Record the new vectors before deleting the old ones, so neither is lost track of if the deletion fails
+            stale_ids = entry.point_ids + entry.stale_ids if entry is not None else []
+            new_entry = ManifestEntry(item.path, item.etag, content_hash, point_ids, stale_ids)
+            await asyncio.to_thread(self.manifest.put, collection, bucket, new_entry)
+
+            if stale_ids and not await self._delete_stale(new_entry):
+                raise RuntimeError("could not delete the vectors of the previous version; the next sync retries")
+        except Exception as e:
+            stats.failed += 1
+            logger.error(f"Failed to sync {bucket}/{item.path}: {str(e)}")
+
+    async def _delete_stale(self, entry: ManifestEntry) -> bool:
+        """Delete the vectors of a file's earlier versions, and forget them once they are gone."""
+        if not await self.vector_db.delete(entry.stale_ids):
+            logger.warning(f"Could not delete {len(entry.stale_ids)} stale vectors of {self.storage.bucket_name}/{entry.path}")
+            return False
+
+        entry.stale_ids = []
+        await asyncio.to_thread(self.manifest.put, self.vector_db.collection_name, self.storage.bucket_name, entry)
+        return True
+
+    async def _store(self, item: StorageObject, text: str) -> List[str]:
+        """Chunk, embed and store a file's text, returning the IDs of its chunks."""
+        # Chunking is CPU-bound, so keep it off the event loop
+        chunks = await asyncio.to_thread(self.chunker.chunk, text)
+        if not chunks:
+            return []
+
+        bucket = self.storage.bucket_name
+        title = item.path.rsplit("/", 1)[-1]
+        parent_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"supabase-storage://{bucket}/{item.path}"))
+        docs = [{"text": chunk.text, "title": title} for chunk in chunks]
+        metadata = [
+            {
+                "source": "supabase_storage",
+                "bucket": bucket,
+                "path": item.path,
+                "parent_id": parent_id,
+                "chunk_index": chunk.index,
+                "chunk_start": chunk.start,
+                "chunk_end": chunk.end,
+            }
+            for chunk in chunks
+        ]
+
+        response = await self.embedding_service.create_embeddings(texts=[chunk.text for chunk in chunks], model=self.embedding_model)
+        return await self.vector_db.add_documents(documents=docs, embeddings=response.embeddings, metadata=metadata)
+
+    async def _remove(self, entries: List[ManifestEntry], stats: SyncStats) -> None:
+        """Delete the vectors of removed files, and forget the files whose vectors are gone."""
+        batch: List[ManifestEntry] = []
+        for entry in entries:
+            batch.append(entry)
+            if sum(len(e.point_ids) + len(e.stale_ids) for e in batch) >= _DELETE_BATCH:
+                await self._remove_batch(batch, stats)
+                batch = []
+        if batch:
+            await self._remove_batch(batch, stats)
+
+    async def _remove_batch(self, batch: List[ManifestEntry], stats: SyncStats) -> None:
+        bucket = self.storage.bucket_name
+        point_ids = [point_id for entry in batch for point_id in entry.point_ids + entry.stale_ids]
+        if point_ids and not await self.vector_db.delete(point_ids):
+            stats.failed += len(batch)
+            logger.error(f"Failed to delete the vectors of {len(batch)} removed files from {bucket}")
+            return
+
+        await asyncio.to_thread(self.manifest.remove, self.vector_db.collection_name, bucket, [entry.path for entry in batch])
+        stats.removed += len(batch)
+
+
+async def sync_bucket(
+    bucket: str, prefix: str = "", provider: str = "openai", embedding_model: Optional[str] = None, manifest_path: Optional[str] = None
+) -> SyncStats:
+    """Sync a bucket into the configured vector database, using the configured services."""
+    manifest = SyncManifest(manifest_path or settings.STORAGE_SYNC_MANIFEST_PATH)
+    try:
+        sync = StorageSync(
+            # A mistyped bucket name should fail the listing, not create and sync an empty bucket
+            storage=SupabaseStorageService(bucket_name=bucket, create_bucket=False),
+            vector_db=get_vector_db_service(),
+            embedding_service=get_embedding_service(provider),
+            manifest=manifest,
+            embedding_model=embedding_model or default_embedding_model(provider),
+        )
+        return await sync.run(prefix)
+    finally:
+        manifest.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bucket", required=True)
+    parser.add_argument("--prefix", default="", help="only sync files under this directory")
+    parser.add_argument("--provider", default="openai", choices=["openai", "local"])
+    parser.add_argument("--model", help="embedding model (default: the provider's default model)")
+    parser.add_argument("--manifest", help=f"manifest file (default: {settings.STORAGE_SYNC_MANIFEST_PATH})")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    stats = asyncio.run(sync_bucket(args.bucket, args.prefix, args.provider, args.model, args.manifest))
+    print(json.dumps(asdict(stats)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: search throughput of the embedded vector index against Qdrant's in-memory engine.
+
+Both stores hold the same random vectors; each runs the same single queries, then the
+embedded index also runs them as one batch. Filtered searches select one value of a
+payload field with the given number of distinct values.
+
+Usage (from the backend directory):
+    python -m benchmarks.embedded_index_search [--points 100000] [--dim 384] [--queries 200] [--filter-values 10]
+"""
+
+import argparse
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from app.services.vectordb.embedded_index import EmbeddedVectorIndex
+
+
+def _timed(label: str, queries: int, func) -> None:
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<36} {queries / elapsed:>10,.0f} queries/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--filter-values", type=int, default=10)
+    parser.add_argument("--skip-qdrant", action="store_true", help="Only benchmark the embedded index")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.points, args.dim)).astype(np.float32)
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32).tolist()
+    vectors_config = models.VectorParams(size=args.dim, distance=models.Distance.COSINE)
+    group_filter = models.Filter(must=[models.FieldCondition(key="group", match=models.MatchValue(value=0))])
+
+    def points(start: int, end: int):
+        return [models.PointStruct(id=str(uuid.uuid4()), vector=vectors[i].tolist(), payload={"group": i % args.filter_values}) for i in range(start, end)]
+
+    directory = tempfile.TemporaryDirectory(prefix="embedded-index-")
+    stores = {"embedded": EmbeddedVectorIndex(path=directory.name)}
+    if not args.skip_qdrant:
+        stores["qdrant :memory:"] = QdrantClient(":memory:")
+
+    print(f"points: {args.points} x {args.dim}, top 10")
+    for name, store in stores.items():
+        store.create_collection(collection_name="benchmark", vectors_config=vectors_config)
+        started = time.perf_counter()
+        for start in range(0, args.points, 1000):
+            store.upsert(collection_name="benchmark", points=points(start, min(start + 1000, args.points)))
+        print(f"{name + ' upsert':<36} {args.points / (time.perf_counter() - started):>10,.0f} points/s")
+
+    for name, store in stores.items():
+        _timed(f"{name} search", args.queries, lambda: [store.search(collection_name="benchmark", query_vector=query, limit=10) for query in queries])
+        _timed(
+            f"{name} filtered search",
+            args.queries,
+            lambda: [store.search(collection_name="benchmark", query_vector=query, limit=10, query_filter=group_filter) for query in queries],
+        )
+
+    requests = [models.SearchRequest(vector=query, limit=10) for query in queries]
+    _timed("embedded search_batch", args.queries, lambda: stores["embedded"].search_batch(collection_name="benchmark", requests=requests))
+
+    stores["embedded"].close()
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
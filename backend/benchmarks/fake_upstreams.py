@@ -0,0 +1,289 @@
+"""
+Local stand-ins for the backend's upstream services, for offline benchmarks.
+
+One server answers, under separate path prefixes:
+  /auth/v1/...      Supabase Auth: the user behind an access token, and token exchange
+  /openai/v1/...    OpenAI: chat completions (streamed or not) and embeddings
+  /anthropic/v1/... Anthropic: messages (streamed or not)
+  /storage/v1/...   Supabase Storage: buckets, uploads (single request and resumable), discarding the content
+
+Each call waits for a configurable latency before answering, and streams send their tokens
+at a configurable interval, so the backend sees roughly the timing of the real services.
+Embeddings are derived from a hash of the text, so the same text always gets the same vector.
+Point the backend at it with SUPABASE_URL=<url>, OPENAI_BASE_URL=<url>/openai/v1 and
+ANTHROPIC_BASE_URL=<url>/anthropic (see benchmarks.load_test, which does this).
+
+Usage (from the backend directory):
+    python -m benchmarks.fake_upstreams [--port 9100] [--auth-latency-ms 5] [--llm-latency-ms 200] [--embedding-latency-ms 50]
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+
+@dataclass
+class FakeUpstreamConfig:
+    """Timing and shape of the fake responses."""
+
+    # Seconds before each response starts
+    auth_latency: float = 0.005
+    llm_latency: float = 0.2
+    embedding_latency: float = 0.05
+    # Seconds between streamed tokens, and the number of tokens in each completion
+    token_interval: float = 0.005
+    completion_tokens: int = 20
+    # Length of the embedding vectors (1536 matches text-embedding-ada-002)
+    embedding_dimensions: int = 1536
+
+
+def _embedding(text: str, dimensions: int) -> np.ndarray:
+    """Return a deterministic unit-length vector for a text."""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text.split()))
+
+
+def _sse(data: Dict, event: str = "") -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def create_app(config: FakeUpstreamConfig) -> Starlette:
+    """Create the fake upstream server application."""
+
+    async def auth_user(request: Request) -> Response:
+        await asyncio.sleep(config.auth_latency)
+        token = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if not token:
+            return JSONResponse({"code": 401, "msg": "Missing token"}, status_code=401)
+        # Every token is valid; the token names the user, so load tests can simulate many users
+        return JSONResponse(
+            {
+                "id": str(uuid.uuid5(uuid.NAMESPACE_URL, token)),
+                "aud": "authenticated",
+                "role": "authenticated",
+                "email": f"{token}@example.com",
+                "app_metadata": {"provider": "email"},
+                "user_metadata": {"full_name": token},
+                "created_at": "2024-01-01T00:00:00Z",
+            }
+        )
+
+    async def auth_token(request: Request) -> Response:
+        await asyncio.sleep(config.auth_latency)
+        now = int(time.time())
+        return JSONResponse(
+            {
+                "access_token": uuid.uuid4().hex,
+                "token_type": "bearer",
+                "expires_in": 3600,
+                "expires_at": now + 3600,
+                "refresh_token": uuid.uuid4().hex,
+                "user": {"id": str(uuid.uuid4()), "aud": "authenticated", "app_metadata": {}, "user_metadata": {}, "created_at": "2024-01-01T00:00:00Z"},
+            }
+        )
+
+    async def openai_chat(request: Request) -> Response:
+        body = await request.json()
+        model = body.get("model", "gpt-3.5-turbo")
+        prompt_tokens = sum(_tokens(str(message.get("content", ""))) for message in body.get("messages", []))
+        completion_tokens = min(config.completion_tokens, body.get("max_tokens") or config.completion_tokens)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        await asyncio.sleep(config.llm_latency)
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": " ".join(["token"] * completion_tokens)}
+            return JSONResponse(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                    "usage": usage,
+                }
+            )
+
+        async def events() -> AsyncIterator[str]:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model}
+            for _ in range(completion_tokens):
+                yield _sse({**chunk, "choices": [{"index": 0, "delta": {"content": "token "}, "finish_reason": None}]})
+                await asyncio.sleep(config.token_interval)
+            yield _sse({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield _sse({**chunk, "choices": [], "usage": usage})
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def openai_embeddings(request: Request) -> Response:
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await asyncio.sleep(config.embedding_latency)
+
+        data = []
+        for index, text in enumerate(texts):
+            vector = _embedding(str(text), config.embedding_dimensions)
+            # The SDK asks for base64 when NumPy is installed
+            embedding = base64.b64encode(vector.tobytes()).decode() if body.get("encoding_format") == "base64" else vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        tokens = sum(_tokens(str(text)) for text in texts)
+        return JSONResponse(
+            {"object": "list", "data": data, "model": body.get("model", ""), "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+        )
+
+    async def anthropic_messages(request: Request) -> Response:
+        body = await request.json()
+        model = body.get("model", "claude-3-haiku-20240307")
+        input_tokens = sum(_tokens(str(message.get("content", ""))) for message in body.get("messages", []))
+        output_tokens = min(config.completion_tokens, body.get("max_tokens") or config.completion_tokens)
+        message_id = f"msg_{uuid.uuid4().hex}"
+        await asyncio.sleep(config.llm_latency)
+
+        message = {"id": message_id, "type": "message", "role": "assistant", "model": model, "stop_sequence": None}
+        if not body.get("stream"):
+            return JSONResponse(
+                {
+                    **message,
+                    "content": [{"type": "text", "text": " ".join(["token"] * output_tokens)}],
+                    "stop_reason": "end_turn",
+                    "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+                }
+            )
+
+        async def events() -> AsyncIterator[str]:
+            start = {**message, "content": [], "stop_reason": None, "usage": {"input_tokens": input_tokens, "output_tokens": 1}}
+            yield _sse({"type": "message_start", "message": start}, "message_start")
+            yield _sse({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}, "content_block_start")
+            for _ in range(output_tokens):
+                yield _sse({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "token "}}, "content_block_delta")
+                await asyncio.sleep(config.token_interval)
+            yield _sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+            delta = {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": output_tokens}}
+            yield _sse(delta, "message_delta")
+            yield _sse({"type": "message_stop"}, "message_stop")
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    # Resumable uploads in progress: their length and the bytes received so far
+    uploads: Dict[str, List[int]] = {}
+
+    async def storage_bucket(request: Request) -> Response:
+        name = request.path_params["name"]
+        created = "2024-01-01T00:00:00Z"
+        return JSONResponse(
+            {
+                "id": name,
+                "name": name,
+                "owner": "",
+                "public": False,
+                "created_at": created,
+                "updated_at": created,
+                "file_size_limit": None,
+                "allowed_mime_types": None,
+            }
+        )
+
+    async def storage_object(request: Request) -> Response:
+        async for _ in request.stream():
+            pass
+        return JSONResponse({"Key": f"{request.path_params['bucket']}/{request.path_params['path']}"})
+
+    async def storage_resumable_create(request: Request) -> Response:
+        upload_id = uuid.uuid4().hex
+        uploads[upload_id] = [int(request.headers["upload-length"]), 0]
+        return Response(status_code=201, headers={"Location": f"{request.base_url}storage/v1/upload/resumable/{upload_id}", "Tus-Resumable": "1.0.0"})
+
+    async def storage_resumable_upload(request: Request) -> Response:
+        upload = uploads.get(request.path_params["upload_id"])
+        if upload is None:
+            return Response(status_code=404)
+        if request.method == "PATCH":
+            if int(request.headers["upload-offset"]) != upload[1]:
+                return Response(status_code=409)
+            async for chunk in request.stream():
+                upload[1] += len(chunk)
+            if upload[1] >= upload[0]:
+                uploads.pop(request.path_params["upload_id"])
+            return Response(status_code=204, headers={"Upload-Offset": str(upload[1]), "Tus-Resumable": "1.0.0"})
+        return Response(status_code=200, headers={"Upload-Offset": str(upload[1]), "Upload-Length": str(upload[0]), "Tus-Resumable": "1.0.0"})
+
+    async def health(request: Request) -> Response:
+        return JSONResponse({"status": "ok"})
+
+    return Starlette(
+        routes=[
+            Route("/health", health),
+            Route("/auth/v1/user", auth_user),
+            Route("/auth/v1/token", auth_token, methods=["POST"]),
+            Route("/openai/v1/chat/completions", openai_chat, methods=["POST"]),
+            Route("/openai/v1/embeddings", openai_embeddings, methods=["POST"]),
+            Route("/anthropic/v1/messages", anthropic_messages, methods=["POST"]),
+            Route("/storage/v1/bucket/{name}", storage_bucket),
+            Route("/storage/v1/object/{bucket}/{path:path}", storage_object, methods=["POST", "PUT"]),
+            Route("/storage/v1/upload/resumable", storage_resumable_create, methods=["POST"]),
+            Route("/storage/v1/upload/resumable/{upload_id}", storage_resumable_upload, methods=["PATCH", "HEAD"]),
+        ]
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the fake upstream timing options to a command line parser."""
+    parser.add_argument("--auth-latency-ms", type=float, default=5.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--token-interval-ms", type=float, default=5.0)
+    parser.add_argument("--completion-tokens", type=int, default=20)
+    parser.add_argument("--embedding-dimensions", type=int, default=1536)
+
+
+def config_from_arguments(args: argparse.Namespace) -> FakeUpstreamConfig:
+    """Build the configuration from options added by ``add_arguments``."""
+    return FakeUpstreamConfig(
+        auth_latency=args.auth_latency_ms / 1000,
+        llm_latency=args.llm_latency_ms / 1000,
+        embedding_latency=args.embedding_latency_ms / 1000,
+        token_interval=args.token_interval_ms / 1000,
+        completion_tokens=args.completion_tokens,
+        embedding_dimensions=args.embedding_dimensions,
+    )
+
+
+def serve(config: FakeUpstreamConfig, host: str, port: int) -> None:
+    """Run the fake upstream server until interrupted."""
+    import uvicorn
+
+    uvicorn.run(create_app(config), host=host, port=port, log_level="warning")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    serve(config_from_arguments(args), args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
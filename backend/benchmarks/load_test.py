@@ -0,0 +1,325 @@
+"""
+Load test: requests per second and latency percentiles of every API route, fully offline.
+
+Starts the fake upstreams of benchmarks.fake_upstreams (Supabase Auth and Storage, OpenAI, Anthropic)
+and the real application under uvicorn, configured to use them and the in-memory embedded
+vector index, then sends each route's requests at each concurrency level and reports
+requests/s and p50/p95/p99 latency. Routes of the application that no scenario covers
+are reported, so new endpoints don't go unmeasured.
+
+Results are written as JSON; pass a previous results file as --baseline to print the change
+in throughput and p95 latency of each route.
+
+The load generator runs in this process; on a machine with few cores it competes with the
+server for CPU, so compare results taken on the same machine.
+
+Usage (from the backend directory):
+    python -m benchmarks.load_test [--concurrency 1 8 32] [--requests 200] [--route search] [--output results.json] [--baseline old.json]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks import fake_upstreams
+
+# Shaped like a JWT, which the Supabase client insists on; never sent anywhere real
+_SERVICE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.benchmark"
+
+_WORDS = "vector search embeds documents into dense numeric space so that similar meaning lands close together".split()
+
+
+@dataclass
+class Scenario:
+    """A route and the request sent to it; ``request`` builds the httpx arguments of the i-th request."""
+
+    name: str
+    method: str
+    path: str
+    request: Callable[[int], Dict[str, Any]]
+
+
+def _text(i: int, words: int = 40) -> str:
+    # A different text per request, so caches and request coalescing don't answer for the upstreams
+    return f"request {i} " + " ".join(_WORDS[(i + j) % len(_WORDS)] for j in range(words))
+
+
+def _documents_ndjson(i: int, count: int) -> bytes:
+    return "".join(json.dumps({"text": _text(i * count + j), "metadata": {"source": "load_test"}}) + "\n" for j in range(count)).encode()
+
+
+def scenarios() -> List[Scenario]:
+    """The requests sent to each route. Documents are added before the searches run."""
+    return [
+        Scenario("auth/me", "GET", "/api/auth/me", lambda i: {}),
+        Scenario("auth/provider-token", "POST", "/api/auth/provider-token", lambda i: {"params": {"provider": "google", "token": f"token-{i}"}}),
+        Scenario("llm/generate [openai]", "POST", "/api/llm/generate", lambda i: {"json": {"prompt": _text(i), "max_tokens": 100}}),
+        Scenario(
+            "llm/generate [anthropic]",
+            "POST",
+            "/api/llm/generate",
+            lambda i: {"json": {"prompt": _text(i), "max_tokens": 100, "provider": "anthropic", "model": "claude-3-haiku-20240307"}},
+        ),
+        Scenario("llm/generate/stream [openai]", "POST", "/api/llm/generate/stream", lambda i: {"json": {"prompt": _text(i), "max_tokens": 100}}),
+        Scenario(
+            "llm/generate/stream [anthropic]",
+            "POST",
+            "/api/llm/generate/stream",
+            lambda i: {"json": {"prompt": _text(i), "max_tokens": 100, "provider": "anthropic", "model": "claude-3-haiku-20240307"}},
+        ),
+        Scenario("llm/embedding [openai]", "POST", "/api/llm/embedding", lambda i: {"json": {"text": _text(i)}}),
+        Scenario("llm/embedding [local]", "POST", "/api/llm/embedding", lambda i: {"json": {"text": _text(i), "provider": "local", "model": "hashing"}}),
+        Scenario(
+            "vectordb/documents",
+            "POST",
+            "/api/vectordb/documents",
+            lambda i: {"json": {"documents": [{"text": _text(i * 8 + j), "metadata": {"source": "load_test"}} for j in range(8)]}},
+        ),
+        Scenario(
+            "vectordb/documents/stream",
+            "POST",
+            "/api/vectordb/documents/stream",
+            lambda i: {"params": {"batch_size": 16}, "content": _documents_ndjson(i, 32), "headers": {"Content-Type": "application/x-ndjson"}},
+        ),
+        Scenario("vectordb/search", "POST", "/api/vectordb/search", lambda i: {"json": {"query_text": _text(i, 8), "limit": 10}}),
+        Scenario(
+            "vectordb/search/batch",
+            "POST",
+            "/api/vectordb/search/batch",
+            lambda i: {"json": {"queries": [{"query_text": _text(i * 4 + j, 8), "limit": 10} for j in range(4)], "fusion": "rrf"}},
+        ),
+        Scenario("vectordb/documents [delete]", "DELETE", "/api/vectordb/documents", lambda i: {"json": {"document_ids": [str(uuid.uuid4())]}}),
+        Scenario("storage/upload", "POST", "/api/storage/upload", lambda i: {"files": {"file": (f"file-{i}.txt", _text(i, 2000).encode(), "text/plain")}}),
+        Scenario(
+            "storage/upload/batch",
+            "POST",
+            "/api/storage/upload/batch",
+            lambda i: {"files": [("files", (f"file-{i}-{j}.txt", _text(i * 4 + j, 2000).encode(), "text/plain")) for j in range(4)]},
+        ),
+    ]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not become ready within {timeout} seconds")
+            await asyncio.sleep(0.2)
+
+
+def _app_environment(upstream_url: str, overrides: List[str]) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "SUPABASE_URL": upstream_url,
+            "SUPABASE_SERVICE_KEY": _SERVICE_KEY,
+            "SUPABASE_AUTH_MODE": "remote",
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": f"{upstream_url}/openai/v1",
+            "ANTHROPIC_API_KEY": "benchmark",
+            "ANTHROPIC_BASE_URL": f"{upstream_url}/anthropic",
+            # In-memory embedded vector index
+            "QDRANT_URL": "",
+            "QDRANT_EMBEDDED_PATH": "",
+            # Measure throughput, not the per-user rate limit
+            "ADMISSION_USER_RATE": "0",
+            # Don't write the embedding cache's SQLite file into the working directory
+            "EMBEDDING_CACHE_ENABLED": "false",
+        }
+    )
+    for override in overrides:
+        name, _, value = override.partition("=")
+        env[name] = value
+    return env
+
+
+async def _send(client: httpx.AsyncClient, scenario: Scenario, i: int, token: str) -> Tuple[int, float, float]:
+    """Send one request and read the whole response; return its status, time to first byte and total time."""
+    kwargs = scenario.request(i)
+    headers = {"Authorization": f"Bearer {token}", **kwargs.pop("headers", {})}
+    started = time.perf_counter()
+    first_byte = None
+    async with client.stream(scenario.method, scenario.path, headers=headers, **kwargs) as response:
+        async for _ in response.aiter_raw():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+    elapsed = time.perf_counter() - started
+    return response.status_code, first_byte if first_byte is not None else elapsed, elapsed
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    milliseconds = np.array(values) * 1000
+    return {
+        "p50": round(float(np.percentile(milliseconds, 50)), 2),
+        "p95": round(float(np.percentile(milliseconds, 95)), 2),
+        "p99": round(float(np.percentile(milliseconds, 99)), 2),
+        "mean": round(float(milliseconds.mean()), 2),
+        "max": round(float(milliseconds.max()), 2),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, concurrency: int, requests: int, users: int, offset: int) -> Dict[str, Any]:
+    """Send ``requests`` requests with ``concurrency`` in flight at a time, and summarize them."""
+    results: List[Tuple[int, float, float]] = []
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            results.append(await _send(client, scenario, offset + i, f"user-{i % users}"))
+
+    # Warm up connections and lazily created services outside the measurement
+    await asyncio.gather(*(_send(client, scenario, offset + requests + i, f"user-{i % users}") for i in range(min(concurrency, 8))))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    statuses: Dict[str, int] = {}
+    for status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        "route": scenario.name,
+        "method": scenario.method,
+        "path": scenario.path,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": sum(1 for status, _, _ in results if status >= 400),
+        "statuses": statuses,
+        "rps": round(len(results) / elapsed, 2),
+        "latency_ms": _percentiles([total for _, _, total in results]),
+        "first_byte_ms": _percentiles([first_byte for _, first_byte, _ in results]),
+    }
+
+
+async def _uncovered_routes(client: httpx.AsyncClient, covered: Set[Tuple[str, str]]) -> List[str]:
+    """Return the API routes in the application's OpenAPI schema that no scenario sends requests to."""
+    schema = (await client.get("/openapi.json")).json()
+    return sorted(
+        f"{method.upper()} {path}"
+        for path, operations in schema["paths"].items()
+        for method in operations
+        if path.startswith("/api/") and (method.upper(), path) not in covered
+    )
+
+
+def _print_comparison(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path) as file:
+        baseline = {(result["route"], result["concurrency"]): result for result in json.load(file)["results"]}
+
+    print(f"\nchange against {baseline_path}:")
+    print(f"{'route':<34} {'conc':>5} {'rps':>10} {'p95':>10}")
+    for result in results:
+        previous = baseline.get((result["route"], result["concurrency"]))
+        if previous is None:
+            continue
+        rps_change = (result["rps"] / previous["rps"] - 1) * 100 if previous["rps"] else 0.0
+        p95_change = (result["latency_ms"]["p95"] / previous["latency_ms"]["p95"] - 1) * 100 if previous["latency_ms"]["p95"] else 0.0
+        print(f"{result['route']:<34} {result['concurrency']:>5} {rps_change:>+9.1f}% {p95_change:>+9.1f}%")
+
+
+async def run(args: argparse.Namespace, app_url: str) -> Dict[str, Any]:
+    selected = [scenario for scenario in scenarios() if not args.route or any(pattern in scenario.name for pattern in args.route)]
+    results = []
+
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=120.0) as client:
+        uncovered = await _uncovered_routes(client, {(scenario.method, scenario.path) for scenario in scenarios()})
+        if uncovered:
+            print(f"routes without a scenario: {', '.join(uncovered)}")
+
+        print(f"{'route':<34} {'conc':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        offset = 0
+        for scenario in selected:
+            for concurrency in args.concurrency:
+                result = await run_scenario(client, scenario, concurrency, args.requests, args.users, offset)
+                offset += args.requests * 2
+                latency = result["latency_ms"]
+                print(
+                    f"{result['route']:<34} {concurrency:>5} {result['rps']:>9.1f} "
+                    f"{latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f} {result['errors']:>7}"
+                )
+                results.append(result)
+
+    return {"results": results, "uncovered_routes": uncovered}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per route and concurrency level")
+    parser.add_argument("--users", type=int, default=50, help="distinct users (access tokens) the requests are spread over")
+    parser.add_argument("--route", action="append", help="only run scenarios whose name contains this (repeatable)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes of the application")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="extra application setting (repeatable)")
+    parser.add_argument("--output", default=f"load_test_{datetime.now():%Y%m%d_%H%M%S}.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    fake_upstreams.add_arguments(parser)
+    args = parser.parse_args()
+
+    host = "127.0.0.1"
+    upstream_port, app_port = _free_port(), _free_port()
+    upstream_url, app_url = f"http://{host}:{upstream_port}", f"http://{host}:{app_port}"
+
+    upstreams = multiprocessing.Process(target=fake_upstreams.serve, args=(fake_upstreams.config_from_arguments(args), host, upstream_port), daemon=True)
+    upstreams.start()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", host, "--port", str(app_port), "--workers", str(args.workers), "--log-level", "warning"],
+        env=_app_environment(upstream_url, args.env),
+    )
+    try:
+        asyncio.run(_wait_until_ready(f"{upstream_url}/health"))
+        asyncio.run(_wait_until_ready(f"{app_url}/"))
+        report = asyncio.run(run(args, app_url))
+    finally:
+        server.terminate()
+        server.wait()
+        upstreams.terminate()
+        upstreams.join()
+
+    report["meta"] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "arguments": {name: value for name, value in vars(args).items() if name not in ("output", "baseline")},
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nresults written to {args.output}")
+
+    if args.baseline:
+        _print_comparison(report["results"], args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: texts per second embedded by the "local" embedding provider.
+
+Embeds the same corpus one text at a time through the model, as one batch through the
+model, and as one batch through LocalEmbeddingService with each given number of workers.
+
+Usage (from the backend directory):
+    python -m benchmarks.local_embedding_throughput [--texts 20000] [--words 200] [--dimensions 384] [--workers 1 2 4]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+from app.services.llm.embedding_service import LocalEmbeddingService
+from app.services.llm.local_embedding import HashingEmbeddingModel, register_local_embedding_model
+
+_WORDS = "the quick brown fox jumps over lazy dogs while 42 engineers debate error E1234, names and IDs.".split()
+
+
+def _report(label: str, texts: int, words: int, elapsed: float) -> None:
+    print(f"{label:<28} {texts / elapsed:>10,.0f} texts/s {texts * words / elapsed / 1e6:>8.2f} M words/s")
+
+
+async def _embed(service: LocalEmbeddingService, texts: List[str]) -> None:
+    await service.create_embeddings(texts, model="benchmark")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # Shuffle in made-up words too, so the vocabulary isn't tiny
+    vocabulary = _WORDS + [f"term{i}" for i in range(5000)]
+    texts = [" ".join(rng.choices(vocabulary, k=args.words)) for _ in range(args.texts)]
+
+    model = HashingEmbeddingModel(args.dimensions)
+    register_local_embedding_model("benchmark", lambda: model)
+    # Build the character class table outside the timed sections
+    model.embed(texts[:1])
+
+    print(f"texts: {args.texts} x {args.words} words, {args.dimensions} dimensions")
+
+    singles = texts[: max(args.texts // 10, 1)]
+    started = time.perf_counter()
+    for text in singles:
+        model.embed([text])
+    _report("model, one text per call", len(singles), args.words, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for start in range(0, len(texts), args.chunk_size):
+        model.embed(texts[start : start + args.chunk_size])
+    _report(f"model, {args.chunk_size} texts per call", len(texts), args.words, time.perf_counter() - started)
+
+    for workers in args.workers:
+        service = LocalEmbeddingService(max_workers=workers, chunk_size=args.chunk_size)
+        started = time.perf_counter()
+        asyncio.run(_embed(service, texts))
+        _report(f"service, {workers} workers", len(texts), args.words, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
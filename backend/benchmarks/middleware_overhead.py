@@ -0,0 +1,120 @@
+"""
+Benchmark: requests per second through the middleware stack, for a trivial route.
+
+Builds the same FastAPI app, with one route returning a small JSON body, behind:
+  - no middleware
+  - the previous stack: a BaseHTTPMiddleware answering OPTIONS, and CORSMiddleware
+  - the current stack of app.main: pure ASGI request context and OPTIONS middleware, and CORSMiddleware
+
+and drives each through its ASGI interface in-process, with no server or sockets, so the
+numbers isolate the framework and middleware cost per request.
+
+Usage (from the backend directory):
+    python -m benchmarks.middleware_overhead [--requests 20000] [--concurrency 1 32]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+# Settings are read at import time; the benchmark never talks to Supabase
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "benchmark")
+
+from fastapi import FastAPI, Request, Response  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from app.core.middleware import OptionsMiddleware, RequestContextMiddleware  # noqa: E402
+from app.main import CORS_METHODS  # noqa: E402
+
+_ORIGINS = ["http://localhost:3000"]
+
+
+class _LegacyOptionsMiddleware(BaseHTTPMiddleware):
+    """The OptionsMiddleware app.main used before, for comparison."""
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method == "OPTIONS":
+            return Response(status_code=200)
+        return await call_next(request)
+
+
+def _build(stack: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    if stack == "previous":
+        app.add_middleware(_LegacyOptionsMiddleware)
+    elif stack == "current":
+        app.add_middleware(OptionsMiddleware, allow_methods=CORS_METHODS)
+    if stack != "none":
+        app.add_middleware(CORSMiddleware, allow_origins=_ORIGINS, allow_credentials=True, allow_methods=CORS_METHODS, allow_headers=["*"])
+    if stack == "current":
+        app.add_middleware(RequestContextMiddleware)
+    return app
+
+
+async def _request(app: FastAPI) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"origin", _ORIGINS[0].encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 8000),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Only reached by middleware listening for a disconnect after the body was read
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise RuntimeError(f"Unexpected status {message['status']}")
+
+    await app(scope, receive, send)
+
+
+async def _run(app: FastAPI, requests: int, concurrency: int) -> float:
+    async def worker(count: int) -> None:
+        for _ in range(count):
+            await _request(app)
+
+    # Warm up route matching and response model caches outside the timed section
+    await worker(100)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    return (requests // concurrency) * concurrency / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 32])
+    args = parser.parse_args()
+
+    print(f"{'stack':<10} {'concurrency':>11} {'requests/s':>12}")
+    for concurrency in args.concurrency:
+        for stack in ("none", "previous", "current"):
+            rps = asyncio.run(_run(_build(stack), args.requests, concurrency))
+            print(f"{stack:<10} {concurrency:>11} {rps:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark: concurrent QdrantService searches must not block the event loop.
+
+Runs a batch of concurrent searches against an in-memory collection whose client calls
+are slowed down to simulate network latency, while a heartbeat task measures how late
+the event loop wakes it up. With blocking client calls the searches serialize and the
+heartbeat stalls for the whole run; with calls offloaded to the thread pool the loop
+stays responsive.
+
+Usage (from the backend directory):
+    python -m benchmarks.qdrant_event_loop [--searches 50] [--latency-ms 20] [--workers 8]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Settings are read at import time; the benchmark never talks to Supabase
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "benchmark")
+
+from app.services.vectordb.qdrant_service import QdrantService  # noqa: E402
+
+
+def _with_latency(func, latency: float):
+    """Wrap a blocking client method so each call also blocks for ``latency`` seconds."""
+
+    def slow(*args, **kwargs):
+        time.sleep(latency)
+        return func(*args, **kwargs)
+
+    return slow
+
+
+async def _heartbeat(interval: float, lags: list, stop: asyncio.Event):
+    """Record how much later than requested the event loop resumes a sleeping task."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run(searches: int, latency: float, workers: int, dim: int = 256) -> None:
+    service = QdrantService(url="", collection_name="benchmark", embedded_path="")
+    rng = np.random.default_rng(0)
+
+    vectors = rng.normal(size=(1000, dim)).astype(np.float32)
+    await service.add_documents(documents=[{"text": str(i)} for i in range(len(vectors))], embeddings=vectors.tolist())
+
+    # Simulate a remote server with the requested number of concurrent client calls
+    service._executor.shutdown()
+    service._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qdrant")
+    service.client.search = _with_latency(service.client.search, latency)
+    service.client.get_collections = _with_latency(service.client.get_collections, latency)
+
+    queries = rng.normal(size=(searches, dim)).astype(np.float32).tolist()
+    lags: list = []
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(0.005, lags, stop))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(service.search(query_embedding=query, limit=10) for query in queries))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await heartbeat
+    service.close()
+
+    serialized = searches * 2 * latency
+    print(f"searches:            {searches} concurrent, {latency * 1000:.0f} ms simulated latency per client call")
+    print(f"wall time:           {elapsed * 1000:.1f} ms (fully serialized would be {serialized * 1000:.1f} ms)")
+    print(f"event loop max lag:  {max(lags) * 1000:.1f} ms")
+    print(f"event loop p50 lag:  {float(np.percentile(lags, 50)) * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.searches, args.latency_ms / 1000, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import asyncio
+
+import pytest
+
+from app.core import admission
+from app.core.admission import FairConcurrencyLimiter, OverloadedError, RateLimitedError, UserRateLimiter
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+def _limiter(max_concurrency=1, min_concurrency=1, max_queue_length=100, max_queue_seconds=10.0):
+    return FairConcurrencyLimiter(max_concurrency, min_concurrency, max_queue_length, max_queue_seconds)
+
+
+async def _settle():
+    """Let every task that is ready run until it blocks again."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_admits_up_to_the_limit_without_queuing():
+    async def main():
+        limiter = _limiter(max_concurrency=2)
+        first = await limiter.acquire("a")
+        second = await limiter.acquire("a")
+        waiter = asyncio.create_task(limiter.acquire("a"))
+        await _settle()
+        assert (limiter.active, limiter.queued) == (2, 1)
+
+        first.release()
+        first.release()
+        await _settle()
+        assert waiter.done()
+        assert (limiter.active, limiter.queued) == (2, 0)
+
+        second.release()
+        (await waiter).release()
+        assert (limiter.active, limiter.queued) == (0, 0)
+        assert limiter.stats.admitted == 3
+
+    asyncio.run(main())
+
+
+def test_waiting_users_are_served_round_robin():
+    async def main():
+        limiter = _limiter()
+        holder = await limiter.acquire("holder")
+        order = []
+
+        async def call(user_id, name):
+            with await limiter.acquire(user_id):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        tasks = []
+        for user_id, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("c", "c1"), ("b", "b2")]:
+            tasks.append(asyncio.create_task(call(user_id, name)))
+            await _settle()
+        assert limiter.queued == 6
+
+        holder.release()
+        await asyncio.gather(*tasks)
+        assert order == ["a1", "b1", "c1", "a2", "b2", "a3"]
+        assert (limiter.active, limiter.queued) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_sheds_when_the_queue_is_full():
+    async def main():
+        limiter = _limiter(max_queue_length=2)
+        holder = await limiter.acquire("a")
+        waiters = [asyncio.create_task(limiter.acquire(user_id)) for user_id in ("a", "b")]
+        await _settle()
+
+        with pytest.raises(OverloadedError) as shed:
+            await limiter.acquire("c")
+        assert shed.value.status_code == 503
+        assert shed.value.retry_after == limiter.max_queue_seconds
+        assert limiter.stats.shed == 1
+        assert limiter.queued == 2
+
+        holder.release()
+        for waiter in waiters:
+            (await waiter).release()
+        assert (limiter.active, limiter.queued) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_sheds_calls_that_wait_too_long():
+    async def main():
+        limiter = _limiter(max_queue_seconds=0.01)
+        holder = await limiter.acquire("a")
+
+        with pytest.raises(OverloadedError):
+            await limiter.acquire("b")
+        assert limiter.stats.shed == 1
+        assert limiter.queued == 0
+        assert not limiter._queues
+
+        # The slot isn't handed to the call that gave up
+        holder.release()
+        assert (limiter.active, limiter.queued) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        limiter = _limiter()
+        holder = await limiter.acquire("a")
+        cancelled = asyncio.create_task(limiter.acquire("a"))
+        waiter = asyncio.create_task(limiter.acquire("b"))
+        await _settle()
+
+        cancelled.cancel()
+        await _settle()
+        assert cancelled.cancelled()
+        assert limiter.queued == 1
+
+        holder.release()
+        await _settle()
+        assert waiter.done()
+        (await waiter).release()
+        assert (limiter.active, limiter.queued) == (0, 0)
+        assert limiter.stats.shed == 0
+
+    asyncio.run(main())
+
+
+def test_slot_granted_as_the_wait_times_out_is_passed_on(monkeypatch):
+    async def granted_then_timed_out(future, timeout):
+        # The slot arrives, but the timeout fires before the waiter resumes
+        await future
+        raise asyncio.TimeoutError()
+
+    async def main():
+        limiter = _limiter()
+        holder = await limiter.acquire("a")
+        monkeypatch.setattr(admission.asyncio, "wait_for", granted_then_timed_out)
+        unlucky = asyncio.create_task(limiter.acquire("a"))
+        await _settle()
+        monkeypatch.undo()
+        next_in_line = asyncio.create_task(limiter.acquire("b"))
+        await _settle()
+
+        holder.release()
+        await _settle()
+        with pytest.raises(OverloadedError):
+            await unlucky
+        assert next_in_line.done()
+        assert (limiter.active, limiter.queued) == (1, 0)
+
+        (await next_in_line).release()
+        assert (limiter.active, limiter.queued) == (0, 0)
+        assert limiter.stats.shed == 1
+        assert limiter.stats.admitted == 3
+
+    asyncio.run(main())
+
+
+def test_slot_granted_as_the_waiter_is_cancelled_is_not_lost():
+    async def main():
+        limiter = _limiter()
+        holder = await limiter.acquire("a")
+        unlucky = asyncio.create_task(limiter.acquire("a"))
+        next_in_line = asyncio.create_task(limiter.acquire("b"))
+        await _settle()
+
+        # Grant the slot and cancel its waiter before it gets to run
+        holder.release()
+        unlucky.cancel()
+        results = await asyncio.gather(unlucky, return_exceptions=True)
+        if isinstance(results[0], admission.Admission):
+            # Python 3.11 and earlier: wait_for returns the result that arrived despite the cancellation
+            results[0].release()
+        await _settle()
+
+        assert next_in_line.done()
+        (await next_in_line).release()
+        assert (limiter.active, limiter.queued) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_limit_halves_on_throttling_and_grows_back():
+    async def main():
+        limiter = _limiter(max_concurrency=8, min_concurrency=2)
+
+        with pytest.raises(Throttled):
+            with await limiter.acquire("a"):
+                raise Throttled()
+        assert limiter.limit == 4.0
+        assert limiter.stats.throttled == 1
+
+        # Calls already in flight fail together; only the first halves the limit
+        with pytest.raises(Throttled):
+            with await limiter.acquire("a"):
+                raise Throttled()
+        assert limiter.limit == 4.0
+        assert limiter.stats.throttled == 2
+
+        limiter.DECREASE_INTERVAL = 0.0
+        for expected in (2.0, 2.0):
+            with pytest.raises(Throttled):
+                with await limiter.acquire("a"):
+                    raise Throttled()
+            assert limiter.limit == expected
+
+        # Other errors leave the limit unchanged
+        with pytest.raises(ValueError):
+            with await limiter.acquire("a"):
+                raise ValueError()
+        assert limiter.limit == 2.0
+
+        # Additive increase: about one more slot per limit's worth of successful calls
+        for _ in range(2):
+            with await limiter.acquire("a"):
+                pass
+        assert int(limiter.limit) == 2
+        with await limiter.acquire("a"):
+            pass
+        assert int(limiter.limit) == 3
+
+        for _ in range(100):
+            with await limiter.acquire("a"):
+                pass
+        assert limiter.limit == 8.0
+
+    asyncio.run(main())
+
+
+def test_lower_limit_queues_calls_beyond_it():
+    async def main():
+        limiter = _limiter(max_concurrency=4, min_concurrency=1)
+        held = [await limiter.acquire("a") for _ in range(4)]
+        held[0].release(Throttled())
+        assert limiter.limit == 2.0
+
+        waiter = asyncio.create_task(limiter.acquire("b"))
+        await _settle()
+        held[1].release(ValueError())
+        await _settle()
+        assert not waiter.done()
+        assert (limiter.active, limiter.queued) == (2, 1)
+
+        held[2].release(ValueError())
+        await _settle()
+        assert waiter.done()
+        held[3].release()
+        (await waiter).release()
+        assert (limiter.active, limiter.queued) == (0, 0)
+
+    asyncio.run(main())
+
+
+def test_user_rate_limiter_allows_a_burst_then_refuses():
+    limiter = UserRateLimiter(rate=1.0, burst=3.0, max_users=10)
+    for _ in range(3):
+        limiter.acquire("a")
+    limiter.acquire("b")
+
+    with pytest.raises(RateLimitedError) as refused:
+        limiter.acquire("a")
+    assert refused.value.status_code == 429
+    assert 0 < refused.value.retry_after <= 1.0
+    assert (limiter.stats.admitted, limiter.stats.rate_limited) == (4, 1)
+
+
+def test_user_rate_limiter_is_off_at_rate_zero():
+    limiter = UserRateLimiter(rate=0.0, burst=1.0, max_users=10)
+    for _ in range(10):
+        limiter.acquire("a")
+    assert limiter.stats.rate_limited == 0
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.core.config import settings
+from app.services.supabase import auth as auth_module
+from app.services.supabase.auth import SupabaseAuthService, _token_cache
+
+SECRET = "test-jwt-secret-" + "x" * 48
+
+
+class FakeAuthClient:
+    """Stands in for ``Client.auth``; answers the remote check or raises if the token was revoked."""
+
+    def __init__(self):
+        self.revoked = set()
+        self.calls = 0
+
+    def get_user(self, token):
+        self.calls += 1
+        if token in self.revoked:
+            raise RuntimeError("invalid JWT: session not found")
+        return SimpleNamespace(user=SimpleNamespace(id="remote-user"))
+
+
+@pytest.fixture(autouse=True)
+def local_auth(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_AUTH_MODE", "local")
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", SECRET)
+    monkeypatch.setattr(settings, "AUTH_REMOTE_RECHECK_SECONDS", 0)
+    _token_cache.clear()
+    yield
+    _token_cache.clear()
+
+
+@pytest.fixture
+def remote():
+    return FakeAuthClient()
+
+
+@pytest.fixture
+def service(remote):
+    return SupabaseAuthService(client=SimpleNamespace(auth=remote))
+
+
+def _claims(**overrides):
+    claims = {"sub": "user-1", "email": "a@example.com", "role": "authenticated", "aud": "authenticated", "exp": int(time.time()) + 3600}
+    claims.update(overrides)
+    return claims
+
+
+def _hs256(secret=SECRET, **overrides):
+    return jwt.encode(_claims(**overrides), secret, algorithm="HS256")
+
+
+def test_hs256_token_is_verified_locally(service, remote):
+    user = asyncio.run(service.get_user(_hs256(user_metadata={"full_name": "Ada"})))
+    assert (user.id, user.email, user.user_metadata) == ("user-1", "a@example.com", {"full_name": "Ada"})
+    assert remote.calls == 0
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        pytest.param(_hs256(secret="another-secret-" + "y" * 48), id="wrong-secret"),
+        pytest.param(_hs256(aud="anon"), id="wrong-audience"),
+        pytest.param(jwt.encode({"aud": "authenticated", "exp": int(time.time()) + 3600}, SECRET, algorithm="HS256"), id="no-subject"),
+    ],
+)
+def test_invalid_hs256_tokens_are_rejected(service, token):
+    with pytest.raises(jwt.InvalidTokenError):
+        asyncio.run(service.get_user(token))
+    assert len(_token_cache) == 0
+
+
+def test_hs256_needs_a_configured_secret(service, monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", "")
+    with pytest.raises(ValueError, match="SUPABASE_JWT_SECRET"):
+        asyncio.run(service.get_user(_hs256()))
+
+
+@pytest.fixture
+def rsa_key(monkeypatch):
+    """Serve a generated RSA key pair through a stubbed JWKS client."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_key = private_key.public_key()
+    jwks_client = SimpleNamespace(get_signing_key_from_jwt=lambda token: SimpleNamespace(key=public_key))
+    monkeypatch.setattr(auth_module, "_get_jwks_client", lambda: jwks_client)
+    return private_key
+
+
+def test_rs256_token_is_verified_with_the_jwks_key(service, rsa_key):
+    token = jwt.encode(_claims(), rsa_key, algorithm="RS256", headers={"kid": "key-1"})
+    assert asyncio.run(service.get_user(token)).id == "user-1"
+
+
+def test_rs256_token_signed_with_another_key_is_rejected(service, rsa_key):
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(jwt.InvalidSignatureError):
+        asyncio.run(service.get_user(jwt.encode(_claims(), other_key, algorithm="RS256")))
+
+
+def test_public_key_used_as_hmac_secret_is_rejected(service, rsa_key):
+    # The classic algorithm-confusion attack: sign HS256 with the public key that verifies RS256
+    public_pem = rsa_key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    header = jwt.utils.base64url_encode(b'{"alg":"HS256","typ":"JWT"}')
+    payload = jwt.utils.base64url_encode(jwt.api_jws.json.dumps(_claims()).encode())
+    signing_input = header + b"." + payload
+    signature = jwt.utils.base64url_encode(jwt.algorithms.HMACAlgorithm(jwt.algorithms.HMACAlgorithm.SHA256).sign(signing_input, public_pem))
+    with pytest.raises(jwt.InvalidSignatureError):
+        asyncio.run(service.get_user((signing_input + b"." + signature).decode()))
+
+
+@pytest.mark.parametrize("algorithm", ["none", "HS512"])
+def test_unsupported_algorithms_are_rejected(service, algorithm):
+    key = None if algorithm == "none" else SECRET
+    token = jwt.encode(_claims(), key, algorithm=algorithm)
+    with pytest.raises(ValueError, match="Unsupported token algorithm"):
+        asyncio.run(service.get_user(token))
+
+
+def test_expired_token_is_rejected_with_401(service):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.services.supabase.auth import get_auth_service
+
+    app.dependency_overrides[get_auth_service] = lambda: service
+    try:
+        client = TestClient(app)
+        expired = client.get("/api/auth/me", headers={"Authorization": f"Bearer {_hs256(exp=int(time.time()) - 10)}"})
+        valid = client.get("/api/auth/me", headers={"Authorization": f"Bearer {_hs256()}"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert expired.status_code == 401
+    assert "expired" in expired.json()["detail"]
+    assert expired.headers["WWW-Authenticate"] == "Bearer"
+    assert valid.status_code == 200
+    assert valid.json()["id"] == "user-1"
+
+
+def test_cached_token_expires_with_the_token(service, monkeypatch):
+    exp = int(time.time()) + 60
+    token = _hs256(exp=exp)
+    verified = []
+    verify = service._verify_token
+
+    async def counting_verify(jwt_token):
+        verified.append(jwt_token)
+        return await verify(jwt_token)
+
+    monkeypatch.setattr(service, "_verify_token", counting_verify)
+    asyncio.run(service.get_user(token))
+    asyncio.run(service.get_user(token))
+    assert len(verified) == 1
+
+    cache_key = hashlib.sha256(token.encode()).digest()
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert _token_cache.get(cache_key) is None
+
+
+def test_remote_recheck_evicts_a_revoked_token(service, remote, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_REMOTE_RECHECK_SECONDS", 30)
+    token = _hs256()
+    clock = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+
+    asyncio.run(service.get_user(token))
+    asyncio.run(service.get_user(token))
+    assert remote.calls == 0
+
+    # Past the recheck interval a confirmed token stays cached
+    clock[0] += 31
+    asyncio.run(service.get_user(token))
+    assert remote.calls == 1
+
+    clock[0] += 31
+    remote.revoked.add(token)
+    with pytest.raises(RuntimeError, match="session not found"):
+        asyncio.run(service.get_user(token))
+    assert len(_token_cache) == 0
@@ -0,0 +1,108 @@
+import pytest
+
+from app.services.vectordb.chunking import TokenChunker, token_spans
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliett", "kilo", "lima"]
+
+
+def _tokens(text):
+    starts, ends = token_spans(text)
+    return [text[start:end] for start, end in zip(starts.tolist(), ends.tolist())]
+
+
+def _chunk_tokens(chunker, text):
+    return [_tokens(chunk.text) for chunk in chunker.chunk(text)]
+
+
+@pytest.mark.parametrize(
+    "text, tokens",
+    [
+        ("Hello, world!", ["Hello", ",", "world", "!"]),
+        ("1234567", ["123", "456", "7"]),
+        ("snake_case x2", ["snake", "case", "x", "2"]),
+        ("naïve café", ["naïve", "café"]),
+        ("東京tokyo 2024年", ["東", "京", "tokyo", "202", "4", "年"]),
+        ("한국어 テキスト", ["한", "국", "어", "テ", "キ", "ス", "ト"]),
+        ("x😀y", ["x", "😀", "y"]),
+        ("", []),
+        (" \n\t", []),
+    ],
+)
+def test_token_spans(text, tokens):
+    assert _tokens(text) == tokens
+
+
+@pytest.mark.parametrize("text", ["", " ", "\n\t  \n"])
+def test_blank_text_has_no_chunks(text):
+    assert TokenChunker(chunk_size=4, chunk_overlap=1).chunk(text) == []
+
+
+def test_text_within_the_window_is_one_chunk():
+    chunker = TokenChunker(chunk_size=4, chunk_overlap=1)
+    # Shorter than the window in characters
+    assert [(chunk.text, chunk.start, chunk.end) for chunk in chunker.chunk(" ab ")] == [(" ab ", 0, 4)]
+    # Exactly as many tokens as the window, surrounding whitespace included
+    text = "  " + " ".join(WORDS[:4]) + "\n"
+    (chunk,) = chunker.chunk(text)
+    assert (chunk.text, chunk.index, chunk.start, chunk.end) == (text, 0, 0, len(text))
+
+
+@pytest.mark.parametrize(
+    "words, chunk_size, chunk_overlap, expected",
+    [
+        # One token past the window
+        (5, 4, 0, [[0, 1, 2, 3], [4]]),
+        # Windows that end exactly on the last token
+        (8, 4, 0, [[0, 1, 2, 3], [4, 5, 6, 7]]),
+        (10, 4, 1, [[0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9]]),
+        # A last window past the end is cut short, keeping its overlap
+        (11, 4, 1, [[0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9], [9, 10]]),
+        # No window lies entirely within the overlap of the one before
+        (10, 4, 2, [[0, 1, 2, 3], [2, 3, 4, 5], [4, 5, 6, 7], [6, 7, 8, 9]]),
+        (6, 5, 4, [[0, 1, 2, 3, 4], [1, 2, 3, 4, 5]]),
+        (3, 1, 0, [[0], [1], [2]]),
+    ],
+)
+def test_window_and_overlap_boundaries(words, chunk_size, chunk_overlap, expected):
+    text = " ".join(WORDS[:words])
+    assert _chunk_tokens(TokenChunker(chunk_size, chunk_overlap), text) == [[WORDS[i] for i in window] for window in expected]
+
+
+def test_chunks_are_slices_of_the_text():
+    text = "Intro:  " + " ".join(WORDS) + ".\n\nEnd, 12345."
+    chunks = TokenChunker(chunk_size=5, chunk_overlap=2).chunk(text)
+
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        assert chunk.text == text[chunk.start : chunk.end]
+        assert chunk.text == chunk.text.strip()
+        assert len(_tokens(chunk.text)) <= 5
+
+    # Consecutive chunks share exactly the overlap, and together cover every token
+    tokens = [_tokens(chunk.text) for chunk in chunks]
+    for previous, current in zip(tokens, tokens[1:]):
+        assert previous[-2:] == current[:2]
+    assert [token for window in tokens[:1] + [window[2:] for window in tokens[1:]] for token in window] == _tokens(text)
+
+
+def test_cjk_text_counts_a_token_per_character():
+    text = "日本語のテキストを検索するための分割処理です"
+    chunks = TokenChunker(chunk_size=8, chunk_overlap=2).chunk(text)
+
+    assert [(chunk.start, chunk.end) for chunk in chunks] == [(0, 8), (6, 14), (12, 20), (18, 22)]
+    assert [chunk.text for chunk in chunks] == [text[0:8], text[6:14], text[12:20], text[18:22]]
+
+
+def test_mixed_scripts_keep_offsets_in_characters():
+    text = "検索 search 😀 です " * 3
+    chunks = TokenChunker(chunk_size=4, chunk_overlap=0).chunk(text)
+
+    assert "".join(chunk.text for chunk in chunks).replace(" ", "") == text.replace(" ", "")
+    for chunk in chunks:
+        assert chunk.text == text[chunk.start : chunk.end]
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(0, 0), (-1, 0), (4, 4), (4, 5), (4, -1)])
+def test_invalid_windows_are_refused(chunk_size, chunk_overlap):
+    with pytest.raises(ValueError):
+        TokenChunker(chunk_size, chunk_overlap)
@@ -0,0 +1,236 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from typing import Optional
+
+import pytest
+from postgrest.types import ReturnMethod
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+from app.services.supabase import database
+from app.services.supabase.database import SupabaseDatabaseService, _quote, decode_cursor, encode_cursor
+
+
+class Item(BaseModel):
+    id: int
+    created_at: str
+    name: Optional[str] = Field(default=None, alias="title")
+
+
+class Query:
+    """Records the builder calls made on a table, and answers execute from the stub client."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.calls = []
+
+    def __getattr__(self, method):
+        def call(*args, **kwargs):
+            self.calls.append((method, args, kwargs))
+            return self
+
+        return call
+
+    def execute(self):
+        return SimpleNamespace(data=self.client.respond(self))
+
+    def find(self, method):
+        return [call for call in self.calls if call[0] == method]
+
+
+class Client:
+    """A Supabase client stub whose queries return the rows given by ``respond``."""
+
+    def __init__(self, respond=lambda query: []):
+        self.respond = respond
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        query = Query(self, name)
+        with self._lock:
+            self.queries.append(query)
+        return query
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = Client()
+    monkeypatch.setattr(database, "get_supabase_client", lambda: client)
+    return client
+
+
+def _rows(*ids, created_at="2024-01-01"):
+    return [{"id": row_id, "created_at": created_at, "title": f"item {row_id}"} for row_id in ids]
+
+
+def test_cursor_round_trip():
+    values = ["2024-01-01T00:00:00+00:00", 42, "a,b(c)"]
+    cursor = encode_cursor(values)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == values
+
+
+# Not base64, then the encodings of {}, null and []
+@pytest.mark.parametrize("cursor", ["not a cursor!", "e30", "bnVsbA", "W10"])
+def test_invalid_cursor_is_refused(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize(
+    "value, quoted",
+    [
+        ("plain", '"plain"'),
+        ("a,b(c)", '"a,b(c)"'),
+        ('say "hi"', '"say \\"hi\\""'),
+        ("back\\slash", '"back\\\\slash"'),
+        ('\\"', '"\\\\\\""'),
+        (7, '"7"'),
+    ],
+)
+def test_quote_escapes_reserved_characters(value, quoted):
+    assert _quote(value) == quoted
+
+
+def test_first_page_orders_by_the_key(client):
+    client.respond = lambda query: _rows(1, 2)
+    service = SupabaseDatabaseService("items", Item)
+    page = asyncio.run(service.list_page(limit=2))
+
+    (query,) = client.queries
+    assert query.find("select") == [("select", ("id,created_at,title",), {})]
+    assert query.find("order") == [("order", ("id",), {"desc": False})]
+    assert query.find("limit") == [("limit", (2,), {})]
+    assert not query.find("filter") and not query.find("or_")
+    assert [item.id for item in page.items] == [1, 2]
+    assert page.items[0].name == "item 1"
+    assert decode_cursor(page.next_cursor) == [2]
+
+
+def test_short_page_is_the_last(client):
+    client.respond = lambda query: _rows(1)
+    page = asyncio.run(SupabaseDatabaseService("items", Item).list_page(limit=2))
+    assert page.next_cursor is None
+
+
+def test_single_column_cursor_filters_on_the_key(client):
+    service = SupabaseDatabaseService("items", Item)
+    asyncio.run(service.list_page(filters={"owner": "u1"}, cursor=encode_cursor([5]), limit=10))
+    asyncio.run(service.list_page(cursor=encode_cursor([5]), limit=10, descending=True))
+
+    ascending, descending = client.queries
+    assert ascending.find("eq") == [("eq", ("owner", "u1"), {})]
+    assert ascending.find("filter") == [("filter", ("id", "gt", 5), {})]
+    assert descending.find("filter") == [("filter", ("id", "lt", 5), {})]
+    assert descending.find("order") == [("order", ("id",), {"desc": True})]
+
+
+def test_two_column_keyset_filter(client):
+    client.respond = lambda query: _rows(8, 9, created_at="2024-01-02")
+    service = SupabaseDatabaseService("items", Item)
+    page = asyncio.run(service.list_page(cursor=encode_cursor(["2024-01-01", 7]), limit=2, order_by="created_at", columns=["title"]))
+
+    (query,) = client.queries
+    # Sort columns are selected even when not asked for, to build the next cursor
+    assert query.find("select") == [("select", ("title,created_at,id",), {})]
+    assert query.find("or_") == [("or_", ('created_at.gt."2024-01-01",and(created_at.eq."2024-01-01",id.gt."7")',), {})]
+    assert query.find("order") == [("order", ("created_at",), {"desc": False}), ("order", ("id",), {"desc": False})]
+    assert decode_cursor(page.next_cursor) == ["2024-01-02", 9]
+
+
+def test_descending_two_column_cursor(client):
+    service = SupabaseDatabaseService("items", Item)
+    cursor = encode_cursor(['Smith, "J" (Jr)', "a\\b"])
+    asyncio.run(service.list_page(cursor=cursor, limit=2, order_by="title", descending=True))
+
+    (query,) = client.queries
+    value, key = '"Smith, \\"J\\" (Jr)"', '"a\\\\b"'
+    assert query.find("or_") == [("or_", (f"title.lt.{value},and(title.eq.{value},id.lt.{key})",), {})]
+    assert query.find("order") == [("order", ("title",), {"desc": True}), ("order", ("id",), {"desc": True})]
+
+
+def test_cursor_must_match_the_sort_order(client):
+    service = SupabaseDatabaseService("items", Item)
+    with pytest.raises(ValueError):
+        asyncio.run(service.list_page(cursor=encode_cursor([7]), order_by="created_at"))
+    with pytest.raises(ValueError):
+        asyncio.run(service.list_page(cursor=encode_cursor(["2024-01-01", 7])))
+
+
+def test_iter_pages_follows_cursors(client):
+    pages = iter([_rows(1, 2), _rows(3, 4), []])
+    client.respond = lambda query: next(pages)
+    service = SupabaseDatabaseService("items", Item)
+
+    async def collect():
+        return [[item.id for item in page] async for page in service.iter_pages(page_size=2)]
+
+    assert asyncio.run(collect()) == [[1, 2], [3, 4]]
+    assert [query.find("filter") for query in client.queries] == [[], [("filter", ("id", "gt", 2), {})], [("filter", ("id", "gt", 4), {})]]
+
+
+def test_create_many_sends_batches(client, monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_DB_WRITE_CONCURRENCY", 2)
+    service = SupabaseDatabaseService("items", Item)
+    rows = [Item(id=1, created_at="2024-01-01", title="one"), Item(id=2, created_at="2024-01-01")] + [{"id": i} for i in range(3, 6)]
+
+    assert asyncio.run(service.create_many(rows, batch_size=2)) == 5
+
+    inserts = [query.find("insert")[0] for query in client.queries]
+    assert [args[0] for _, args, _ in inserts] == [
+        [{"id": 1, "created_at": "2024-01-01", "title": "one"}, {"id": 2, "created_at": "2024-01-01"}],
+        [{"id": 3}, {"id": 4}],
+        [{"id": 5}],
+    ]
+    assert all(kwargs == {"returning": ReturnMethod.minimal, "default_to_null": False} for _, _, kwargs in inserts)
+
+
+def test_upsert_many_defaults_to_the_key_column(client):
+    service = SupabaseDatabaseService("items", Item)
+    assert asyncio.run(service.upsert_many([{"id": 1}], ignore_duplicates=True)) == 1
+
+    ((_, args, kwargs),) = client.queries[0].find("upsert")
+    assert kwargs["on_conflict"] == "id"
+    assert kwargs["ignore_duplicates"] is True
+
+
+def test_failed_batch_stops_the_write(client, monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_DB_WRITE_CONCURRENCY", 1)
+
+    def respond(query):
+        ((_, (batch,), _),) = query.find("insert")
+        if batch[0]["id"] == 2:
+            raise RuntimeError("insert failed")
+        return []
+
+    client.respond = respond
+    read = []
+
+    def rows():
+        for i in range(10):
+            read.append(i)
+            yield {"id": i}
+
+    with pytest.raises(RuntimeError, match="insert failed"):
+        asyncio.run(SupabaseDatabaseService("items", Item).create_many(rows(), batch_size=2))
+
+    # The batch after the failed one was read but never sent, and nothing after it was read
+    assert [query.find("insert")[0][1][0][0]["id"] for query in client.queries] == [0, 2]
+    assert read == list(range(6))
+
+
+def test_failure_in_the_last_batches_is_raised(client, monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_DB_WRITE_CONCURRENCY", 4)
+
+    def respond(query):
+        ((_, (batch,), _),) = query.find("insert")
+        if batch[0]["id"] == 4:
+            raise RuntimeError("insert failed")
+        return []
+
+    client.respond = respond
+    with pytest.raises(RuntimeError, match="insert failed"):
+        asyncio.run(SupabaseDatabaseService("items", Item).create_many([{"id": i} for i in range(6)], batch_size=2))
@@ -0,0 +1,215 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from qdrant_client.http import models
+
+from app.services.vectordb import embedded_index
+from app.services.vectordb.embedded_index import EmbeddedVectorIndex
+
+
+def _points(ids, dimensions=4):
+    """Points with distinct unit vectors, and payloads naming their parity and group of ten."""
+    rng = np.random.default_rng(0)
+    return [
+        models.PointStruct(id=point_id, vector=rng.normal(size=dimensions).tolist(), payload={"parity": point_id % 2, "group": f"g{point_id // 10}"})
+        for point_id in ids
+    ]
+
+
+def _create(index, name="docs", dimensions=4):
+    index.create_collection(name, vectors_config=models.VectorParams(size=dimensions, distance=models.Distance.COSINE))
+
+
+def _ids(index, name="docs", limit=1000, query_filter=None):
+    hits = index.search(name, query_vector=[1.0, 0.0, 0.0, 0.0], limit=limit, query_filter=query_filter)
+    return sorted(hit.id for hit in hits)
+
+
+def _match(**conditions):
+    return models.Filter(must=[models.FieldCondition(key=key, match=models.MatchValue(value=value)) for key, value in conditions.items()])
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "index")
+
+
+def test_reopen_restores_points_payloads_and_scores(path):
+    index = EmbeddedVectorIndex(path)
+    _create(index)
+    points = _points(range(20))
+    index.upsert("docs", points)
+    before = index.search("docs", query_vector=points[3].vector, limit=5)
+    index.close()
+
+    reopened = EmbeddedVectorIndex(path)
+    after = reopened.search("docs", query_vector=points[3].vector, limit=5)
+    assert [(hit.id, hit.payload) for hit in after] == [(hit.id, hit.payload) for hit in before]
+    assert [hit.score for hit in after] == pytest.approx([hit.score for hit in before])
+    assert after[0].id == 3
+    assert reopened.get_collection("docs").points_count == 20
+
+
+def test_reopen_after_crash_mid_log(path):
+    index = EmbeddedVectorIndex(path)
+    _create(index)
+    index.upsert("docs", _points(range(5)))
+    index.close()
+
+    # A crash while appending leaves a partial last line
+    log_path = os.path.join(path, "docs", "log.0.jsonl")
+    with open(log_path, "ab") as f:
+        f.write(b'{"id": 5, "row": 5, "pay')
+
+    reopened = EmbeddedVectorIndex(path)
+    assert _ids(reopened) == [0, 1, 2, 3, 4]
+
+    # Writes after the crash are readable on the next reopen
+    reopened.upsert("docs", _points([7]))
+    reopened.delete("docs", points_selector=models.PointIdsList(points=[0]))
+    reopened.close()
+
+    assert _ids(EmbeddedVectorIndex(path)) == [1, 2, 3, 4, 7]
+
+
+def test_delete_and_filter(path):
+    index = EmbeddedVectorIndex(path)
+    _create(index)
+    index.upsert("docs", _points(range(30)))
+    index.delete("docs", points_selector=models.PointIdsList(points=[0, 2, 13, 99]))
+
+    assert _ids(index) == [point_id for point_id in range(30) if point_id not in (0, 2, 13)]
+    assert _ids(index, query_filter=_match(parity=0, group="g0")) == [4, 6, 8]
+    assert _ids(index, query_filter=_match(group="g1", parity=1)) == [11, 15, 17, 19]
+    assert _ids(index, query_filter=_match(group="g9")) == []
+    assert len(index.search("docs", query_vector=[1.0, 0.0, 0.0, 0.0], limit=3, query_filter=_match(parity=1))) == 3
+
+    # Replacing a point's payload moves it between filter results
+    replaced = _points([4])[0]
+    replaced.payload = {"parity": 1, "group": "g5"}
+    index.upsert("docs", [replaced])
+    assert _ids(index, query_filter=_match(parity=0, group="g0")) == [6, 8]
+    assert _ids(index, query_filter=_match(group="g5")) == [4]
+    index.close()
+
+    reopened = EmbeddedVectorIndex(path)
+    assert _ids(reopened, query_filter=_match(parity=0, group="g0")) == [6, 8]
+    assert _ids(reopened, query_filter=_match(group="g5")) == [4]
+    assert reopened.get_collection("docs").points_count == 27
+
+
+def test_filter_keeps_bool_and_int_apart():
+    index = EmbeddedVectorIndex()
+    _create(index)
+    index.upsert("docs", [
+        models.PointStruct(id=1, vector=[1.0, 0, 0, 0], payload={"flag": True}),
+        models.PointStruct(id=2, vector=[1.0, 0, 0, 0], payload={"flag": 1}),
+    ])
+
+    assert _ids(index, query_filter=_match(flag=True)) == [1]
+    assert _ids(index, query_filter=_match(flag=1)) == [2]
+
+
+def test_unsupported_filters_are_refused():
+    index = EmbeddedVectorIndex()
+    _create(index)
+    index.upsert("docs", _points(range(3)))
+
+    with pytest.raises(ValueError):
+        index.search("docs", query_vector=[1.0, 0, 0, 0], query_filter=models.Filter(should=[_match(parity=0).must[0]]))
+
+
+def test_compaction_and_reload(path, monkeypatch):
+    monkeypatch.setattr(embedded_index, "COMPACTION_MIN_DEAD_ROWS", 4)
+    index = EmbeddedVectorIndex(path)
+    _create(index)
+    points = _points(range(20))
+    index.upsert("docs", points)
+    scores = {hit.id: hit.score for hit in index.search("docs", query_vector=points[19].vector, limit=20)}
+
+    index.delete("docs", points_selector=models.PointIdsList(points=list(range(12))))
+    collection = index._collection("docs")
+    assert collection.generation == 1
+    assert sorted(os.listdir(os.path.join(path, "docs"))) == ["config.json", "log.1.jsonl", "vectors.1.f32"]
+    assert _ids(index) == list(range(12, 20))
+
+    # Compacted rows keep their vectors and payloads, and new points go after them
+    index.upsert("docs", _points([30]))
+    index.close()
+
+    reopened = EmbeddedVectorIndex(path)
+    hits = reopened.search("docs", query_vector=points[19].vector, limit=20)
+    assert hits[0].id == 19
+    assert {hit.id: hit.score for hit in hits if hit.id != 30} == pytest.approx({point_id: scores[point_id] for point_id in range(12, 20)})
+    assert _ids(reopened, query_filter=_match(group="g1", parity=0)) == [12, 14, 16, 18]
+    assert _ids(reopened, query_filter=_match(group="g3")) == [30]
+
+
+def test_crash_during_compaction_keeps_previous_generation(path, monkeypatch):
+    monkeypatch.setattr(embedded_index, "COMPACTION_MIN_DEAD_ROWS", 4)
+    index = EmbeddedVectorIndex(path)
+    _create(index)
+    index.upsert("docs", _points(range(20)))
+
+    # Fail at the commit point, after the new generation's files are written
+    def crash(self):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(embedded_index._Collection, "_write_config", crash)
+    with pytest.raises(OSError):
+        index.delete("docs", points_selector=models.PointIdsList(points=list(range(12))))
+    monkeypatch.undo()
+    monkeypatch.setattr(embedded_index, "COMPACTION_MIN_DEAD_ROWS", 4)
+    # The process exits, releasing the directory
+    index.close()
+
+    # The config still names generation 0, whose log recorded the deletions before compacting
+    reopened = EmbeddedVectorIndex(path)
+    assert reopened._collection("docs").generation == 0
+    assert _ids(reopened) == list(range(12, 20))
+
+    # The next compaction replaces the leftover files of the failed one
+    reopened.delete("docs", points_selector=models.PointIdsList(points=[12, 13, 14, 15, 16]))
+    assert reopened._collection("docs").generation == 1
+    reopened.close()
+    assert _ids(EmbeddedVectorIndex(path)) == [17, 18, 19]
+
+
+def test_in_memory_index_compacts_without_files(monkeypatch):
+    monkeypatch.setattr(embedded_index, "COMPACTION_MIN_DEAD_ROWS", 4)
+    index = EmbeddedVectorIndex()
+    _create(index)
+    index.upsert("docs", _points(range(20)))
+    index.delete("docs", points_selector=models.PointIdsList(points=list(range(0, 20, 3)) + list(range(1, 20, 3))))
+
+    assert _ids(index) == list(range(2, 20, 3))
+    assert _ids(index, query_filter=_match(parity=1)) == [5, 11, 17]
+
+
+def test_directory_is_locked_while_open(path):
+    index = EmbeddedVectorIndex(path)
+    _create(index)
+
+    with pytest.raises(RuntimeError, match="already open"):
+        EmbeddedVectorIndex(path)
+
+    # Another process, such as a second uvicorn worker, fails fast too
+    script = "import sys; from app.services.vectordb.embedded_index import EmbeddedVectorIndex; EmbeddedVectorIndex(sys.argv[1])"
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script, path], capture_output=True, text=True, cwd=backend)
+    assert result.returncode != 0
+    assert "already open in another process" in result.stderr
+
+    index.close()
+    reopened = EmbeddedVectorIndex(path)
+    assert [collection.name for collection in reopened.get_collections().collections] == ["docs"]
+    reopened.close()
+
+
+def test_in_memory_indexes_are_independent():
+    first, second = EmbeddedVectorIndex(), EmbeddedVectorIndex()
+    _create(first)
+    assert second.get_collections().collections == []
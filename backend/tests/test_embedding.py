@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import llm as llm_endpoints
+from app.core.config import settings
+from app.main import app
+from app.models.llm import LLMUsage
+from app.services.llm.embedding_service import EmbeddingResponse, default_embedding_model
+from app.services.supabase.auth import get_auth_service
+
+
+class Auth:
+    async def get_user(self, token):
+        return SimpleNamespace(id="user-1", email="user@example.com")
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_auth_service] = lambda: Auth()
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+def _embed(client, **body):
+    return client.post("/api/llm/embedding", json={"text": "hello world", **body}, headers={"Authorization": "Bearer token"})
+
+
+def test_local_provider_defaults_to_a_local_model(client):
+    response = _embed(client, provider="local")
+    assert response.status_code == 200, response.text
+    assert response.json()["model"] == "hashing"
+    assert len(response.json()["embedding"]) == settings.LOCAL_EMBEDDING_DIMENSIONS
+
+
+def test_openai_provider_defaults_to_an_openai_model(client, monkeypatch):
+    requested = []
+
+    class Service:
+        async def create_embedding(self, text, model):
+            requested.append(model)
+            usage = LLMUsage(prompt_tokens=2, completion_tokens=0, total_tokens=2)
+            return EmbeddingResponse(embedding=np.zeros(3, dtype=np.float32), model=model, usage=usage)
+
+    monkeypatch.setattr(llm_endpoints, "get_embedding_service", lambda provider: Service())
+    assert _embed(client).status_code == 200
+    assert _embed(client, model="text-embedding-3-small").status_code == 200
+    assert requested == ["text-embedding-ada-002", "text-embedding-3-small"]
+
+
+def test_unknown_provider_has_no_default_model():
+    with pytest.raises(ValueError, match="Unsupported embedding provider"):
+        default_embedding_model("anthropic")
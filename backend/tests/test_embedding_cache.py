@@ -0,0 +1,72 @@
+import asyncio
+import sqlite3
+
+import numpy as np
+import pytest
+
+from app.services.llm.embedding_cache import EmbeddingCache, embedding_cache_key
+
+
+def _vectors(*texts):
+    return {embedding_cache_key("openai", "m", text): np.full(3, len(text), dtype=np.float32) for text in texts}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = EmbeddingCache(max_memory_bytes=1024, path=str(tmp_path / "embeddings.sqlite3"), max_disk_entries=3)
+    cache.PRUNE_INTERVAL = 2
+    yield cache
+    cache.close()
+
+
+def _disk_keys(cache):
+    return [key for (key,) in cache._db.execute("SELECT key FROM embeddings ORDER BY rowid")]
+
+
+def test_vectors_survive_a_restart(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    vectors = _vectors("a", "bb")
+    cache = EmbeddingCache(path=path)
+    asyncio.run(cache.set_many(vectors))
+    cache.close()
+
+    reopened = EmbeddingCache(path=path)
+    found = asyncio.run(reopened.get_many(list(vectors) + [b"missing"]))
+    reopened.close()
+    assert sorted(found) == sorted(vectors)
+    assert all(np.array_equal(found[key], vectors[key]) for key in vectors)
+    assert (reopened.stats.disk_hits, reopened.stats.misses) == (2, 1)
+
+
+def test_disk_tier_keeps_the_newest_vectors(cache):
+    for text in ["a", "b", "c", "d", "e", "f"]:
+        asyncio.run(cache.set_many(_vectors(text)))
+
+    # Pruned after every second write, down to the three most recently written vectors
+    assert _disk_keys(cache) == list(_vectors("d", "e", "f"))
+
+
+def test_rewritten_vector_counts_as_new(cache):
+    asyncio.run(cache.set_many(_vectors("a", "b", "c")))
+    asyncio.run(cache.set_many(_vectors("a", "d")))
+    assert _disk_keys(cache) == list(_vectors("c", "a", "d"))
+
+
+def test_batches_are_pruned_by_vector_count(cache):
+    asyncio.run(cache.set_many(_vectors("a", "b", "c", "d", "e")))
+    assert len(_disk_keys(cache)) == 3
+
+
+def test_existing_cache_files_are_pruned(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+    db.executemany("INSERT INTO embeddings VALUES (?, ?)", [(key, vector.tobytes()) for key, vector in _vectors("a", "b", "c", "d").items()])
+    db.commit()
+    db.close()
+
+    cache = EmbeddingCache(path=path, max_disk_entries=2)
+    cache.PRUNE_INTERVAL = 1
+    asyncio.run(cache.set_many(_vectors("e")))
+    assert _disk_keys(cache) == list(_vectors("d", "e"))
+    cache.close()
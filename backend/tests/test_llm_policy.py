@@ -0,0 +1,265 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import FairConcurrencyLimiter, OverloadedError
+from app.models.llm import LLMUsage
+from app.services.llm.llm_service import AdmittedLLMService, LatencyTracker, LLMPolicy, LLMResponse, LLMService, LLMStreamEvent, PolicyLLMService
+
+
+class ProviderError(Exception):
+    status_code = 401
+
+
+class FakeLLMService(LLMService):
+    """Answers after ``delays`` seconds (one per call, the last repeating), or raises ``error``."""
+
+    def __init__(self, name, delays=(0.0,), error=None, stream_error_after=None):
+        self.name = name
+        self.delays = list(delays)
+        self.error = error
+        self.stream_error_after = stream_error_after
+        self.calls = []
+        self.cancelled = 0
+
+    def _delay(self):
+        return self.delays.pop(0) if len(self.delays) > 1 else self.delays[0]
+
+    async def generate_text(self, prompt, model, max_tokens=500, temperature=0.7, **kwargs):
+        self.calls.append(kwargs)
+        try:
+            await asyncio.sleep(self._delay())
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return LLMResponse(text=f"{self.name}:{prompt}", model=model, usage=LLMUsage(prompt_tokens=1, completion_tokens=1, total_tokens=2))
+
+    async def generate_stream(self, prompt, model, max_tokens=500, temperature=0.7, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(self._delay())
+        if self.error is not None:
+            raise self.error
+        for i, word in enumerate(["hello", "world"]):
+            if self.stream_error_after == i:
+                raise ProviderError("stream broke")
+            yield LLMStreamEvent(text=f"{self.name}:{word}", model=model)
+        yield LLMStreamEvent(model=model, usage=LLMUsage(prompt_tokens=1, completion_tokens=2, total_tokens=3))
+
+
+def _policy_service(services, deadline=1.0, attempt_timeout=0.5, fallbacks=(), latencies=None, **policy):
+    policy = LLMPolicy(deadline=deadline, attempt_timeout=attempt_timeout, fallbacks=list(fallbacks), **policy)
+    return PolicyLLMService("openai", policy=policy, services=services.__getitem__, latencies=latencies or LatencyTracker())
+
+
+def _shed_service(name="shed"):
+    """A service whose provider limiter is saturated, with no room to queue, so every call is shed."""
+    limiter = FairConcurrencyLimiter(max_concurrency=1, min_concurrency=1, max_queue_length=0, max_queue_seconds=1.0)
+    service = AdmittedLLMService(FakeLLMService(name), provider=name, limiter=limiter)
+    return service, limiter
+
+
+def _generate(service, **kwargs):
+    return asyncio.run(service.generate_text(prompt="p", model="m", **kwargs))
+
+
+def _stream(service, **kwargs):
+    async def collect():
+        return [event async for event in service.generate_stream(prompt="p", model="m", **kwargs)]
+
+    return asyncio.run(collect())
+
+
+def test_primary_answers():
+    service = _policy_service({"openai": FakeLLMService("openai")}, fallbacks=[("anthropic", "claude")])
+    response = _generate(service)
+    assert (response.text, response.route) == ("openai:p", "primary")
+    assert service.stats.wins == {"primary": 1}
+
+
+def test_falls_back_when_the_primary_fails():
+    services = {"openai": FakeLLMService("openai", error=ProviderError("bad key")), "anthropic": FakeLLMService("anthropic")}
+    service = _policy_service(services, fallbacks=[("anthropic", "claude")])
+
+    response = _generate(service)
+    assert (response.text, response.model, response.route) == ("anthropic:p", "claude", "fallback:anthropic:claude")
+    assert (service.stats.errors, service.stats.failures) == (1, 0)
+
+
+def test_falls_back_when_the_primary_is_too_slow():
+    services = {"openai": FakeLLMService("openai", delays=[10.0]), "anthropic": FakeLLMService("anthropic")}
+    service = _policy_service(services, attempt_timeout=0.05, fallbacks=[("anthropic", "claude")])
+
+    assert _generate(service).route == "fallback:anthropic:claude"
+    assert service.stats.timeouts == 1
+    assert services["openai"].cancelled == 1
+
+
+def test_provider_error_is_raised_when_every_target_fails():
+    error = ProviderError("invalid api key")
+    services = {"openai": FakeLLMService("openai", error=error), "anthropic": FakeLLMService("anthropic", error=ValueError("bad model"))}
+
+    with pytest.raises(ProviderError) as raised:
+        _generate(_policy_service({"openai": services["openai"]}))
+    assert raised.value is error
+
+    service = _policy_service(services, fallbacks=[("anthropic", "claude")])
+    with pytest.raises(ValueError, match="bad model"):
+        _generate(service)
+    assert (service.stats.errors, service.stats.failures) == (2, 1)
+
+
+def test_timeout_is_raised_when_the_deadline_runs_out():
+    services = {"openai": FakeLLMService("openai", delays=[10.0]), "anthropic": FakeLLMService("anthropic")}
+    service = _policy_service(services, deadline=0.05, attempt_timeout=1.0, fallbacks=[("anthropic", "claude")])
+
+    with pytest.raises(TimeoutError, match="openai:m timed out"):
+        _generate(service)
+    # The fallback had no time left to be tried
+    assert services["anthropic"].calls == []
+    assert (service.stats.timeouts, service.stats.failures) == (1, 1)
+
+
+def test_caller_deadline_can_only_shorten_the_policy_deadline():
+    services = {"openai": FakeLLMService("openai", delays=[0.2])}
+    with pytest.raises(TimeoutError):
+        _generate(_policy_service(services, deadline=1.0, attempt_timeout=1.0), deadline=0.05)
+    assert _generate(_policy_service(services, deadline=1.0, attempt_timeout=1.0), deadline=60.0).route == "primary"
+
+
+def test_shed_request_raises_the_admission_error():
+    shed, limiter = _shed_service()
+
+    async def main():
+        with await limiter.acquire("someone else"):
+            await _policy_service({"openai": shed}).generate_text(prompt="p", model="m")
+
+    with pytest.raises(OverloadedError):
+        asyncio.run(main())
+
+
+def test_shed_primary_falls_back():
+    shed, limiter = _shed_service()
+    services = {"openai": shed, "anthropic": FakeLLMService("anthropic")}
+    service = _policy_service(services, fallbacks=[("anthropic", "claude")])
+
+    async def main():
+        with await limiter.acquire("someone else"):
+            return await service.generate_text(prompt="p", model="m")
+
+    assert asyncio.run(main()).route == "fallback:anthropic:claude"
+    assert (service.stats.shed, service.stats.errors) == (1, 0)
+
+
+def test_shed_request_gets_503_with_retry_after(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.api.endpoints import llm as llm_endpoints
+    from app.core.config import settings
+    from app.main import app
+    from app.services.supabase.auth import get_auth_service
+
+    class Auth:
+        async def get_user(self, token):
+            class User:
+                id = "user-1"
+                email = "user@example.com"
+
+            return User()
+
+    shed, limiter = _shed_service()
+    limiter.active = limiter.max_concurrency
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(llm_endpoints, "get_llm_service", lambda provider: _policy_service({"openai": shed}))
+    app.dependency_overrides[get_auth_service] = lambda: Auth()
+    try:
+        client = TestClient(app)
+        response = client.post("/api/llm/generate", json={"prompt": "p", "provider": "openai"}, headers={"Authorization": "Bearer token"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def _hedging_service(services, **policy):
+    latencies = LatencyTracker()
+    for _ in range(LatencyTracker.MIN_SAMPLES):
+        latencies.record("openai", "m", 0.01)
+    return _policy_service(services, latencies=latencies, hedge_percentile=50.0, hedge_min_delay=0.02, **policy)
+
+
+def test_slow_call_is_hedged():
+    primary = FakeLLMService("openai", delays=[10.0, 0.0])
+    service = _hedging_service({"openai": primary}, attempt_timeout=1.0)
+
+    response = _generate(service)
+    assert response.route == "hedge"
+    assert service.stats.hedges == 1
+    # The hedge skips the response cache, and the slower call is cancelled
+    assert primary.calls == [{}, {"cache": False}]
+    assert primary.cancelled == 1
+
+
+def test_fast_call_is_not_hedged():
+    primary = FakeLLMService("openai", delays=[0.0])
+    service = _hedging_service({"openai": primary})
+
+    assert _generate(service).route == "primary"
+    assert service.stats.hedges == 0
+    assert len(primary.calls) == 1
+
+
+def test_failed_hedge_leaves_the_first_call_running():
+    primary = FakeLLMService("openai", delays=[0.1, 0.0])
+    service = _hedging_service({"openai": primary}, attempt_timeout=1.0)
+    primary_generate = primary.generate_text
+
+    async def generate_text(prompt, model, **kwargs):
+        if kwargs.get("cache") is False:
+            raise ProviderError("hedge failed")
+        return await primary_generate(prompt, model, **kwargs)
+
+    primary.generate_text = generate_text
+    response = _generate(service)
+    assert response.route == "primary"
+    assert service.stats.hedges == 1
+
+
+def test_stream_falls_back_before_its_first_event():
+    services = {"openai": FakeLLMService("openai", error=ProviderError("bad key")), "anthropic": FakeLLMService("anthropic")}
+    service = _policy_service(services, fallbacks=[("anthropic", "claude")])
+
+    events = _stream(service)
+    assert [event.text for event in events] == ["anthropic:hello", "anthropic:world", ""]
+    assert events[-1].usage.total_tokens == 3
+    assert service.stats.wins == {"fallback:anthropic:claude": 1}
+
+
+def test_stream_does_not_fall_back_after_its_first_event():
+    services = {"openai": FakeLLMService("openai", stream_error_after=1), "anthropic": FakeLLMService("anthropic")}
+    service = _policy_service(services, fallbacks=[("anthropic", "claude")])
+
+    with pytest.raises(ProviderError, match="stream broke"):
+        _stream(service)
+    assert services["anthropic"].calls == []
+
+
+def test_stream_errors():
+    error = ProviderError("bad key")
+    with pytest.raises(ProviderError) as raised:
+        _stream(_policy_service({"openai": FakeLLMService("openai", error=error)}))
+    assert raised.value is error
+
+    with pytest.raises(TimeoutError):
+        _stream(_policy_service({"openai": FakeLLMService("openai", delays=[10.0])}, attempt_timeout=0.05))
+
+    shed, limiter = _shed_service()
+
+    async def main():
+        with await limiter.acquire("someone else"):
+            return [event async for event in _policy_service({"openai": shed}).generate_stream(prompt="p", model="m")]
+
+    with pytest.raises(OverloadedError):
+        asyncio.run(main())
@@ -0,0 +1,27 @@
+from functools import lru_cache
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.services.vectordb.embedded_index import EmbeddedVectorIndex
+from app.services.vectordb.qdrant_service import QdrantService
+
+
+def test_lifespan_closes_the_vector_db_and_restarts_cleanly(tmp_path, monkeypatch):
+    path = str(tmp_path / "index")
+
+    @lru_cache()
+    def get_vector_db_service():
+        return QdrantService(url="", embedded_path=path)
+
+    monkeypatch.setattr(main, "get_vector_db_service", get_vector_db_service)
+
+    services = []
+    for _ in range(2):
+        with TestClient(main.app) as client:
+            assert client.get("/").status_code == 200
+            services.append(get_vector_db_service())
+
+    # Each start got its own service, and shutdown released the index directory
+    assert services[0] is not services[1]
+    EmbeddedVectorIndex(path).close()
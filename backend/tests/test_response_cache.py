@@ -0,0 +1,105 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.models.llm import LLMUsage
+from app.services.llm.llm_service import CachedLLMService, LLMResponse, LLMService
+from app.services.llm.response_cache import MemoryResponseCacheBackend, ResponseCache, SQLiteResponseCacheBackend, response_cache_key
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryResponseCacheBackend(max_entries=100)
+    return SQLiteResponseCacheBackend(path=str(tmp_path / "responses.sqlite3"), max_entries=100)
+
+
+def test_round_trip_and_expiry(backend):
+    async def main():
+        await backend.set(b"live", "value", ttl=60)
+        await backend.set(b"expired", "value", ttl=-1)
+        return await backend.get(b"live"), await backend.get(b"expired"), await backend.get(b"missing")
+
+    assert asyncio.run(main()) == ("value", None, None)
+
+
+def test_sqlite_is_shared_between_instances_and_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLiteResponseCacheBackend, "PRUNE_INTERVAL", 10)
+    path = str(tmp_path / "responses.sqlite3")
+    writer = SQLiteResponseCacheBackend(path=path, max_entries=5)
+    reader = SQLiteResponseCacheBackend(path=path, max_entries=5)
+
+    async def main():
+        await writer.set(b"expired", "old", ttl=-1)
+        for i in range(8):
+            await writer.set(f"key{i}".encode(), str(i), ttl=60 + i)
+        assert await reader.get(b"key0") == "0"
+
+        # The tenth write prunes the expired entry, then those closest to expiry beyond the limit
+        await writer.set(b"key8", "8", ttl=68)
+        return [await reader.get(f"key{i}".encode()) for i in range(9)]
+
+    assert asyncio.run(main()) == [None] * 4 + ["4", "5", "6", "7", "8"]
+    (count,) = writer._db.execute("SELECT count(*) FROM responses").fetchone()
+    assert count == 5
+
+
+def test_sqlite_runs_off_the_event_loop(tmp_path, monkeypatch):
+    backend = SQLiteResponseCacheBackend(path=str(tmp_path / "responses.sqlite3"), max_entries=100)
+    threads = set()
+    for name in ("_get", "_set"):
+        method = getattr(backend, name)
+
+        def record(*args, method=method):
+            threads.add(threading.get_ident())
+            return method(*args)
+
+        monkeypatch.setattr(backend, name, record)
+
+    async def main():
+        await asyncio.gather(*(backend.set(f"key{i}".encode(), str(i), ttl=60) for i in range(20)))
+        return await asyncio.gather(*(backend.get(f"key{i}".encode()) for i in range(20)))
+
+    assert asyncio.run(main()) == [str(i) for i in range(20)]
+    assert threads and threading.get_ident() not in threads
+
+
+class CountingLLMService(LLMService):
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_text(self, prompt, model, max_tokens=500, temperature=0.7, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return LLMResponse(text=f"answer {self.calls}", model=model, usage=LLMUsage(prompt_tokens=3, completion_tokens=4, total_tokens=7))
+
+    async def generate_stream(self, prompt, model, max_tokens=500, temperature=0.7, **kwargs):
+        yield
+
+
+def test_cached_service_serves_repeated_deterministic_requests(backend):
+    upstream = CountingLLMService()
+    cache = ResponseCache(backend=backend, ttl=60)
+    service = CachedLLMService(upstream, provider="openai", cache=cache)
+
+    async def main():
+        first = await service.generate_text(prompt="p", model="m", temperature=0)
+        second = await service.generate_text(prompt="p", model="m", temperature=0)
+        uncached = await service.generate_text(prompt="p", model="m", temperature=0.7)
+        bypassed = await service.generate_text(prompt="p", model="m", temperature=0, cache=False)
+        return first, second, uncached, bypassed
+
+    first, second, uncached, bypassed = asyncio.run(main())
+    assert (first.text, first.usage.total_tokens, first.route) == ("answer 1", 7, None)
+    assert (second.text, second.usage.total_tokens, second.route) == ("answer 1", 0, "cache")
+    assert (uncached.text, bypassed.text) == ("answer 2", "answer 3")
+    assert upstream.calls == 3
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.bypassed) == (1, 1, 1)
+
+
+def test_cache_key_covers_the_request():
+    key = response_cache_key("openai", "m", "p", 100, 0.0, {"stop": ["\n"]})
+    assert key == response_cache_key("openai", "m", "p", 100, 0.0, {"stop": ["\n"]})
+    assert key != response_cache_key("anthropic", "m", "p", 100, 0.0, {"stop": ["\n"]})
+    assert key != response_cache_key("openai", "m", "p", 101, 0.0, {"stop": ["\n"]})
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from app.core.single_flight import SingleFlight
+
+
+class Upstream:
+    """An upstream call that runs until the test releases it, counting how often it starts and is cancelled."""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def call(self):
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return "result"
+
+
+def test_concurrent_calls_share_one_upstream_call():
+    async def main():
+        group = SingleFlight()
+        upstream = Upstream()
+        callers = [asyncio.create_task(group.do("key", upstream.call)) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+
+        results = await asyncio.gather(*callers)
+        assert results == [("result", False), ("result", True), ("result", True)]
+        assert upstream.started == 1
+        assert (group.stats.calls, group.stats.collapsed) == (3, 2)
+        assert len(group) == 0
+
+    asyncio.run(main())
+
+
+def test_leader_cancelled_while_followers_wait():
+    async def main():
+        group = SingleFlight()
+        upstream = Upstream()
+        leader = asyncio.create_task(group.do("key", upstream.call))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(group.do("key", upstream.call)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        assert leader.cancelled()
+        assert upstream.cancelled == 0
+        assert len(group) == 1
+
+        upstream.release.set()
+        assert await asyncio.gather(*followers) == [("result", True), ("result", True)]
+        assert upstream.started == 1
+
+    asyncio.run(main())
+
+
+def test_upstream_call_cancelled_once_every_caller_has_left():
+    async def main():
+        group = SingleFlight()
+        upstream = Upstream()
+        callers = [asyncio.create_task(group.do("key", upstream.call)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert upstream.cancelled == 1
+        assert len(group) == 0
+
+        # The next call starts afresh rather than joining the abandoned one
+        upstream.release.set()
+        assert await group.do("key", upstream.call) == ("result", False)
+        assert upstream.started == 2
+
+    asyncio.run(main())
+
+
+def test_error_is_raised_to_every_caller_and_not_kept():
+    async def main():
+        group = SingleFlight()
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0)
+            raise ValueError("upstream failed")
+
+        results = await asyncio.gather(*(group.do("key", failing) for _ in range(2)), return_exceptions=True)
+        assert [type(result) for result in results] == [ValueError, ValueError]
+        assert calls == 1
+
+        with pytest.raises(ValueError):
+            await group.do("key", failing)
+        assert calls == 2
+
+    asyncio.run(main())
+
+
+def test_different_keys_do_not_collapse():
+    async def main():
+        group = SingleFlight()
+        upstream = Upstream()
+        callers = [asyncio.create_task(group.do(key, upstream.call)) for key in ("a", "b")]
+        await asyncio.sleep(0)
+        assert len(group) == 2
+
+        upstream.release.set()
+        assert await asyncio.gather(*callers) == [("result", False), ("result", False)]
+        assert upstream.started == 2
+
+    asyncio.run(main())
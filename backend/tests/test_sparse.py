@@ -0,0 +1,150 @@
+import math
+
+import numpy as np
+import pytest
+from qdrant_client.http import models
+
+from app.services.vectordb.characters import CJK, DIGIT, LETTER, OTHER, SYMBOL, character_classes
+from app.services.vectordb.embedded_index import EmbeddedVectorIndex
+from app.services.vectordb.sparse import (
+    BM25_AVG_DOC_LENGTH,
+    BM25_B,
+    BM25_K1,
+    SPARSE_VECTOR_NAME,
+    document_sparse_vector,
+    hash_terms,
+    query_sparse_vector,
+    term_hashes,
+)
+
+
+def _reference_hash(term: str) -> int:
+    """The polynomial term hash, computed one code point at a time."""
+    value = 0
+    for position, char in enumerate(term):
+        value = (value + ord(char) * pow(0x01000193, position, 2**32)) % 2**32
+    return value
+
+
+def test_character_classes():
+    text = "a1 _,東한😀"
+    classes = character_classes(np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32))
+    assert classes.tolist() == [LETTER, DIGIT, OTHER, OTHER, SYMBOL, CJK, CJK, SYMBOL]
+
+
+@pytest.mark.parametrize(
+    "text, terms",
+    [
+        ("Error E1234 in v2.0", ["error", "e1234", "in", "v2", "0"]),
+        ("snake_case, kebab-case", ["snake", "case", "kebab", "case"]),
+        ("東京 tower", ["東", "京", "tower"]),
+        ("Straße ÉCOLE", ["straße", "école"]),
+        ("", []),
+        ("... !!", []),
+    ],
+)
+def test_term_hashes_match_the_reference_hash(text, terms):
+    assert term_hashes(text).tolist() == [_reference_hash(term) for term in terms]
+
+
+def test_equal_terms_hash_equally_wherever_they_occur():
+    hashes = term_hashes("Cache the CACHE, then cache")
+    assert hashes[0] == hashes[2] == hashes[4]
+    assert len(set(hashes.tolist())) == 3
+    assert hashes.dtype == np.uint32
+
+
+def test_hash_terms_returns_term_offsets():
+    text = "  ab, 東c 12"
+    hashes, starts = hash_terms(np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32))
+    assert starts.tolist() == [2, 6, 7, 9]
+    assert hashes.tolist() == [_reference_hash(term) for term in ["ab", "東", "c", "12"]]
+
+
+def test_document_vector_has_bm25_term_weights():
+    text = "apple apple apple banana cherry"
+    vector = document_sparse_vector(text)
+
+    assert vector.indices == sorted(vector.indices)
+    assert len(vector.indices) == 3
+    weights = dict(zip(vector.indices, vector.values))
+
+    length_norm = 1 - BM25_B + BM25_B * 5 / BM25_AVG_DOC_LENGTH
+    for term, count in (("apple", 3), ("banana", 1)):
+        assert weights[_reference_hash(term)] == pytest.approx(count * (BM25_K1 + 1) / (count + BM25_K1 * length_norm))
+
+    # Repeating a term raises its weight, but never beyond the saturation limit
+    assert weights[_reference_hash("apple")] > weights[_reference_hash("banana")]
+    assert max(document_sparse_vector("apple " * 1000).values) < BM25_K1 + 1
+
+
+def test_longer_documents_weigh_each_occurrence_less():
+    short = document_sparse_vector("apple banana")
+    long = document_sparse_vector("apple " + " ".join(f"filler{i}" for i in range(500)))
+    apple = _reference_hash("apple")
+    assert dict(zip(long.indices, long.values))[apple] < dict(zip(short.indices, short.values))[apple]
+
+
+def test_query_vector_has_each_term_once():
+    vector = query_sparse_vector("Apple apple BANANA")
+    assert sorted(vector.indices) == sorted([_reference_hash("apple"), _reference_hash("banana")])
+    assert vector.values == [1.0, 1.0]
+    assert query_sparse_vector("...") == models.SparseVector(indices=[], values=[])
+
+
+def _hybrid_index(documents):
+    index = EmbeddedVectorIndex()
+    index.create_collection(
+        "docs",
+        vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE),
+        sparse_vectors_config={SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)},
+    )
+    index.upsert(
+        "docs",
+        [
+            models.PointStruct(id=point_id, vector={"": vector, SPARSE_VECTOR_NAME: document_sparse_vector(text)}, payload={"text": text})
+            for point_id, (text, vector) in enumerate(documents)
+        ],
+    )
+    return index
+
+
+def test_sparse_search_ranks_rare_terms_first():
+    index = _hybrid_index(
+        [
+            ("the error log", [1.0, 0.0]),
+            ("the error code E1234", [0.0, 1.0]),
+            ("the weather", [1.0, 1.0]),
+            ("the the the", [1.0, 0.5]),
+        ]
+    )
+    hits = index.query_points("docs", query=query_sparse_vector("error E1234"), using=SPARSE_VECTOR_NAME, limit=10).points
+
+    # Only documents sharing a term match, and the one with the rarer term as well comes first
+    assert [hit.id for hit in hits] == [1, 0]
+    points, matching = 4, 2
+    idf = math.log((points - matching + 0.5) / (matching + 0.5) + 1)
+    document = document_sparse_vector("the error log")
+    weight = dict(zip(document.indices, document.values))[_reference_hash("error")]
+    assert hits[1].score == pytest.approx(idf * weight, rel=1e-5)
+
+
+def test_hybrid_query_fuses_dense_and_sparse_rankings():
+    index = _hybrid_index(
+        [
+            ("invoice overdue reminder", [1.0, 0.0]),
+            ("payment received", [0.9, 0.1]),
+            ("weather report", [0.0, 1.0]),
+        ]
+    )
+    query = models.FusionQuery(fusion=models.Fusion.RRF)
+    prefetch = [
+        models.Prefetch(query=[1.0, 0.0], limit=3),
+        models.Prefetch(query=query_sparse_vector("overdue invoice"), using=SPARSE_VECTOR_NAME, limit=3),
+    ]
+    hits = index.query_points("docs", query=query, prefetch=prefetch, limit=3).points
+
+    # First in both rankings, then the second dense result; the unrelated document is last
+    assert [hit.id for hit in hits] == [0, 1, 2]
+    assert hits[0].score == pytest.approx(2 / 61)
+    assert hits[0].payload == {"text": "invoice overdue reminder"}